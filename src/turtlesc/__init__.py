@@ -1,12 +1,12 @@
-import turtle, time, re
+import turtle, builtins, time, re, collections, functools, operator, keyword, math, array, mmap, struct, sys, bisect, os, queue, tempfile, threading
+from random import Random
 
-# SC TODO - some kind of live replay sort of thing?
-# SC TODO - some kind of chart maker that records the screen after every movement?
+from turtlesc._colors import COLOR_NAMES as _COLOR_NAMES
 
-ALL_SHORTCUTS = '# f b l r h c g tele x y st pd pu ps pc fc bc sh cir undo bf ef sleep n s e w nw ne sw se u t cs css spd eoc' + \
-    'forward backward left right home clear goto setx sety stamp update pendown penup pensize pencolor fillcolor bgcolor setheading' + \
-    'circle undo begin_fill end_fill north south east west northwest northeast southwest southeast reset bye done exitonclick update' + \
-    'tracer hide show dot clearstamp clearstamps degrees radians speed'
+try:
+    import numpy as _numpy  # NumPy is optional, but it makes sc_path() and sc_points() faster for large arrays.
+except ImportError:
+    _numpy = None
 
 CARDINAL_TO_DEGREES = {'n': '90', 's': '270', 'e': '0', 'w': '180', 'nw': '135', 'ne': '45', 'sw': '225', 'se': '315'}
 
@@ -15,14 +15,23 @@ _MAP_FULL_TO_SHORT_NAMES = {'forward': 'f', 'backward': 'b', 'right': 'r', 'left
         'pensize': 'ps', 'pencolor': 'pc', 'fillcolor': 'fc', 'bgcolor': 'bc', 'setheading': 'sh', 'circle': 'cir',
         'begin_fill': 'bf', 'end_fill': 'ef', 'north': 'n', 'south': 's', 'east': 'e', 'west': 'w',
         'northwest': 'nw', 'northeast': 'ne', 'southwest': 'sw', 'southeast': 'se', 'update': 'u', 'tracer': 't',
-        'clearstamp': 'cs', 'clearstamps': 'css', 'speed': 'spd', 'exitonclick': 'eoc'}
+        'clearstamp': 'cs', 'clearstamps': 'css', 'speed': 'spd', 'exitonclick': 'eoc', 'repeat': 'rep'}
 
 _LOWER_KEYS_TO_TKINTER_KEY_NAMES = {'left': 'Left', 'right': 'Right', 'up': 'Up', 'down': 'Down', 'pgdn': 'Next', 'pgup': 'Prior', 'home': 'Home', 'end': 'End'}
 
 
-RECORDED_SHORTCUTS = []
+RECORDED_SHORTCUTS = []  # A ShortcutRecording once begin_recording() is called.
 _NOW_RECORDING = False
 
+SC_VARIABLES = {}  # The variables that `set` and `inc` shortcuts change and `$` expressions use, by name.
+
+MACRO_DEPTH_LIMIT = 20  # The largest depth a recursive macro can have.
+_MACROS = {}  # Keys are macro names, values are the instruction tuples of the `def` shortcuts that defined them.
+# The macros that the shortcuts being parsed define, which are added to _MACROS once all of them parse. A None value
+# hides the macro in _MACROS with that name while it's being defined. This is None when nothing is being parsed.
+_NEW_MACROS = None
+_MACROS_BEING_DEFINED = set()  # The names of the recursive macros that are being parsed.
+
 class TurtleShortcutException(Exception):
     pass
 
@@ -109,7 +118,8 @@ def sc(*args, turtle_obj=None, _return_turtle_code=False, skip=False): # type: (
 
     Furthermore, you can also use the full names: forward N translates to forward(N).
     Note: None of these functions can take string args that have spaces in them, since spaces are the arg delimiter here.
-    Note: You also can't use variables here, only static values. But you can use f-strings.
+    Note: Python variables can't be used here, but you can use f-strings. Or use the `set` and `inc` shortcuts
+    and `$` expressions: 'set i 0, rep 300 [f $i, l 91, inc i 1]' or 'f $i*2'.
 
     Return value is the number of commands executed.
     Whitespace is insignificant. '   f     100   ' is the same as 'f 100'
@@ -124,693 +134,4041 @@ def sc(*args, turtle_obj=None, _return_turtle_code=False, skip=False): # type: (
     # Join multiple arg strings into one, separated by commas:
     shortcuts = ','.join(args)
 
-    # Newlines become commas as well:
-    shortcuts = shortcuts.replace('\n', ',')
-
-    if shortcuts == '' or len(shortcuts.split(',')) == 0:
+    if shortcuts == '':
         return 0
 
-    count_of_shortcuts_run = 0
-
-    # Go through and check that all shortcuts are syntactically correct:
-    for shortcut in shortcuts.split(','):
-        count_of_shortcuts_run += _run_shortcut(shortcut, turtle_obj=turtle_obj, dry_run=True)
+    # Parse the shortcuts (or get the already-parsed program from the cache). This checks that all shortcuts
+    # are syntactically correct before any of them are run:
+    program = compile_sc(shortcuts, turtle_obj=turtle_obj)
 
     # Go through and actually run all the shortcuts:
-    count_of_shortcuts_run = 0
-    turtle_code = tuple()
-    for shortcut in shortcuts.split(','):
-        if _return_turtle_code:
-            turtle_code += _run_shortcut(shortcut, turtle_obj=turtle_obj, _return_turtle_code=True)
-        else:
-            count_of_shortcuts_run += _run_shortcut(shortcut, turtle_obj=turtle_obj)
-
     if _return_turtle_code:
         # Return a multi-line string of Python code calling turtle functions:
-        return '\n'.join(turtle_code) + '\n'
+        return '\n'.join(program.run(turtle_obj=turtle_obj, _return_turtle_code=True)) + '\n'
     else:
+        return program.run(turtle_obj=turtle_obj)
+
+
+class ShortcutProgram:
+    """A shortcut string that has been parsed into instructions by compile_sc(). The program can be run
+    any number of times without having to parse the shortcut string again:
+
+    >>> square_side = compile_sc('f 100, l 90')
+    >>> for i in range(4):
+    ...     square_side()
+    ...
+    2
+    2
+    2
+    2
+
+    Each instruction is a tuple of (shortcut name, converted arguments, argument strings, original shortcut)."""
+
+    __slots__ = ('source', 'instructions', '_rgb_instructions')
+
+    def __init__(self, source, instructions):
+        object.__setattr__(self, 'source', source)
+        object.__setattr__(self, 'instructions', tuple(instructions))
+
+        # Only the RGB color shortcuts need to be checked against the turtle's current colormode before running:
+        object.__setattr__(self, '_rgb_instructions', tuple(instruction for instruction in _iter_instructions(self.instructions) if instruction[0].name in ('pc', 'fc', 'bc') and len(instruction[1]) == 3))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('ShortcutProgram objects are immutable.')
+
+    def __len__(self):
+        return len(self.instructions)
+
+    def __iter__(self):
+        return iter(self.instructions)
+
+    def __repr__(self):
+        return 'ShortcutProgram(' + repr(self.source) + ')'
+
+    def __call__(self, turtle_obj=None):
+        return self.run(turtle_obj=turtle_obj)
+
+    def run(self, turtle_obj=None, _return_turtle_code=False):
+        """Run the program's shortcuts and return the number of shortcuts run, or the tuple of turtle code lines if
+        _return_turtle_code is True."""
+        if turtle_obj is None:
+            turtle_obj = turtle  # Use the main turtle given by the module.
+
+        # Check the RGB color arguments before running anything, so that no shortcuts run if one is invalid. This
+        # is the only check left to do at this point; everything else was checked when the program was parsed.
+        if self._rgb_instructions:
+            colormode = turtle_obj.colormode()
+            for instruction in self._rgb_instructions:
+                _check_rgb_instruction(instruction, colormode)
+
+        if _return_turtle_code:
+            turtle_code = []
+            for instruction in self.instructions:
+                turtle_code.extend(_run_instruction(instruction, turtle_obj, _return_turtle_code=True))
+            return tuple(turtle_code)
+
+        count_of_shortcuts_run = 0
+        for instruction in self.instructions:
+            count_of_shortcuts_run += _run_instruction(instruction, turtle_obj)
         return count_of_shortcuts_run
 
 
-def _run_shortcut(shortcut, turtle_obj=None, dry_run=False, _return_turtle_code=False):
-    '''Runs a single shortcut'''
+SC_CACHE_SIZE = 256  # The maximum number of compiled shortcut strings that compile_sc() and sc() keep around.
+_SC_CACHE = collections.OrderedDict()
+
+
+def compile_sc(*args, turtle_obj=None):
+    """Parse the shortcut strings into a ShortcutProgram that can be run repeatedly, i.e. compile_sc('f 100, l 90')().
+    This raises TurtleShortcutException if any of the shortcuts has a syntax error.
+
+    The most recently compiled programs are kept in a cache (up to SC_CACHE_SIZE of them) so that the same
+    shortcut string isn't parsed again, which is what makes calling sc() in a loop fast."""
+
+    # Join multiple arg strings into one, separated by commas:
+    shortcuts = ','.join(args)
+
+    program = _SC_CACHE.get(shortcuts)
+    if program is not None:
+        _SC_CACHE.move_to_end(shortcuts)
+        return program
+
+    with _MacroDefinitions():
+        program = ShortcutProgram(shortcuts, _parse_shortcuts(shortcuts, turtle_obj=turtle_obj))
+
+    if SC_CACHE_SIZE > 0:
+        _SC_CACHE[shortcuts] = program
+        while len(_SC_CACHE) > SC_CACHE_SIZE:
+            _SC_CACHE.popitem(last=False)  # Evict the least recently used program.
+    return program
+
+
+def clear_sc_cache():
+    """Remove all of the compiled shortcut programs from the cache used by compile_sc() and sc(), and the compiled
+    functions from the cache used by sc_compile_function()."""
+    _SC_CACHE.clear()
+    _FUNCTION_CACHE.clear()
+
+
+_FUNCTION_CACHE = collections.OrderedDict()  # Keys are shortcut strings, values are _compile_function_code()'s results.
+_CALLED_NAME_REGEX = re.compile(r'^([A-Za-z_][A-Za-z0-9_]*)\(')
+
+
+def sc_compile_function(*args, turtle_obj=None):
+    """Compile the shortcut strings into a Python function that calls the turtle's methods directly with constant
+    arguments, instead of going through sc()'s interpreter. Calling the function runs the shortcuts and returns the
+    number of shortcuts run, the same as sc():
+
+    >>> draw_square = sc_compile_function('rep 4 [f 100, l 90]')
+    >>> draw_square()
+    8
+
+    The function is bound to turtle_obj (or the main turtle if turtle_obj is None) when it is compiled. Syntax
+    errors raise TurtleShortcutException here, and errors while running are the same as sc()'s. Shortcuts that
+    can't be written as a single method call (such as `rep` blocks, `$` arguments, or registered shortcuts) are
+    run by sc()'s interpreter from inside the function. The generated code is cached by shortcut string, up to
+    SC_CACHE_SIZE of them."""
+
+    # Join multiple arg strings into one, separated by commas:
+    shortcuts = ','.join(args)
+
+    entry = _FUNCTION_CACHE.get(shortcuts)
+    if entry is not None:
+        _FUNCTION_CACHE.move_to_end(shortcuts)
+    else:
+        entry = _compile_function_code(compile_sc(shortcuts, turtle_obj=turtle_obj))
+        if SC_CACHE_SIZE > 0:
+            _FUNCTION_CACHE[shortcuts] = entry
+            while len(_FUNCTION_CACHE) > SC_CACHE_SIZE:
+                _FUNCTION_CACHE.popitem(last=False)  # Evict the least recently used function.
+    code, program, called_names = entry
+
+    if turtle_obj is None:
+        turtle_obj = turtle  # The interpreter uses the main turtle given by the module.
+
+    # Bind each function name in the generated code to the same method that the interpreter would call. That's
+    # the turtle's method, except for the screen methods that the interpreter calls through getscreen(). The turtle
+    # module's functions are either the main turtle's methods or its screen's methods.
+    bound_turtle = _get_turtle(turtle_obj)
+    screen = bound_turtle.getscreen()
+    namespace = {'sleep': time.sleep, '_program': program, '_instructions': program.instructions,
+                 '_turtle_obj': turtle_obj, '_run': _run_instruction, '_check_rgb': _check_rgb_instruction,
+                 '_is_recording': lambda: _NOW_RECORDING or _FRAME_CAPTURE is not None}
+    for name in called_names:
+        if name in namespace:
+            continue
+        if name in ('tracer', 'bgcolor') or (turtle_obj is turtle and not hasattr(bound_turtle, name)):
+            namespace[name] = getattr(screen, name)
+        elif hasattr(bound_turtle, name):
+            namespace[name] = getattr(bound_turtle, name)
+        else:
+            namespace[name] = functools.partial(getattr, bound_turtle, name)  # Raises the same AttributeError as sc().
+    exec(code, namespace)
+    return namespace['compiled_sc']
+
+
+def _compile_function_code(program):
+    '''Returns a tuple of (code object, program, names of the functions it calls) for a ShortcutProgram. Running
+    the code object defines a compiled_sc() function.'''
+    lines = ['def compiled_sc():',
+             '    if _is_recording():',
+             '        return _program.run(turtle_obj=_turtle_obj)  # Let the interpreter record or capture the shortcuts.']
+
+    # Check the RGB color arguments before running anything, the same as ShortcutProgram.run():
+    if program._rgb_instructions:
+        lines.append('    _colormode = colormode()')
+        for i in range(len(program._rgb_instructions)):
+            lines.append('    _check_rgb(_program._rgb_instructions[' + str(i) + '], _colormode)')
+
+    called_names = {'colormode'}
+    count = 0  # The number of shortcuts that are run as method calls.
+    uses_interpreter = False
+    for i, instruction in enumerate(program.instructions):
+        handler, args, arg_strs, shortcut = instruction
+        if handler.count == 0:
+            continue  # Blanks and comments do nothing.
+
+        if _is_direct_instruction(instruction):
+            # The arguments are written with repr(), since arg_strs can have things like hex numbers:
+            if handler.name not in ('pc', 'fc', 'bc'):
+                arg_strs = tuple(repr(arg) for arg in args)
+            for line in handler.turtle_code(None, args, arg_strs):
+                lines.append('    ' + line)
+                called_names.add(_CALLED_NAME_REGEX.match(line).group(1))
+            count += handler.count
+        else:
+            lines.append('    _count += _run(_instructions[' + str(i) + '], _turtle_obj)')
+            uses_interpreter = True
+
+    if uses_interpreter:
+        lines.insert(3, '    _count = 0')
+        lines.append('    return _count + ' + str(count))
+    else:
+        lines.append('    return ' + str(count))
+    return compile('\n'.join(lines) + '\n', '<sc_compile_function>', 'exec'), program, called_names
+
+
+def _is_direct_instruction(instruction):
+    '''Returns True if a built-in shortcut's instruction can be compiled into a single method call with constant
+    arguments. Other shortcuts, like `rep`, cardinal directions, and registered shortcuts, are run by the interpreter.'''
+    handler, args, arg_strs, shortcut = instruction
+    if handler.name not in _BUILT_IN_SHORTCUTS or _SHORTCUT_HANDLERS.get(handler.name) is not handler:
+        return False
+    if handler.name in ('pc', 'fc', 'bc'):
+        return len(args) == 1  # Color names and hex codes don't depend on the colormode.
+    if handler.count != 1 or not isinstance(handler.code, str) or handler.name in CARDINAL_TO_DEGREES:
+        return False
+    # Numbers like inf and nan can't be written as Python literals:
+    return all(isinstance(arg, (int, float)) and math.isfinite(arg) for arg in args)
+
+
+_PLACEHOLDER_REGEX = re.compile(r'\{\{\s*([A-Za-z_][A-Za-z0-9_]*)\s*\}\}')
+
+
+class ShortcutTemplate:
+    """A shortcut string with jinja-style {{ }} placeholders for arguments, made by sc_template(). The shortcut
+    string is parsed once, and calling the template fills in the placeholders and runs the shortcuts:
+
+    >>> step = sc_template('pc {{color}}, f {{i}}, l 91')
+    >>> for i in range(300):
+    ...     step(color='red', i=i)
+
+    Placeholders can only be arguments, not shortcut names. Only the placeholder values are converted each time
+    the template is called; the rest of the shortcuts were already converted when the template was made. Shortcuts
+    with a [ ] block, like `rep {{count}} [f {{length}}, l 90]`, are the exception: the placeholder values are put
+    into the shortcut's text, and it's parsed each time the template is called."""
+
+    __slots__ = ('source', 'names', '_instructions', '_holes', '_block_holes')
+
+    def __init__(self, source, turtle_obj=None):
+        self.source = source
+        names = []
+        instructions = []
+        holes = []  # Tuples of (index in instructions, handler, shortcut name, arg strings, placeholder names, constant args).
+        block_holes = []  # Tuples of (index in instructions, shortcut text) for shortcuts with [ ] blocks.
+
+        # Remove any whitespace inside the placeholders so that each placeholder is a single argument:
+        with _MacroDefinitions():  # The macros that the template defines are added once all of it parses.
+            for shortcut, blocks in _split_shortcuts(_PLACEHOLDER_REGEX.sub(r'{{\1}}', source)):
+                shortcut_parts = shortcut.split()
+                if '{{' not in shortcut or shortcut_parts[0].startswith('#'):
+                    instructions.append(_parse_shortcut(shortcut, turtle_obj=turtle_obj, blocks=blocks))
+                    continue
+                if blocks:
+                    # Shortcuts with blocks are parsed after the placeholder values are put in, so just check the placeholders:
+                    if re.search(r'(?:^|[\[,\n])\s*\{\{', shortcut) is not None:
+                        raise TurtleShortcutException('Syntax error in `' + shortcut.strip() + '`: Placeholders can only be arguments, not shortcut names.')
+                    for part in re.split(r'[\s,\[\]]+', shortcut):
+                        mo = _PLACEHOLDER_REGEX.match(part)
+                        if mo is not None and mo.end() == len(part):
+                            if mo.group(1) == 'turtle_obj':
+                                raise TurtleShortcutException('Syntax error in `' + shortcut.strip() + '`: `turtle_obj` cannot be a placeholder name.')
+                            if mo.group(1) not in names:
+                                names.append(mo.group(1))
+                        elif '{{' in part or '}}' in part:
+                            raise TurtleShortcutException('Syntax error in `' + shortcut.strip() + '`: Placeholders must be a whole argument, like `{{name}}`.')
+                    block_holes.append((len(instructions), shortcut))
+                    instructions.append(None)  # This instruction is made when the template is called.
+                    continue
+
+                if shortcut_parts[0].startswith('{{'):
+                    raise TurtleShortcutException('Syntax error in `' + shortcut + '`: Placeholders can only be arguments, not shortcut names.')
+                if any(part.lower() == 'rand' or part.startswith('$') for part in shortcut_parts[1:]):
+                    raise TurtleShortcutException('Syntax error in `' + shortcut.strip() + '`: Placeholders cannot be used in shortcuts with `rand` or `$` arguments.')
+                handler = _get_handler(shortcut, shortcut_parts)
+                arg_strs = tuple(shortcut_parts[1:])
+                arg_names = []
+                constant_args = []
+                for arg_str in arg_strs:
+                    mo = _PLACEHOLDER_REGEX.match(arg_str)
+                    if mo is not None and mo.end() == len(arg_str):
+                        arg_names.append(mo.group(1))
+                        constant_args.append(None)
+                        if mo.group(1) == 'turtle_obj':
+                            raise TurtleShortcutException('Syntax error in `' + shortcut + '`: `turtle_obj` cannot be a placeholder name.')
+                        if mo.group(1) not in names:
+                            names.append(mo.group(1))
+                    elif '{{' in arg_str or '}}' in arg_str:
+                        raise TurtleShortcutException('Syntax error in `' + shortcut + '`: Placeholders must be a whole argument, like `{{name}}`.')
+                    else:
+                        arg_names.append(None)
+                        # Numeric arguments that aren't placeholders are converted once, here:
+                        if handler.convert is _convert_numbers:
+                            constant_args.append(_convert_numbers(shortcut, (arg_str,), turtle_obj)[0][0])
+                        else:
+                            constant_args.append(None)
+
+                holes.append((len(instructions), handler, shortcut_parts[0], arg_strs, tuple(arg_names), tuple(constant_args)))
+                instructions.append(None)  # This instruction is made when the template is called.
+
+        self.names = tuple(names)
+        self._instructions = tuple(instructions)
+        self._holes = tuple(holes)
+        self._block_holes = tuple(block_holes)
+
+    def __repr__(self):
+        return 'ShortcutTemplate(' + repr(self.source) + ')'
+
+    def bind(self, turtle_obj=None, **values):
+        """Return a ShortcutProgram of the template with its placeholders filled in by the keyword arguments."""
+        if turtle_obj is None:
+            turtle_obj = turtle  # Use the main turtle given by the module.
+
+        for name in self.names:
+            if name not in values:
+                raise TurtleShortcutException('Missing a value for the `{{' + name + '}}` placeholder in `' + self.source + '`.')
+        if len(values) != len(self.names):
+            for name in values:
+                if name not in self.names:
+                    raise TurtleShortcutException('`' + name + '` is not a placeholder in `' + self.source + '`.')
+
+        instructions = list(self._instructions)
+        for index, handler, name, arg_strs, arg_names, constant_args in self._holes:
+            filled_arg_strs = []
+            args = []
+            for arg_str, arg_name, constant_arg in zip(arg_strs, arg_names, constant_args):
+                if arg_name is None:
+                    filled_arg_strs.append(arg_str)
+                    args.append(constant_arg)
+                    continue
+
+                value = values[arg_name]
+                if type(value) in (int, float):
+                    filled_arg_strs.append(str(value))
+                    args.append(float(value))  # Numbers don't need to be parsed from a string.
+                else:
+                    value = str(value)
+                    if len(value.split()) != 1 or ',' in value:
+                        raise TurtleShortcutException('The `{{' + arg_name + '}}` placeholder value ' + repr(value) + ' must be a single argument.')
+                    filled_arg_strs.append(value)
+                    args.append(None)
+            shortcut = name + ' ' + ' '.join(filled_arg_strs)
+
+            if handler.convert is _convert_numbers:
+                # Only convert the placeholder values that are strings, since the other arguments are already numbers:
+                for i, arg in enumerate(args):
+                    if arg is None:
+                        args[i] = _convert_numbers(shortcut, (filled_arg_strs[i],), turtle_obj)[0][0]
+                instructions[index] = (handler, tuple(args), tuple(filled_arg_strs), shortcut)
+            else:
+                args, converted_arg_strs = handler.convert(shortcut, filled_arg_strs, turtle_obj)
+                instructions[index] = (handler, args, converted_arg_strs, shortcut)
+
+        with _MacroDefinitions():
+            for index, shortcut in self._block_holes:
+                def fill_in(mo):
+                    value = values[mo.group(1)]
+                    if type(value) in (int, float):
+                        return str(value)
+                    value = str(value)
+                    if len(value.split()) != 1 or _SEPARATOR_OR_BRACKET_REGEX.search(value) is not None:
+                        raise TurtleShortcutException('The `{{' + mo.group(1) + '}}` placeholder value ' + repr(value) + ' must be a single argument.')
+                    return value
+                (filled_shortcut, blocks), = _split_shortcuts(_PLACEHOLDER_REGEX.sub(fill_in, shortcut))
+                instructions[index] = _parse_shortcut(filled_shortcut, turtle_obj=turtle_obj, blocks=blocks)
+
+        return ShortcutProgram(self.source, instructions)
+
+    def __call__(self, turtle_obj=None, **values):
+        """Fill in the placeholders with the keyword arguments and run the shortcuts. Returns the number of shortcuts run."""
+        return self.bind(turtle_obj=turtle_obj, **values).run(turtle_obj=turtle_obj)
+
+
+_RANDOM = Random()  # The random number generator for `rand` arguments.
+
+
+def sc_seed(a=None):
+    """Seeds the random number generator used by `rand` arguments in shortcuts, so that drawings with random
+    numbers can be reproduced. This generator is separate from the random module's generator."""
+    _RANDOM.seed(a)
+
+
+def sc_path(lengths, turns, turtle_obj=None):
+    """Moves the turtle forward by each of the lengths, turning left by the matching turn after each one. This
+    is the same as sc('f 10, l 5, f 20, l 5') for sc_path([10, 20], [5, 5]), but all of the positions are calculated
+    at once (with NumPy, if it's installed), and the screen's tracer is off while the turtle goes to them, so the
+    screen is only updated once at the end. Only the math is vectorized: the turtle still goes to each position
+    with its own goto(), which is most of the time that drawing takes. The turns can also be a single number, which
+    is used after every length. The turns are in degrees or radians, the same as the turtle's left().
+
+    The lengths and turns can be lists, NumPy arrays, or any other sequence of numbers. After drawing, the turtle
+    has the same position and heading as if forward() and left() were called for each length and turn. Returns
+    the number of lines drawn."""
+    turtle_obj = _get_turtle(turtle_obj)
+
+    # The size of the turtle's angle units, and its direction in radians counterclockwise from east. In 'logo' mode,
+    # headings start at north and go clockwise instead:
+    degrees_per_unit = math.degrees(1) if in_radians_mode(turtle_obj) else 1.0
+    start_heading = turtle_obj.heading() * degrees_per_unit
+    if turtle_obj.getscreen().mode() == 'logo':
+        start_heading = 90.0 - start_heading
+    start_angle = math.radians(start_heading)
+    start_x, start_y = turtle_obj.position()
+
+    if _numpy is not None:
+        lengths = _numpy.asarray(lengths, dtype=float).ravel()
+        turns = _numpy.asarray(turns, dtype=float).ravel()
+        if turns.size == 1:
+            turns = _numpy.full(lengths.shape, turns[0])
+        elif turns.shape != lengths.shape:
+            raise TurtleShortcutException('sc_path() needs the same number of lengths and turns, not ' + str(lengths.size) + ' and ' + str(turns.size) + '.')
+
+        # The angle of each line is the starting angle plus all of the turns before it:
+        angles = _numpy.empty(lengths.shape)
+        if lengths.size:
+            angles[0] = 0.0
+            _numpy.cumsum(turns[:-1], out=angles[1:])
+        angles = start_angle + _numpy.radians(angles * degrees_per_unit)
+        xs = (start_x + _numpy.cumsum(lengths * _numpy.cos(angles))).tolist()
+        ys = (start_y + _numpy.cumsum(lengths * _numpy.sin(angles))).tolist()
+        total_turn = float(turns.sum())
+        lengths, turns = lengths.tolist(), turns.tolist()
+    else:
+        lengths = [float(length) for length in lengths]
+        try:
+            turns = [float(turn) for turn in turns]
+        except TypeError:
+            turns = [float(turns)] * len(lengths)  # A single number is used for every turn.
+        if len(turns) == 1:
+            turns = turns * len(lengths)
+        elif len(turns) != len(lengths):
+            raise TurtleShortcutException('sc_path() needs the same number of lengths and turns, not ' + str(len(lengths)) + ' and ' + str(len(turns)) + '.')
+
+        xs, ys = [], []
+        x, y, angle = start_x, start_y, start_angle
+        for length, turn in zip(lengths, turns):
+            x += length * math.cos(angle)
+            y += length * math.sin(angle)
+            xs.append(x)
+            ys.append(y)
+            angle += math.radians(turn * degrees_per_unit)
+        total_turn = sum(turns)
+
+    _draw_points(turtle_obj, xs, ys)
+    turtle_obj.left(total_turn % (360.0 / degrees_per_unit))
+
+    # If begin_recording() has been called, log the equivalent shortcuts.
+    if _NOW_RECORDING:
+        for length, turn in zip(lengths, turns):
+            RECORDED_SHORTCUTS.append('f ' + _number_str(length))
+            RECORDED_SHORTCUTS.append('l ' + _number_str(turn))
+    return len(xs)
+
+
+def sc_points(xs, ys, turtle_obj=None):
+    """Moves the turtle to each of the points, which have the x coordinates in xs and the y coordinates in ys.
+    This is the same as sc('g 0 0, g 10 20') for sc_points([0, 10], [0, 20]), but with the screen's tracer off
+    while the turtle goes to the points, so the screen is only updated once at the end.
+    The xs and ys can be lists, NumPy arrays, or any other sequence of numbers. The turtle's heading doesn't change.
+    Returns the number of lines drawn."""
+    turtle_obj = _get_turtle(turtle_obj)
+
+    if _numpy is not None:
+        xs = _numpy.asarray(xs, dtype=float).ravel().tolist()
+        ys = _numpy.asarray(ys, dtype=float).ravel().tolist()
+    else:
+        xs = [float(x) for x in xs]
+        ys = [float(y) for y in ys]
+    if len(xs) != len(ys):
+        raise TurtleShortcutException('sc_points() needs the same number of xs and ys, not ' + str(len(xs)) + ' and ' + str(len(ys)) + '.')
+
+    _draw_points(turtle_obj, xs, ys)
+
+    # If begin_recording() has been called, log the equivalent shortcuts.
+    if _NOW_RECORDING:
+        for x, y in zip(xs, ys):
+            RECORDED_SHORTCUTS.append('g ' + _number_str(x) + ' ' + _number_str(y))
+    return len(xs)
+
+
+def _number_str(n):
+    '''Returns the number as a string, without a .0 at the end if it is a whole number.'''
+    if n % 1 == 0.0:
+        n = int(n)
+    return str(n)
+
+
+def _get_turtle(turtle_obj):
+    '''Returns the turtle object, or the main turtle's object if turtle_obj is None or the turtle module.'''
+    if turtle_obj is None or turtle_obj is turtle:
+        return turtle.getturtle()
+    return turtle_obj
+
+
+def _draw_points(turtle_obj, xs, ys):
+    '''Moves the turtle to each of the points with goto() while the screen's tracer is turned off, so the screen is
+    only updated once at the end. Each line is still drawn by its own goto() call, so the turtle's undo buffer and
+    the items that its clear() erases are the same as from calling goto() for each point.'''
+    screen = turtle_obj.getscreen()
+    tracer_n, tracer_delay = screen.tracer(), screen.delay()
+    screen.tracer(0)
+    try:
+        goto = turtle_obj.goto
+        for x, y in zip(xs, ys):
+            goto(x, y)
+    finally:
+        screen.tracer(tracer_n, tracer_delay)  # This updates the screen, unless tracing was already off.
+
+
+def sc_template(*args, turtle_obj=None):
+    """Parse the shortcut strings into a ShortcutTemplate with {{ }} placeholders for arguments, i.e.
+    sc_template('f {{length}}, l 90')(length=100) is the same as sc('f 100, l 90')."""
+    return ShortcutTemplate(','.join(args), turtle_obj=turtle_obj)
+
+
+def _run_shortcut(shortcut, turtle_obj=None, _return_turtle_code=False):
+    '''Runs a single shortcut. The shortcut is parsed once, and the instruction that parsing produces is what gets run.'''
+
+    if turtle_obj is None:
+        turtle_obj = turtle  # Use the main turtle given by the module.
+
+    with _MacroDefinitions():
+        instruction = _parse_shortcut(shortcut, turtle_obj=turtle_obj)
+    if instruction[0].name in ('pc', 'fc', 'bc') and len(instruction[1]) == 3:
+        _check_rgb_instruction(instruction, turtle_obj.colormode())
+    return _run_instruction(instruction, turtle_obj, _return_turtle_code=_return_turtle_code)
+
+
+_SEPARATOR_REGEX = re.compile(r'[,\n]')
+_SEPARATOR_OR_BRACKET_REGEX = re.compile(r'[\[\],\n]')
+_BRACKET_REGEX = re.compile(r'[\[\]]')
+_COMMENT_START_REGEX = re.compile(r'[^\S\n]*#')
+_AFTER_BLOCK_REGEX = re.compile(r'[^\S\n]*(?:[,\n]|\Z)')
+_NEXT_BLOCK_REGEX = re.compile(r'[^\S\n]*\[')
+
+
+def _split_shortcuts(shortcuts):
+    '''Splits a string of shortcuts at the commas and newlines that aren't inside [ ] blocks. Returns a list of
+    (shortcut, blocks) tuples, where blocks is a tuple of the text inside each of the shortcut's [ ] blocks.'''
+    if '[' not in shortcuts and ']' not in shortcuts:
+        # Newlines become commas as well:
+        return [(shortcut, ()) for shortcut in shortcuts.replace('\n', ',').split(',')]
+
+    split_shortcuts = []
+    start = 0
+    while True:
+        # Comments go up to the next comma or newline, even if they have brackets in them:
+        if _COMMENT_START_REGEX.match(shortcuts, start):
+            mo = _SEPARATOR_REGEX.search(shortcuts, start)
+        else:
+            mo = _SEPARATOR_OR_BRACKET_REGEX.search(shortcuts, start)
+
+        if mo is None:
+            split_shortcuts.append((shortcuts[start:], ()))
+            return split_shortcuts
+        elif mo.group() in (',', '\n'):
+            split_shortcuts.append((shortcuts[start:mo.start()], ()))
+            start = mo.end()
+            continue
+        elif mo.group() == ']':
+            raise TurtleShortcutException('Syntax error in `' + shortcuts[start:mo.end()].strip() + '`: `]` has no matching `[`.')
+
+        # Find the ] that matches each [, skipping over any nested blocks. A shortcut can have more than one block:
+        blocks = []
+        while mo is not None:
+            depth = 1
+            end = mo.end()
+            while depth > 0:
+                bracket_mo = _BRACKET_REGEX.search(shortcuts, end)
+                if bracket_mo is None:
+                    raise TurtleShortcutException('Syntax error in `' + shortcuts[start:].strip() + '`: `[` has no matching `]`.')
+                depth += 1 if bracket_mo.group() == '[' else -1
+                end = bracket_mo.end()
+            blocks.append(shortcuts[mo.end():end - 1])
+            mo = _NEXT_BLOCK_REGEX.match(shortcuts, end)
+        split_shortcuts.append((shortcuts[start:end], tuple(blocks)))
+
+        # Only whitespace can come between the ] and the next comma:
+        after_mo = _AFTER_BLOCK_REGEX.match(shortcuts, end)
+        if after_mo is None:
+            raise TurtleShortcutException('Syntax error in `' + shortcuts[start:].strip() + '`: Missing a comma after `]`.')
+        if after_mo.end() == len(shortcuts) and not after_mo.group().endswith((',', '\n')):
+            return split_shortcuts
+        start = after_mo.end()
+
+
+class _DynamicArgument:
+    '''The base class for shortcut arguments that are evaluated each time the shortcut runs, instead of once when
+    the shortcut is parsed. The code attribute is the Python code that scs() shows for the argument, and the
+    samples attribute has the argument strings that the shortcut is checked with when it is parsed. Each subclass
+    has an evaluate() method that returns the argument's value.'''
+
+    __slots__ = ('code', 'samples')
+
+
+class _RandomArgument(_DynamicArgument):
+    '''A `rand` argument in a shortcut, which is evaluated to a random number each time the shortcut runs.
+    `rand` on its own is a random float from 0.0 up to 1.0, `rand 1 6` is a random integer from 1 to 6, and
+    `rand 0.5 1.5` is a random float from 0.5 to 1.5.'''
+
+    __slots__ = ('low', 'high', 'integers')
+
+    def __init__(self, low_str=None, high_str=None):
+        if low_str is None:
+            self.low, self.high, self.integers = 0.0, 1.0, False
+            self.code = 'random()'
+        else:
+            self.integers = _INTEGER_REGEX.match(low_str) is not None and _INTEGER_REGEX.match(high_str) is not None
+            if self.integers:
+                self.low, self.high = int(low_str), int(high_str)
+                self.code = 'randint(' + str(self.low) + ', ' + str(self.high) + ')'
+            else:
+                self.low, self.high = float(low_str), float(high_str)
+                self.code = 'uniform(' + str(self.low) + ', ' + str(self.high) + ')'
+        self.samples = (str(self.low), str(self.high))
+
+    def evaluate(self):
+        '''Returns a random number for this argument from the turtlesc random number generator.'''
+        if self.integers:
+            return _RANDOM.randint(self.low, self.high)
+        elif self.code == 'random()':
+            return _RANDOM.random()
+        return _RANDOM.uniform(self.low, self.high)
+
+
+class _ExpressionArgument(_DynamicArgument):
+    '''A `$` argument in a shortcut, such as `$i*2`, which is an arithmetic expression of numbers and variables.
+    The expression is parsed into a tree once and compiled into nested functions, which are called each time the
+    shortcut runs to get the expression's value from the current SC_VARIABLES.'''
+
+    __slots__ = ('source', 'tree', '_evaluate')
+
+    def __init__(self, shortcut, source):
+        self.source = source
+        self.tree = _parse_expression(shortcut, source)
+        self._evaluate = _compile_expression(self.tree)
+        self.code = source[1:].replace('$', '')  # The expression syntax is the same as Python's.
+        self.samples = ('0',)
+
+    def evaluate(self):
+        '''Returns the expression's value for the current variables.'''
+        raise_exception = False
+        try:
+            return self._evaluate()
+        except ArithmeticError:
+            raise_exception = True  # We don't raise here so we can hide the original exception and make the stack trace a bit neater.
+        if raise_exception:
+            raise TurtleShortcutException('Error in `' + self.source + '`: The expression could not be calculated, such as when dividing by zero.')
+
+
+_INTEGER_REGEX = re.compile(r'[+-]?\d+\Z')
+_EXPRESSION_TOKEN_REGEX = re.compile(r'(\d+\.\d*|\.\d+|\d+)|\$?([A-Za-z][A-Za-z0-9_]*)|(\*\*|//|[-+*/%()])')
+_VARIABLE_NAME_REGEX = re.compile(r'[A-Za-z][A-Za-z0-9_]*\Z')
+_BINARY_OPERATORS = {'+': operator.add, '-': operator.sub, '*': operator.mul, '/': operator.truediv,
+                     '//': operator.floordiv, '%': operator.mod, '**': operator.pow}
+
+
+def _parse_expression(shortcut, source):
+    '''Parses a `$` expression argument like `$(i+1)*2` into a tree of tuples: ('num', number), ('var', name),
+    ('neg', tree), or (operator, left tree, right tree). Operator precedence is the same as in Python.'''
+    tokens = []
+    i = 1  # Skip the leading $.
+    while i < len(source):
+        mo = _EXPRESSION_TOKEN_REGEX.match(source, i)
+        if mo is None:
+            raise TurtleShortcutException('Syntax error in `' + shortcut.strip() + '`: `' + source + '` is not a valid expression.')
+        if mo.group(1) is not None:
+            tokens.append(('num', float(mo.group(1)) if '.' in mo.group(1) else int(mo.group(1))))
+        elif mo.group(2) is not None:
+            tokens.append(('var', mo.group(2)))
+        else:
+            tokens.append(('op', mo.group(3)))
+        i = mo.end()
+    tokens.append(('end', None))
+
+    position = 0
+
+    def peek():
+        return tokens[position][1] if tokens[position][0] == 'op' else None
+
+    def syntax_error():
+        return TurtleShortcutException('Syntax error in `' + shortcut.strip() + '`: `' + source + '` is not a valid expression.')
+
+    # A recursive descent parser, with one function for each level of operator precedence:
+    def parse_sum():
+        nonlocal position
+        tree = parse_product()
+        while peek() in ('+', '-'):
+            position += 1
+            tree = (tokens[position - 1][1], tree, parse_product())
+        return tree
+
+    def parse_product():
+        nonlocal position
+        tree = parse_unary()
+        while peek() in ('*', '/', '//', '%'):
+            position += 1
+            tree = (tokens[position - 1][1], tree, parse_unary())
+        return tree
+
+    def parse_unary():
+        nonlocal position
+        if peek() in ('-', '+'):
+            sign = peek()
+            position += 1
+            tree = parse_unary()
+            return ('neg', tree) if sign == '-' else tree
+        return parse_power()
+
+    def parse_power():
+        nonlocal position
+        tree = parse_atom()
+        if peek() == '**':
+            position += 1
+            tree = ('**', tree, parse_unary())  # ** is right-associative and binds tighter than a unary minus on its left.
+        return tree
+
+    def parse_atom():
+        nonlocal position
+        kind, value = tokens[position]
+        if kind in ('num', 'var'):
+            position += 1
+            return (kind, value)
+        if value == '(':
+            position += 1
+            tree = parse_sum()
+            if peek() != ')':
+                raise syntax_error()
+            position += 1
+            return tree
+        raise syntax_error()
+
+    tree = parse_sum()
+    if tokens[position][0] != 'end':
+        raise syntax_error()
+    return tree
+
+
+def _compile_expression(tree):
+    '''Returns a function with no parameters that calculates the value of the expression tree.'''
+    if tree[0] == 'num':
+        value = tree[1]
+        return lambda: value
+    elif tree[0] == 'var':
+        name = tree[1]
+        def get_variable():
+            try:
+                return SC_VARIABLES[name]
+            except KeyError:
+                pass  # We don't raise here so we can hide the original KeyError and make the stack trace a bit neater.
+            raise TurtleShortcutException('`' + name + '` is not a variable. Set it first with a shortcut like `set ' + name + ' 0`.')
+        return get_variable
+    elif tree[0] == 'neg':
+        operand = _compile_expression(tree[1])
+        return lambda: -operand()
+
+    operator_func = _BINARY_OPERATORS[tree[0]]
+    left, right = _compile_expression(tree[1]), _compile_expression(tree[2])
+    return lambda: operator_func(left(), right())
+
+
+def _parse_dynamic_args(shortcut, arg_strs):
+    '''Returns a list of the argument strings with each `$` expression replaced by an _ExpressionArgument object
+    and each `rand` or `rand low high` group replaced by a _RandomArgument object.'''
+    args = []
+    i = 0
+    while i < len(arg_strs):
+        if arg_strs[i].startswith('$'):
+            args.append(_ExpressionArgument(shortcut, arg_strs[i]))
+            i += 1
+            continue
+        elif arg_strs[i].lower() != 'rand':
+            args.append(arg_strs[i])
+            i += 1
+            continue
+
+        # `rand` is followed by its low and high numbers, if the next two arguments are both numbers:
+        try:
+            low, high = float(arg_strs[i + 1]), float(arg_strs[i + 2])
+            has_range = True
+        except (IndexError, ValueError):
+            has_range = False
+        if has_range:
+            if low > high:
+                raise TurtleShortcutException('Syntax error in `' + shortcut.strip() + '`: The first number after `rand` cannot be larger than the second.')
+            args.append(_RandomArgument(arg_strs[i + 1], arg_strs[i + 2]))
+            i += 3
+        else:
+            args.append(_RandomArgument())
+            i += 1
+    return args
+
+
+def _parse_shortcuts(shortcuts, turtle_obj=None):
+    '''Checks that a string of shortcuts is syntactically valid and returns a list of its instruction tuples.'''
+    return [_parse_shortcut(shortcut, turtle_obj=turtle_obj, blocks=blocks) for shortcut, blocks in _split_shortcuts(shortcuts)]
+
+
+def _parse_shortcut(shortcut, turtle_obj=None, blocks=()):
+    '''Checks that a single shortcut is syntactically valid and returns it as an instruction tuple of
+    (shortcut handler, converted arguments, argument strings, original shortcut). The blocks are the text inside
+    each of the shortcut's [ ] brackets, if it has them.'''
 
     if turtle_obj is None:
         turtle_obj = turtle  # Use the main turtle given by the module.
 
     # Clean up shortcut name from "  FOrWARD " to "f", for example.
-    shortcut_parts = shortcut.strip().split()
+    if not blocks:
+        shortcut_parts = shortcut.split()
+    else:
+        shortcut_parts = shortcut[:shortcut.index('[')].split()
     if len(shortcut_parts) == 0:
-        if _return_turtle_code:
-            return ('',)
+        if blocks:
+            raise TurtleShortcutException('Syntax error in `' + shortcut.strip() + '`: A [ ] block must come after a shortcut like `rep`.')
+        return (_BLANK_HANDLER, (), (), shortcut)  # Blank strings have zero shortcuts.
+
+    # Macros are expanded when they're parsed, so macro calls and definitions are parsed separately:
+    if _macro_body(shortcut_parts[0].lower()) is not None:
+        return _parse_macro_call(shortcut, shortcut_parts, blocks)
+    elif shortcut_parts[0].lower() == 'def':
+        return _parse_macro_definition(shortcut, shortcut_parts, blocks, turtle_obj)
+
+    dynamic_args = None
+    if ('$' in shortcut or 'rand' in shortcut.lower()) and not shortcut_parts[0].startswith('#'):
+        dynamic_args = _parse_dynamic_args(shortcut, shortcut_parts[1:])
+        if not any(isinstance(arg, _DynamicArgument) for arg in dynamic_args):
+            dynamic_args = None  # The shortcut has `rand` in it, but not as an argument.
         else:
-            return 0  # Return 0 because blank strings have zero shortcuts.
-    _sc = shortcut_parts[0].lower()
-    _sc = _MAP_FULL_TO_SHORT_NAMES.get(_sc, _sc)
+            # Check the shortcut with the first sample values here, and the last sample values below:
+            shortcut_parts = shortcut_parts[:1] + [arg.samples[0] if isinstance(arg, _DynamicArgument) else arg for arg in dynamic_args]
 
     # Check that the shortcut's syntax is valid:
+    handler = _get_handler(shortcut, shortcut_parts)
+    arg_strs = shortcut_parts[1:]
+    args, arg_strs = handler.convert(shortcut, arg_strs, turtle_obj)
+
+    if dynamic_args is not None:
+        handler.convert(shortcut, [arg.samples[-1] if isinstance(arg, _DynamicArgument) else arg for arg in dynamic_args], turtle_obj)
+        # The code for a dynamic argument is its Python expression:
+        args = tuple(dynamic_arg if isinstance(dynamic_arg, _DynamicArgument) else arg for dynamic_arg, arg in zip(dynamic_args, args))
+        arg_strs = tuple(dynamic_arg.code if isinstance(dynamic_arg, _DynamicArgument) else arg_str for dynamic_arg, arg_str in zip(dynamic_args, arg_strs))
+
+    if handler.block:
+        if len(blocks) == 0:
+            raise TurtleShortcutException('Syntax error in `' + shortcut + '`: Missing the [ ] block of shortcuts.')
+        elif len(blocks) > 1:
+            raise TurtleShortcutException('Syntax error in `' + shortcut.strip() + '`: `' + shortcut_parts[0] + '` only takes one [ ] block.')
+        args += (tuple(_parse_shortcuts(blocks[0], turtle_obj=turtle_obj)),)
+    elif blocks:
+        raise TurtleShortcutException('Syntax error in `' + shortcut.strip() + '`: `' + shortcut_parts[0] + '` does not take a [ ] block.')
+
+    if dynamic_args is not None:
+        # Shortcuts with dynamic arguments are converted again each time they run:
+        return (_DYNAMIC_HANDLER, (handler, tuple(dynamic_args), args), arg_strs, shortcut)
+    return (handler, args, arg_strs, shortcut)
+
+
+def _parse_macro_call(shortcut, shortcut_parts, blocks):
+    '''Returns the instruction tuple for calling a macro, which runs the macro's already-parsed instructions.'''
+    if len(shortcut_parts) > 1:
+        raise TurtleShortcutException('Syntax error in `' + shortcut.strip() + '`: Macros do not have arguments.')
+    elif blocks:
+        raise TurtleShortcutException('Syntax error in `' + shortcut.strip() + '`: `' + shortcut_parts[0] + '` does not take a [ ] block.')
+
+    name = shortcut_parts[0].lower()
+    # In the Python code for a recursive macro, the macro calls itself with the next depth:
+    depth_arg = 'depth + 1' if name in _MACROS_BEING_DEFINED else ''
+    return (_MACRO_HANDLER, (_macro_body(name),), (name, depth_arg), shortcut)
+
+
+def _macro_body(name):
+    '''Returns the instructions of the macro with the name, or None if there is no macro with that name. The macros
+    that the shortcuts being parsed define come before the ones in _MACROS.'''
+    if _NEW_MACROS is not None and name in _NEW_MACROS:
+        definition = _NEW_MACROS[name]
+    else:
+        definition = _MACROS.get(name)
+    return None if definition is None else definition[1][2]
+
+
+class _MacroDefinitions:
+    '''A `with` statement around parsing shortcuts, so that the macros they define are only added to _MACROS if all
+    of them parse without errors. Until then, the macros are in _NEW_MACROS. A syntax error at the end of a program
+    doesn't leave the macros at its start defined, and doesn't clear the cache of compiled programs. Parsing inside
+    of another _MacroDefinitions adds the macros when the outer one ends. If keep is False, the macros are only
+    used while parsing and are never added to _MACROS.'''
+
+    def __init__(self, keep=True):
+        self._keep = keep
+        self._outer = False
+
+    def __enter__(self):
+        global _NEW_MACROS
+        self._outer = _NEW_MACROS is None
+        if self._outer:
+            _NEW_MACROS = {}
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        global _NEW_MACROS
+        if not self._outer:
+            return
+        new_macros, _NEW_MACROS = _NEW_MACROS, None
+        if exc_type is None and self._keep and new_macros:
+            _MACROS.update(new_macros)
+            clear_sc_cache()  # Programs already in the cache could be using an old macro with one of these names.
+
+
+def _parse_macro_definition(shortcut, shortcut_parts, blocks, turtle_obj):
+    '''Parses a `def name [shortcuts]` or `def name depth [shortcuts] [base shortcuts]` macro definition and
+    adds the macro to _NEW_MACROS, so the shortcuts after it can call it. It's added to _MACROS once the rest of the
+    program parses too. Returns the instruction tuple for the definition, which doesn't do anything when run.
+
+    A macro with a depth can call itself. Its shortcuts are expanded up to the depth, and at that depth the calls
+    to itself run the base shortcuts instead (or nothing, if there is no base block.)'''
+    handler = _get_handler(shortcut, shortcut_parts)
+    args, arg_strs = handler.convert(shortcut, shortcut_parts[1:], turtle_obj)
+    name, depth = args
+    if len(blocks) == 0:
+        raise TurtleShortcutException('Syntax error in `' + shortcut.strip() + '`: Missing the [ ] block of shortcuts.')
+    elif len(blocks) > (1 if depth is None else 2):
+        raise TurtleShortcutException('Syntax error in `' + shortcut.strip() + '`: Too many [ ] blocks. Only macros with a depth have a second [ ] block.')
+
+    with _MacroDefinitions():
+        # A previous macro with this name is hidden while this one is parsed. If there's an error, _NEW_MACROS is
+        # thrown away, so the previous macro is still there:
+        _NEW_MACROS[name] = None
+        try:
+            if depth is None:
+                base = ()
+                body = tuple(_parse_shortcuts(blocks[0], turtle_obj=turtle_obj))
+            else:
+                # Parse the shortcuts once for each level of depth, starting from the deepest level. Each level's
+                # calls to the macro run the level below it, so the levels share their instructions instead of
+                # copying them.
+                base = tuple(_parse_shortcuts(blocks[1], turtle_obj=turtle_obj)) if len(blocks) == 2 else ()
+                body = base
+                _MACROS_BEING_DEFINED.add(name)
+                for level in range(depth):
+                    _NEW_MACROS[name] = (handler, (name, depth, body, base), arg_strs, shortcut)
+                    body = tuple(_parse_shortcuts(blocks[0], turtle_obj=turtle_obj))
+        finally:
+            _MACROS_BEING_DEFINED.discard(name)
+        _NEW_MACROS[name] = (handler, (name, depth, body, base), arg_strs, shortcut)
+    return _NEW_MACROS[name]
+
+
+def _iter_instructions(instructions, _seen_blocks=None):
+    '''Yields the instructions, including the instructions inside of [ ] blocks and macros. Blocks that are in
+    more than one place, such as a macro that is called more than once, are only yielded the first time.'''
+    if _seen_blocks is None:
+        _seen_blocks = set()
+    for instruction in instructions:
+        yield instruction
+        if instruction[0].block:
+            block = instruction[1][-1]
+        elif instruction[0] is _DYNAMIC_HANDLER and instruction[1][0].block:
+            block = instruction[1][2][-1]
+        else:
+            continue
+        if id(block) not in _seen_blocks:
+            _seen_blocks.add(id(block))
+            yield from _iter_instructions(block, _seen_blocks)
+
+
+def _get_handler(shortcut, shortcut_parts):
+    '''Returns the handler for the shortcut's name, raising a TurtleShortcutException if the name isn't a shortcut
+    or the shortcut has the wrong number of arguments.'''
+    handler = _SHORTCUT_HANDLERS.get(shortcut_parts[0].lower())
+    if handler is None:
+        if shortcut_parts[0].startswith('#'):
+            return _COMMENT_HANDLER
+        else:
+            raise TurtleShortcutException('Syntax error in `' + shortcut + '`: `' + shortcut_parts[0] + '` is not a turtle shortcut.')
 
-    if _sc not in ALL_SHORTCUTS:
-        raise TurtleShortcutException('Syntax error in `' + shortcut + '`: `' + shortcut_parts[0] + '` is not a turtle shortcut.')
+    arg_count = len(shortcut_parts) - 1
+    if handler.arity is not None and arg_count not in handler.arity:
+        if arg_count < handler.arity[0]:
+            raise TurtleShortcutException('Syntax error in `' + shortcut + '`: ' + handler.missing_message)
+        else:
+            raise TurtleShortcutException('Syntax error in `' + shortcut + '`: ' + handler.invalid_message)
+    return handler
 
-    raise_exception = False
-    count_of_shortcuts_run = 0
 
+def _check_rgb_instruction(instruction, colormode):
+    '''Raises TurtleShortcutException if the RGB numbers of a pc, fc, or bc instruction are invalid for the colormode.'''
+    color_arg = instruction[1]
+    if colormode == 1.0 and (color_arg[0] > 1.0 or color_arg[1] > 1.0 or color_arg[2] > 1.0):
+        raise TurtleShortcutException(instruction[3] + ' is invalid because colormode is 1.0 and one or more RGB color values are greater than 1.0.')
 
-    # SHORTCUTS THAT TAKE A VARIABLE NUMBER OF ARGUMENTS:
-    if _sc in ('#',):
-        if _sc == '#':
-            if _return_turtle_code:
-                return (shortcut.lstrip(),)  # Return the comment as is (but with leading whitespace removed).
-            pass  # Comments do nothing.
-        else:  # pragma: no cover
-            assert False, 'Unhandled shortcut: ' + _sc
 
+def _run_instruction(instruction, turtle_obj, _return_turtle_code=False):
+    '''Runs a single instruction returned by _parse_shortcut(). Returns the number of shortcuts run, or a tuple of
+    turtle code lines if _return_turtle_code is True.'''
 
-    # SHORTCUTS THAT TAKE A SINGLE NUMERIC ARGUMENT:
-    elif _sc in ('f', 'b', 'r', 'l', 'x', 'y', 'ps', 'sh', 'cir', 'sleep', 'n', 's', 'e', 'w', 'nw', 'ne', 'sw', 'se', 'dot', 'cs', 'spd'):
-        if len(shortcut_parts) < 2:
-            raise TurtleShortcutException('Syntax error in `' + shortcut + '`: Missing the required numeric argument.')
-        if len(shortcut_parts) > 2:
-            raise TurtleShortcutException('Syntax error in `' + shortcut + '`: Too many arguments.')
+    handler, args, arg_strs, shortcut = instruction
 
-        # Convert the string arguments for the `speed` shortcut to their numeric equivalents.
-        if _sc == 'spd':
-            shortcut_parts[1] = {'fastest': 0, 'fast': 10, 'normal': 6, 'slow': 3, 'slowest': 1}.get(shortcut_parts[1].lower(), shortcut_parts[1].lower())
+    if _return_turtle_code:
+        return handler.turtle_code(turtle_obj, args, arg_strs)
 
-        try:
-            float(shortcut_parts[1])
-        except ValueError:
-            raise_exception = True  # We don't raise here so we can hide the original ValueError and make the stack trace a bit neater.
-        if raise_exception:
-            raise TurtleShortcutException('Syntax error in `' + shortcut + '`: `' + shortcut_parts[1] + '` is not a number.')
-
-        # `dot` shortcut doesn't allow negative values:
-        if _sc == 'dot' and float(shortcut_parts[1]) < 0:
-            raise TurtleShortcutException('Syntax error in `' + shortcut + '`: `dot` argument cannot be a negative number.')
-
-        if not dry_run:
-            # Run the shortcut that has exactly one numeric argument:
-            if _sc == 'f':
-                if _return_turtle_code:
-                    return ('forward(' + shortcut_parts[1] + ')',)
-                turtle_obj.forward(float(shortcut_parts[1]))
-            elif _sc == 'b':
-                if _return_turtle_code:
-                    return ('backward(' + shortcut_parts[1] + ')',)
-                turtle_obj.backward(float(shortcut_parts[1]))
-            elif _sc == 'r':
-                if _return_turtle_code:
-                    return ('right(' + shortcut_parts[1] + ')',)
-                turtle_obj.right(float(shortcut_parts[1]))
-            elif _sc == 'l':
-                if _return_turtle_code:
-                    return ('left(' + shortcut_parts[1] + ')',)
-                turtle_obj.left(float(shortcut_parts[1]))
-            elif _sc == 'x':
-                if _return_turtle_code:
-                    return ('setx(' + shortcut_parts[1] + ')',)
-                turtle_obj.setx(float(shortcut_parts[1]))
-            elif _sc == 'y':
-                if _return_turtle_code:
-                    return ('sety(' + shortcut_parts[1] + ')',)
-                turtle_obj.sety(float(shortcut_parts[1]))
-            elif _sc == 'ps':
-                if _return_turtle_code:
-                    return ('pensize(' + shortcut_parts[1] + ')',)
-                turtle_obj.pensize(float(shortcut_parts[1]))
-            elif _sc == 'sh':
-                if _return_turtle_code:
-                    return ('setheading(' + shortcut_parts[1] + ')',)
-                turtle_obj.setheading(float(shortcut_parts[1]))
-            elif _sc == 'cir':
-                if _return_turtle_code:
-                    return ('circle(' + shortcut_parts[1] + ')',)
-                turtle_obj.circle(float(shortcut_parts[1]))
-            elif _sc == 'sleep':
-                if _return_turtle_code:
-                    return ('sleep(' + shortcut_parts[1] + ')', )
-                time.sleep(float(shortcut_parts[1]))
-            elif _sc in ('n', 's', 'e', 'w', 'nw', 'ne', 'sw', 'se'):
-                originally_in_radians_mode = in_radians_mode()
-
-                if _return_turtle_code:
-                    if originally_in_radians_mode:
-                        return ('degrees()', 'setheading(' + CARDINAL_TO_DEGREES[_sc] + ')', 'forward(' + shortcut_parts[1] + ')', 'radians()')
-                    else:
-                        return ('setheading(' + CARDINAL_TO_DEGREES[_sc] + ')', 'forward(' + shortcut_parts[1] + ')')
-                turtle.degrees()
-                if _sc == 'n':
-                    turtle.setheading(90)
-                elif _sc == 's':
-                    turtle.setheading(270)
-                elif _sc == 'e':
-                    turtle.setheading(0)
-                elif _sc == 'w':
-                    turtle.setheading(180)
-                elif _sc == 'nw':
-                    turtle.setheading(135)
-                elif _sc == 'ne':
-                    turtle.setheading(45)
-                elif _sc == 'sw':
-                    turtle.setheading(225)
-                elif _sc == 'se':
-                    turtle.setheading(315)
-                else:  # pragma: no cover
-                    assert False, 'Unhandled shortcut: ' + _sc
-                turtle_obj.forward(float(shortcut_parts[1]))
-                if originally_in_radians_mode:
-                    turtle.radians()
-            elif _sc == 'dot':
-                if _return_turtle_code:
-                    return ('dot(' + shortcut_parts[1] + ')',)
-                turtle_obj.dot(float(shortcut_parts[1]))
-            elif _sc == 'cs':
-                if _return_turtle_code:
-                    return ('clearstamp(' + shortcut_parts[1] + ')',)
-                turtle_obj.clearstamp(float(shortcut_parts[1]))
-            elif _sc == 'spd':
-                if _return_turtle_code:
-                    return ('speed(' + str(shortcut_parts[1]) + ')',)
-                turtle_obj.speed(float(shortcut_parts[1]))
-            else:  # pragma: no cover
-                assert False, 'Unhandled shortcut: ' + _sc
-            count_of_shortcuts_run += 1
-
-
-
-
-
-    # SHORTCUTS THAT TAKE A SINGLE INTEGER ARGUMENT OR NONE ARGUMENT:
-    elif _sc in ('css',):
-        if len(shortcut_parts) > 2:
-            raise TurtleShortcutException('Syntax error in `' + shortcut + '`: Too many arguments.')
-
-        # Technically, the css shortcut can take a float argument, but it gets passed to int() silently. Not ideal, but not a big deal either.
-
-        if len(shortcut_parts) == 2:
-            try:
-                int(shortcut_parts[1])
-            except ValueError:
-                raise_exception = True  # We don't raise here so we can hide the original ValueError and make the stack trace a bit neater.
-            if raise_exception:
-                raise TurtleShortcutException('Syntax error in `' + shortcut + '`: `' + shortcut_parts[1] + '` is not a number.')
+    if handler.count is None:
+        # Shortcuts with a [ ] block run (and record) the block's instructions themselves and return the count:
+        return handler.run(turtle_obj, *args)
+
+    if handler.run is not None:
+        handler.run(turtle_obj, *args)
+
+    # If begin_recording() has been called, log the shortcut.
+    if _NOW_RECORDING and handler is not _BLANK_HANDLER:
+        RECORDED_SHORTCUTS.append(shortcut.strip())
+
+    # If begin_capture() has been called, it may take a frame of the drawing if this turtle is on its screen.
+    if _FRAME_CAPTURE is not None and handler.count:
+        _FRAME_CAPTURE._shortcuts_run(turtle_obj, handler.count)
+
+    return handler.count
 
-        if not dry_run:
-            # Run the shortcut:
-            if _sc == 'css':
-                if len(shortcut_parts) == 1:
-                    if _return_turtle_code:
-                        return ('clearstamps()',)
-                    turtle_obj.clearstamps()
-                elif len(shortcut_parts) == 2:
-                    if _return_turtle_code:
-                        return ('clearstamps(' + shortcut_parts[1] + ')',)
-                    turtle_obj.clearstamps(int(shortcut_parts[1]))
-                else:  # pragma: no cover
-                    assert False, 'Unhandled shortcut: ' + _sc
-            else:  # pragma: no cover
-                assert False, 'Unhandled shortcut: ' + _sc
-            count_of_shortcuts_run += 1
 
+class _ShortcutHandler:
+    '''Describes one shortcut: the number of arguments it takes, how to convert its argument strings, how to run
+    it, and how to write it as Python code. Both sc() and scs() use the same handler, which is looked up by name
+    in the _SHORTCUT_HANDLERS dict.
 
+    The arity is a tuple of the allowed numbers of arguments (or None for any number.) The convert function takes
+    (shortcut, arg_strs, turtle_obj) and returns a tuple of (args, arg_strs). The run function is called with the
+    turtle object and the converted args. The code is either a template string like 'goto({0}, {1})' that is
+    formatted with the argument strings (`{args}` is all of them separated by commas and newlines separate multiple
+    lines of code) or a function that takes (turtle_obj, args, arg_strs) and returns a tuple of lines of code.'''
 
+    __slots__ = ('name', 'arity', 'convert', 'run', 'code', 'missing_message', 'invalid_message', 'count', 'block')
 
+    def __init__(self, name, arity, run, code, convert=None, missing_message=None, invalid_message=None, count=1, block=False):
+        self.name = name
+        self.arity = arity
+        self.run = run
+        self.code = code
+        self.convert = convert if convert is not None else _convert_numbers
+        self.count = count  # The number of shortcuts this counts as in sc()'s return value, or None if run() returns it.
 
+        # Shortcuts like `rep` are followed by a [ ] block of shortcuts. The block's instructions are the last
+        # converted argument.
+        self.block = block
 
-    # SHORTCUTS THAT TAKE EXACTLY TWO NUMERIC ARGUMENTS:
-    elif _sc in ('g', 't', 'tele'):
-        if len(shortcut_parts) < 3:
-            raise TurtleShortcutException('Syntax error in `' + shortcut + '`: Missing two required numeric argument.')
-        elif len(shortcut_parts) > 3:
-            raise TurtleShortcutException('Syntax error in `' + shortcut + '`: Too many arguments.')
+        if missing_message is None:
+            if arity is not None and arity[0] == 1:
+                missing_message = 'Missing the required numeric argument.'
+            else:
+                missing_message = 'Missing ' + str(arity[0] if arity else 0) + ' required numeric arguments.'
+        self.missing_message = missing_message
+
+        if invalid_message is None:
+            if arity == (0,):
+                invalid_message = 'This shortcut does not have arguments.'
+            else:
+                invalid_message = 'Too many arguments.'
+        self.invalid_message = invalid_message
+
+    def turtle_code(self, turtle_obj, args, arg_strs):
+        '''Returns a tuple of the lines of Python code that running this shortcut is equivalent to.'''
+        if isinstance(self.code, str):
+            return tuple(self.code.format(*arg_strs, args=', '.join(arg_strs)).split('\n'))
+        return self.code(turtle_obj, args, arg_strs)
+
+    def __repr__(self):
+        return '<' + type(self).__name__ + ' ' + repr(self.name) + '>'
 
+
+def _convert_numbers(shortcut, arg_strs, turtle_obj):
+    '''Converts all the argument strings to floats, raising a TurtleShortcutException if one isn't a number.'''
+    args = []
+    for arg_str in arg_strs:
+        raise_exception = False
         try:
-            float(shortcut_parts[1])
+            args.append(float(arg_str))
         except ValueError:
             raise_exception = True  # We don't raise here so we can hide the original ValueError and make the stack trace a bit neater.
         if raise_exception:
-            raise TurtleShortcutException('Syntax error in `' + shortcut + '`: `' + shortcut_parts[1] + '` is not a number.')
+            raise TurtleShortcutException('Syntax error in `' + shortcut + '`: `' + arg_str + '` is not a number.')
+    return tuple(args), tuple(arg_strs)
+
+
+def _convert_integers(shortcut, arg_strs, turtle_obj):
+    '''Converts all the argument strings to ints, raising a TurtleShortcutException if one isn't an integer.'''
+    args = []
+    for arg_str in arg_strs:
+        raise_exception = False
         try:
-            float(shortcut_parts[2])
+            args.append(int(arg_str))
         except ValueError:
             raise_exception = True  # We don't raise here so we can hide the original ValueError and make the stack trace a bit neater.
         if raise_exception:
-            raise TurtleShortcutException('Syntax error in `' + shortcut + '`: `' + shortcut_parts[2] + '` is not a number.')
-
-        if not dry_run:
-            # Run the shortcut that has exactly two numeric arguments:
-            x = float(shortcut_parts[1])
-            y = float(shortcut_parts[2])
-
-            # Run the shortcut:
-            if _sc == 'g':
-                if _return_turtle_code:
-                    return ('goto(' + shortcut_parts[1] + ', ' + shortcut_parts[2] + ')',)
-                turtle_obj.goto(x, y)
-            elif _sc == 't':
-                if _return_turtle_code:
-                    return ('tracer(' + shortcut_parts[1] + ', ' + shortcut_parts[2] + ')',)
-                turtle.tracer(x, y)  # Note: tracer() is not a Turtle method, there's only the global tracer() function.
-            elif _sc == 'tele':
-                if _return_turtle_code:
-                    return ('teleport(' + shortcut_parts[1] + ', ' + shortcut_parts[2] + ')',)
-                turtle_obj.teleport(x, y)
-            else:  # pragma: no cover
-                assert False, 'Unhandled shortcut: ' + _sc
-            count_of_shortcuts_run += 1
-
-
-
-
-
-    # SHORTCUTS THAT TAKE EXACTLY ZERO ARGUMENTS:
-    elif _sc in ('h', 'c', 'st', 'pd', 'pu', 'undo', 'bf', 'ef', 'reset', 'bye', 'done', 'eoc', 'u', 'show', 'hide'):
-        if len(shortcut_parts) > 1:
-            raise TurtleShortcutException('Syntax error in `' + shortcut + '`: This shortcut does not have arguments.')
-
-        if not dry_run:
-            # Run the shortcut that has exactly zero arguments:
-            if _sc == 'h':
-                if _return_turtle_code:
-                    return ('home()',)
-                turtle_obj.home()
-            elif _sc == 'c':
-                if _return_turtle_code:
-                    return ('clear()',)
-                turtle_obj.clear()
-            elif _sc == 'st':
-                if _return_turtle_code:
-                    return ('stamp()',)
-                turtle_obj.stamp()
-            elif _sc == 'pd':
-                if _return_turtle_code:
-                    return ('pendown()',)
-                turtle_obj.pendown()
-            elif _sc == 'pu':
-                if _return_turtle_code:
-                    return ('penup()',)
-                turtle_obj.penup()
-            elif _sc == 'undo':
-                if _return_turtle_code:
-                    return ('undo()',)
-                turtle_obj.undo()
-            elif _sc == 'bf':
-                if _return_turtle_code:
-                    return ('begin_fill()',)
-                turtle_obj.begin_fill()
-            elif _sc == 'ef':
-                if _return_turtle_code:
-                    return ('end_fill()',)
-                turtle_obj.end_fill()
-            elif _sc == 'reset':
-                if _return_turtle_code:
-                    return ('reset()',)
-                turtle_obj.reset()
-            elif _sc == 'bye':  # pragma: no cover
-                if _return_turtle_code:
-                    return ('bye()',)
-                turtle_obj.bye()
-            elif _sc == 'done':  # pragma: no cover
-                if _return_turtle_code:
-                    return ('done()',)
-                turtle_obj.done()
-            elif _sc == 'eoc':  # pragma: no cover
-                if _return_turtle_code:
-                    return ('exitonclick()',)
-                turtle_obj.exitonclick()
-            elif _sc == 'u':
-                if _return_turtle_code:
-                    return ('update()',)
-                turtle_obj.update()
-            elif _sc == 'show':
-                if _return_turtle_code:
-                    return ('showturtle()',)
-                turtle_obj.showturtle()
-            elif _sc == 'hide':
-                if _return_turtle_code:
-                    return ('hideturtle()',)
-                turtle_obj.hideturtle()
-            else:  # pragma: no cover
-                assert False, 'Unhandled shortcut: ' + _sc
-            count_of_shortcuts_run += 1
-
-
-
-    # SHORTCUTS THAT TAKE AN RGB OR COLOR ARGUMENT:
-    elif _sc in ('pc', 'fc', 'bc'):
-        color_arg_is_color_name = False  # Start as False. If it's a color name, we'll set this to True.
-
-        if len(shortcut_parts) < 2:
-            raise TurtleShortcutException('Syntax error in `' + shortcut + '`: Missing required RGB argument.')
-        elif len(shortcut_parts) not in (2, 4):
-            raise TurtleShortcutException('Syntax error in `' + shortcut + '`: Invalid RGB argument. It must either be a color name like `red` or three numbers like `1.0 0.5 0.0` or `255 0 255` or `FF 00 FF`.')
-
-        if len(shortcut_parts) == 4:
-            # We expect the color arg to either be something like (255, 0, 0) or (1.0, 0.0, 0.0):
-            raise_exception = False
+            raise TurtleShortcutException('Syntax error in `' + shortcut + '`: `' + arg_str + '` is not a number.')
+    return tuple(args), tuple(arg_strs)
 
-            try:
-                float(shortcut_parts[1])
-            except ValueError:
-                raise_exception = True  # We don't raise here so we can hide the original ValueError and make the stack trace a bit neater.
-            if raise_exception:
-                raise TurtleShortcutException('Syntax error in `' + shortcut + '`: `' + shortcut_parts[1] + '` is not a number.')
 
-            try:
-                float(shortcut_parts[2])
-            except ValueError:
-                raise_exception = True  # We don't raise here so we can hide the original ValueError and make the stack trace a bit neater.
-            if raise_exception:
-                raise TurtleShortcutException('Syntax error in `' + shortcut + '`: `' + shortcut_parts[2] + '` is not a number.')
+def _convert_speed(shortcut, arg_strs, turtle_obj):
+    '''Converts the `speed` shortcut's argument, which can also be a string like 'fastest', to a number.'''
+    # Convert the string arguments for the `speed` shortcut to their numeric equivalents.
+    arg_str = str({'fastest': 0, 'fast': 10, 'normal': 6, 'slow': 3, 'slowest': 1}.get(arg_strs[0].lower(), arg_strs[0].lower()))
+    return _convert_numbers(shortcut, (arg_str,), turtle_obj)
 
-            try:
-                float(shortcut_parts[3])
-            except ValueError:
-                raise_exception = True  # We don't raise here so we can hide the original ValueError and make the stack trace a bit neater.
-            if raise_exception:
-                raise TurtleShortcutException('Syntax error in `' + shortcut + '`: `' + shortcut_parts[3] + '` is not a number.')
-
-            if turtle_obj.colormode() == 1.0:
-                color_arg = (float(shortcut_parts[1]), float(shortcut_parts[2]), float(shortcut_parts[3]))
-            elif turtle_obj.colormode() == 255:
-                # Convert strings like '1.0' to floats first, then to int. (Calling int('1.0') would raise a ValueError.)
-                color_arg = (int(float(shortcut_parts[1])), int(float(shortcut_parts[2])), int(float(shortcut_parts[3])))
-            else:  # pragma: no cover
-                assert False, 'Unhandled colormode: ' + str(turtle_obj.colormode())
-
-            if turtle_obj.colormode() == 1.0 and (color_arg[0] > 1.0 or color_arg[1] > 1.0 or color_arg[2] > 1.0):
-                raise TurtleShortcutException(shortcut + ' is invalid because colormode is 1.0 and one or more RGB color values are greater than 1.0.')
-
-        elif len(shortcut_parts) == 2:
-            # We expect the color arg to be a string like 'blue' or '#FF0000':
-            raise_exception = False
-
-            if re.match(r'^#[0-9A-Fa-f]{6}$', shortcut_parts[1]):
-                # Color arg is a hex code like '#FF0000', and not a name like 'blue'.
-                color_arg_is_color_name = False  # It's already False, but I put this here to be explicit.
-            else:
-                # shortcut_parts[1] must be a color name like 'blue'
-                color_arg_is_color_name = True
-            color_arg = shortcut_parts[1]
 
-            # Test the color name by actually calling pencolor():
-            original_pen_color = turtle_obj.pencolor()
-            try:
-                turtle_obj.pencolor(color_arg)
-            except turtle.TurtleGraphicsError:
-                raise_exception = True  # We don't raise here so we can hide the original TurtleGraphicsError and make the stack trace a bit neater.
-            if raise_exception:
-                if re.match(r'^[0-9A-Fa-f]{6}$', shortcut_parts[1]):
-                    raise TurtleShortcutException('Syntax error in `' + shortcut + "`: '" + shortcut_parts[1] + "' is not a valid color. Did you mean '# " + shortcut_parts[1] + "'?")
-                else:
-                    raise TurtleShortcutException('Syntax error in `' + shortcut + "`: '" + shortcut_parts[1] + "' is not a valid color.")
-
-            # NOTE: This code here is to handle an unfixed bug in turtle.py. If the color mode is 1.0 and you set
-            # the color to (1.0, 0.0, 0.0) and then change the color mode to 255, the color will be (255.0, 0.0, 0.0)
-            # but these float values are not a valid setting for a color while in mode 255. So we have to convert them
-            # to integers here.
-            if isinstance(original_pen_color, tuple) and turtle_obj.colormode() == 255:
-                turtle_obj.pencolor(int(original_pen_color[0]), int(original_pen_color[1]), int(original_pen_color[2]))
-            else:
-                turtle_obj.pencolor(original_pen_color)
-
-        if not dry_run:
-            # Return the turtle code, if that was asked:
-            if _return_turtle_code:
-                if _sc == 'pc':
-                    func_name_prefix = 'pen'
-                elif _sc == 'fc':
-                    func_name_prefix = 'fill'
-                elif _sc == 'bc':
-                    func_name_prefix = 'bg'
-
-                if color_arg_is_color_name:
-                    return (func_name_prefix + "color('" + str(color_arg) + "')",)
-                else:
-                    return (func_name_prefix + 'color(' + str(color_arg) + ')',)
-
-            # Run the shortcut that has an RGB color argument:
-            if _sc == 'pc':
-                turtle_obj.pencolor(color_arg)
-            elif _sc == 'fc':
-                turtle_obj.fillcolor(color_arg)
-            elif _sc == 'bc':
-                turtle_obj.bgcolor(color_arg)
-            else:  # pragma: no cover
-                assert False, 'Unhandled shortcut: ' + _sc
-            count_of_shortcuts_run += 1
+def _convert_dot_size(shortcut, arg_strs, turtle_obj):
+    '''Converts the `dot` shortcut's argument, which cannot be negative.'''
+    args, arg_strs = _convert_numbers(shortcut, arg_strs, turtle_obj)
+
+    # `dot` shortcut doesn't allow negative values:
+    if args[0] < 0:
+        raise TurtleShortcutException('Syntax error in `' + shortcut + '`: `dot` argument cannot be a negative number.')
+    return args, arg_strs
+
+
+def _convert_comment(shortcut, arg_strs, turtle_obj):
+    '''Comments have no arguments; their Python code is the comment as is (but with leading whitespace removed).'''
+    return (), (shortcut.lstrip(),)
+
+
+def _convert_color(shortcut, arg_strs, turtle_obj):
+    '''Converts a color argument, which is either a color name like 'blue', a hex code like '#FF0000', or three numbers.'''
+    if len(arg_strs) == 3:
+        # We expect the color arg to either be something like (255, 0, 0) or (1.0, 0.0, 0.0). Whether the
+        # numbers are in range depends on the colormode when the shortcut is run, see _check_rgb_instruction().
+        return _convert_numbers(shortcut, arg_strs, turtle_obj)
+
+    # We expect the color arg to be a string like 'blue' or '#FF0000'. This is checked against Tk's color names
+    # without touching the turtle, so it's fast and doesn't change the turtle's pen color:
+    color_arg = arg_strs[0]
+    if _resolve_color(color_arg) is None:
+        if re.match(r'^[0-9A-Fa-f]{6}$', color_arg):
+            raise TurtleShortcutException('Syntax error in `' + shortcut + "`: '" + color_arg + "' is not a valid color. Did you mean '# " + color_arg + "'?")
+        else:
+            raise TurtleShortcutException('Syntax error in `' + shortcut + "`: '" + color_arg + "' is not a valid color.")
+
+    # The argument string is the color as it appears in Python code, so it needs quotes:
+    return (color_arg,), ("'" + color_arg + "'",)
+
+
+def _color_arg(turtle_obj, args):
+    '''Returns the color argument to pass to pencolor(), fillcolor(), or bgcolor() for the converted args.'''
+    if len(args) == 1:
+        return args[0]  # A color name or hex code.
+    return _resolve_color(args, turtle_obj.colormode())
+
+
+_COLOR_CACHE_SIZE = 1024  # The maximum number of colors that _resolve_color() keeps in _COLOR_CACHE.
+_COLOR_CACHE = {}  # Keys are color strings or (color tuple, colormode) tuples, values are _resolve_color()'s results.
+
+
+def _resolve_color(color, colormode=1.0):
+    '''Returns the color to pass to turtle.py for a color string like 'red' or '#FF0000', or for a (red, green, blue)
+    tuple in the colormode. In colormode 255, the tuple's numbers are converted to ints, since floats aren't valid
+    color values in colormode 255. Returns None if the color is invalid.
+
+    This never touches a turtle or Tk, and the results are cached, so color shortcuts in loops stay fast.'''
+    key = color if isinstance(color, str) else (color, colormode)
+    try:
+        return _COLOR_CACHE[key]
+    except KeyError:
+        pass
+
+    if isinstance(color, str):
+        resolved = color if _tk_color_rgb(color) is not None else None
+    elif len(color) != 3:
+        resolved = None
+    elif colormode == 255:
+        resolved = tuple(int(n) for n in color) if all(0 <= n <= 255 for n in color) else None
+    else:
+        resolved = tuple(float(n) for n in color) if all(0 <= n <= 1.0 for n in color) else None
+
+    if len(_COLOR_CACHE) >= _COLOR_CACHE_SIZE:
+        _COLOR_CACHE.clear()  # Random colors could fill the cache forever, so start over when it's full.
+    _COLOR_CACHE[key] = resolved
+    return resolved
+
+
+def _color_code(func_name):
+    '''Returns a code function for the pc, fc, and bc shortcuts.'''
+    def code(turtle_obj, args, arg_strs):
+        if len(args) == 1:
+            return (func_name + '(' + arg_strs[0] + ')',)
+        if any(isinstance(arg, _DynamicArgument) for arg in args):
+            return (func_name + '((' + ', '.join(arg_strs) + '))',)
+        return (func_name + '(' + str(_color_arg(turtle_obj, args)) + ')',)
+    return code
+
+
+def _convert_repeat_count(shortcut, arg_strs, turtle_obj):
+    '''Converts the `rep` shortcut's number of repeats, which must be a positive integer or zero.'''
+    args, arg_strs = _convert_integers(shortcut, arg_strs, turtle_obj)
+    if args[0] < 0:
+        raise TurtleShortcutException('Syntax error in `' + shortcut.strip() + '`: `rep` argument cannot be a negative number.')
+    return args, arg_strs
+
+
+def _run_repeat(turtle_obj, repeats, body):
+    '''Runs the instructions in the `rep` shortcut's block the given number of times and returns the count of shortcuts run.'''
+    count_of_shortcuts_run = 0
+    for i in range(repeats):
+        for instruction in body:
+            count_of_shortcuts_run += _run_instruction(instruction, turtle_obj)
+    return count_of_shortcuts_run
 
-    # If begin_recording() has been called, log the shortcut.
-    if _NOW_RECORDING and not dry_run:
-        RECORDED_SHORTCUTS.append(shortcut.strip())
 
+def _repeat_code(turtle_obj, args, arg_strs):
+    '''Returns the code for the `rep` shortcut, which is a for loop with the block's code indented inside it.'''
+    return ('for _ in range(' + arg_strs[0] + '):',) + _block_code(turtle_obj, args[-1])
+
+
+def _block_code(turtle_obj, instructions, add_pass=True):
+    '''Returns a tuple of the code lines for the instructions in a block, indented by four spaces.'''
+    lines = []
+    for instruction in instructions:
+        if instruction[0] is not _BLANK_HANDLER:
+            lines.extend('    ' + line for line in _run_instruction(instruction, turtle_obj, _return_turtle_code=True))
+    if add_pass and not any(not line.lstrip().startswith('#') for line in lines):
+        lines.append('    pass')  # The block has no code, only comments (or nothing at all.)
+    return tuple(lines)
+
+
+def _assigned_variables(instructions):
+    '''Returns a list of the names of the variables that the `set` and `inc` shortcuts in the instructions change.'''
+    names = []
+    for instruction in instructions:
+        handler, args = instruction[0], instruction[1]
+        if handler is _DYNAMIC_HANDLER:
+            handler, args = args[0], args[2]
+        if handler.name in ('set', 'inc'):
+            variable_names = [args[0]]
+        elif handler.name == 'rep':
+            variable_names = _assigned_variables(args[-1])
+        else:
+            continue
+        names.extend(name for name in variable_names if name not in names)
+    return names
+
+
+def _convert_macro_definition(shortcut, arg_strs, turtle_obj):
+    '''Converts the `def` shortcut's arguments: the macro name and the depth (or None if it doesn't have one.)'''
+    name = arg_strs[0].lower()
+    if not _is_valid_name(name) or name in _SHORTCUT_HANDLERS:
+        raise TurtleShortcutException('Syntax error in `' + shortcut.strip() + '`: `' + arg_strs[0] + '` is not a valid macro name.')
+    if len(arg_strs) == 1:
+        return (name, None), (name,)
+
+    depth = _convert_integers(shortcut, arg_strs[1:], turtle_obj)[0][0]
+    if not 1 <= depth <= MACRO_DEPTH_LIMIT:
+        raise TurtleShortcutException('Syntax error in `' + shortcut.strip() + '`: The macro depth must be from 1 to ' + str(MACRO_DEPTH_LIMIT) + '.')
+    return (name, depth), (name, arg_strs[1])
+
+
+def _run_define_macro(turtle_obj, name, depth, body, base):
+    '''Macros are defined when the `def` shortcut is parsed, so running it doesn't do anything. Returns 0.'''
+    return 0
+
+
+def _define_macro_code(turtle_obj, args, arg_strs):
+    '''Returns the code for the `def` shortcut, which is a Python function. Recursive macros have a depth parameter.'''
+    name, depth, body, base = args
+    global_names = _assigned_variables(body + base)
+    lines = ['def ' + name + ('():' if depth is None else '(depth=1):')]
+    if global_names:
+        lines.append('    global ' + ', '.join(global_names))  # The variables aren't local to the function.
+    if depth is not None:
+        lines.append('    if depth > ' + str(depth) + ':')
+        lines.extend('    ' + line for line in _block_code(turtle_obj, base, add_pass=False))
+        lines.append('        return')
+    lines.extend(_block_code(turtle_obj, body))
+    return tuple(lines)
+
+
+def _run_macro(turtle_obj, body):
+    '''Runs a macro's instructions and returns the count of shortcuts run.'''
+    count_of_shortcuts_run = 0
+    for instruction in body:
+        count_of_shortcuts_run += _run_instruction(instruction, turtle_obj)
     return count_of_shortcuts_run
 
 
-def in_radians_mode():
-    """Returns True if turtle is in radians mode, False if in degrees mode."""
-    original_heading = turtle.heading()
-    turtle.left(1)
-    turtle.radians()  # Switch to radians mode.
-    turtle.right(1)
-    if turtle.heading() == original_heading:
-        return True
+def _macro_code(turtle_obj, args, arg_strs):
+    '''Returns the code for calling a macro, which is a call to the macro's Python function.'''
+    return (arg_strs[0] + '(' + arg_strs[1] + ')',)
+
+
+def _is_valid_name(name):
+    '''Returns True if the name can be a variable or macro name. These can't be the same as the other names in the
+    code that scs() and sc_export() write, such as turtle function names.'''
+    return (_VARIABLE_NAME_REGEX.match(name) is not None and not keyword.iskeyword(name) and not hasattr(turtle, name)
+            and name not in ('time', 'random', 'randint', 'uniform', 'range', 'depth', 'sleep', 't', 'screen', 'main'))
+
+
+def _convert_variable(shortcut, arg_strs, turtle_obj):
+    '''Converts the `set` and `inc` shortcuts' arguments: a variable name and a number, which is 1 if `inc` doesn't have one.'''
+    name = arg_strs[0]
+    if not _is_valid_name(name):
+        raise TurtleShortcutException('Syntax error in `' + shortcut.strip() + '`: `' + name + '` is not a valid variable name.')
+    value_str = arg_strs[1] if len(arg_strs) == 2 else '1'
+    if _INTEGER_REGEX.match(value_str):
+        value = int(value_str)  # Integer variables stay integers, so they can be used with `rep`.
     else:
-        turtle.degrees()  # Switch back to degrees mode.
-        return False
+        value = _convert_numbers(shortcut, (value_str,), turtle_obj)[0][0]
+    return (name, value), (name, value_str)
+
+
+def _run_set(turtle_obj, name, value):
+    '''Sets the variable for the `set` shortcut. Returns the count of shortcuts run.'''
+    SC_VARIABLES[name] = value
+    return 1
+
+
+def _run_increase(turtle_obj, name, amount):
+    '''Adds to the variable for the `inc` shortcut. Returns the count of shortcuts run.'''
+    if name not in SC_VARIABLES:
+        raise TurtleShortcutException('`' + name + '` is not a variable. Set it first with a shortcut like `set ' + name + ' 0`.')
+    SC_VARIABLES[name] += amount
+    return 1
+
+
+def _run_dynamic(turtle_obj, handler, dynamic_args, code_args):
+    '''Runs a shortcut that has `rand` or `$` arguments by converting it with their current values. Returns the
+    count of shortcuts run.'''
+    arg_strs = [str(arg.evaluate()) if isinstance(arg, _DynamicArgument) else arg for arg in dynamic_args]
+    shortcut = handler.name + ' ' + ' '.join(arg_strs)
+    args, arg_strs = handler.convert(shortcut, arg_strs, turtle_obj)
+
+    # Add on the [ ] block, if the shortcut has one:
+    instruction = (handler, args + code_args[len(dynamic_args):], arg_strs, shortcut)
+    if handler.name in ('pc', 'fc', 'bc') and len(args) == 3:
+        _check_rgb_instruction(instruction, turtle_obj.colormode())
+    return _run_instruction(instruction, turtle_obj)
+
+
+def _dynamic_code(turtle_obj, args, arg_strs):
+    '''Returns the code for a shortcut with `rand` or `$` arguments, which has their Python expressions as arguments.'''
+    return args[0].turtle_code(turtle_obj, args[2], arg_strs)
+
+
+# The (x, y) unit vectors for the cardinal direction shortcuts' headings in degrees:
+_CARDINAL_UNIT_VECTORS = {0: (1.0, 0.0), 45: (math.sqrt(0.5), math.sqrt(0.5)), 90: (0.0, 1.0),
+                          135: (-math.sqrt(0.5), math.sqrt(0.5)), 180: (-1.0, 0.0), 225: (-math.sqrt(0.5), -math.sqrt(0.5)),
+                          270: (0.0, -1.0), 315: (math.sqrt(0.5), -math.sqrt(0.5))}
+
+
+def _run_cardinal(turtle_obj, distance, heading):
+    '''Runs a cardinal direction shortcut like `n 100` by facing the heading (in degrees) and moving to the point in
+    that direction. The heading is converted to the turtle's own angle units and mode, so nothing is switched to
+    degrees mode and back, and the move lands exactly on the point instead of adding up rounding errors.'''
+    turtle_obj = _get_turtle(turtle_obj)
+
+    # In 'logo' mode, headings start at north and go clockwise. turtle.py keeps this in _angleOffset and _angleOrient:
+    to_angle = (turtle_obj._angleOffset + turtle_obj._angleOrient * heading / turtle_obj._degreesPerAU) % turtle_obj._fullcircle
+    if turtle_obj.heading() != to_angle:
+        turtle_obj.setheading(to_angle)  # Skip setting the heading when making several moves in the same direction.
+
+    unit_x, unit_y = _CARDINAL_UNIT_VECTORS[heading]
+    x, y = turtle_obj.position()
+    turtle_obj.goto(x + unit_x * distance, y + unit_y * distance)
+
+
+def _cardinal_code(turtle_obj, args, arg_strs, heading):
+    '''Returns the code for a cardinal direction shortcut, which has to switch to degrees mode if in radians mode.'''
+    if in_radians_mode(turtle_obj):
+        return ('degrees()', 'setheading(' + heading + ')', 'forward(' + arg_strs[0] + ')', 'radians()')
+    else:
+        return ('setheading(' + heading + ')', 'forward(' + arg_strs[0] + ')')
+
+
+def _define_shortcut(name, arity, run, code, **kwargs):
+    '''Adds a built-in shortcut handler to the _SHORTCUT_HANDLERS dict.'''
+    _SHORTCUT_HANDLERS[name] = _ShortcutHandler(name, arity, run, code, **kwargs)
+
+
+_SHORTCUT_HANDLERS = {}
+
+_BLANK_HANDLER = _ShortcutHandler('', None, None, '', count=0)
+_COMMENT_HANDLER = _ShortcutHandler('#', None, None, '{0}', convert=_convert_comment, count=0)  # Comments do nothing.
+_SHORTCUT_HANDLERS['#'] = _COMMENT_HANDLER
+
+# SHORTCUTS THAT TAKE A SINGLE NUMERIC ARGUMENT:
+_define_shortcut('f', (1,), lambda t, n: t.forward(n), 'forward({0})')
+_define_shortcut('b', (1,), lambda t, n: t.backward(n), 'backward({0})')
+_define_shortcut('r', (1,), lambda t, n: t.right(n), 'right({0})')
+_define_shortcut('l', (1,), lambda t, n: t.left(n), 'left({0})')
+_define_shortcut('x', (1,), lambda t, n: t.setx(n), 'setx({0})')
+_define_shortcut('y', (1,), lambda t, n: t.sety(n), 'sety({0})')
+_define_shortcut('ps', (1,), lambda t, n: t.pensize(n), 'pensize({0})')
+_define_shortcut('sh', (1,), lambda t, n: t.setheading(n), 'setheading({0})')
+_define_shortcut('cir', (1,), lambda t, n: t.circle(n), 'circle({0})')
+_define_shortcut('sleep', (1,), lambda t, n: time.sleep(n), 'sleep({0})')
+_define_shortcut('dot', (1,), lambda t, n: t.dot(n), 'dot({0})', convert=_convert_dot_size)
+_define_shortcut('cs', (1,), lambda t, n: t.clearstamp(n), 'clearstamp({0})')
+_define_shortcut('spd', (1,), lambda t, n: t.speed(n), 'speed({0})', convert=_convert_speed)
+for _name, _heading in CARDINAL_TO_DEGREES.items():
+    _define_shortcut(_name, (1,), functools.partial(_run_cardinal, heading=int(_heading)), functools.partial(_cardinal_code, heading=_heading))
+
+# SHORTCUTS THAT TAKE A SINGLE INTEGER ARGUMENT OR NONE ARGUMENT:
+# Technically, the css shortcut can take a float argument, but it gets passed to int() silently. Not ideal, but not a big deal either.
+_define_shortcut('css', (0, 1), lambda t, *n: t.clearstamps(*n), 'clearstamps({args})', convert=_convert_integers)
+
+# SHORTCUTS THAT TAKE EXACTLY TWO NUMERIC ARGUMENTS:
+_define_shortcut('g', (2,), lambda t, x, y: t.goto(x, y), 'goto({0}, {1})')
+_define_shortcut('t', (2,), lambda t, x, y: t.getscreen().tracer(x, y), 'tracer({0}, {1})')  # Note: tracer() is not a Turtle method, it's a screen method.
+_define_shortcut('tele', (2,), lambda t, x, y: t.teleport(x, y), 'teleport({0}, {1})')
+
+# SHORTCUTS THAT TAKE EXACTLY ZERO ARGUMENTS:
+_define_shortcut('h', (0,), lambda t: t.home(), 'home()')
+_define_shortcut('c', (0,), lambda t: t.clear(), 'clear()')
+_define_shortcut('st', (0,), lambda t: t.stamp(), 'stamp()')
+_define_shortcut('pd', (0,), lambda t: t.pendown(), 'pendown()')
+_define_shortcut('pu', (0,), lambda t: t.penup(), 'penup()')
+_define_shortcut('undo', (0,), lambda t: t.undo(), 'undo()')
+_define_shortcut('bf', (0,), lambda t: t.begin_fill(), 'begin_fill()')
+_define_shortcut('ef', (0,), lambda t: t.end_fill(), 'end_fill()')
+_define_shortcut('reset', (0,), lambda t: t.reset(), 'reset()')
+_define_shortcut('bye', (0,), lambda t: t.bye(), 'bye()')
+_define_shortcut('done', (0,), lambda t: t.done(), 'done()')
+_define_shortcut('eoc', (0,), lambda t: t.exitonclick(), 'exitonclick()')
+_define_shortcut('u', (0,), lambda t: t.update(), 'update()')
+_define_shortcut('show', (0,), lambda t: t.showturtle(), 'showturtle()')
+_define_shortcut('hide', (0,), lambda t: t.hideturtle(), 'hideturtle()')
+_define_shortcut('degrees', (0,), lambda t: t.degrees(), 'degrees()')
+_define_shortcut('radians', (0,), lambda t: t.radians(), 'radians()')
+
+# Shortcuts with `rand` or `$` arguments use this handler, which runs the shortcut's real handler with their values:
+_DYNAMIC_HANDLER = _ShortcutHandler('dynamic', None, _run_dynamic, _dynamic_code, count=None)
+
+# SHORTCUTS THAT SET VARIABLES:
+_define_shortcut('set', (2,), _run_set, '{0} = {1}', convert=_convert_variable, count=None,
+                 missing_message='Missing the variable name and value.')
+_define_shortcut('inc', (1, 2), _run_increase, '{0} += {1}', convert=_convert_variable, count=None,
+                 missing_message='Missing the variable name.')
+
+# SHORTCUTS THAT TAKE A [ ] BLOCK OF SHORTCUTS:
+_define_shortcut('rep', (1,), _run_repeat, _repeat_code, convert=_convert_repeat_count, count=None, block=True,
+                 missing_message='Missing the required number of repeats.')
+
+# MACROS:
+_define_shortcut('def', (1, 2), _run_define_macro, _define_macro_code, convert=_convert_macro_definition, count=None,
+                 missing_message='Missing the macro name.')
+# Calls to macros use this handler, which runs the macro's instructions:
+_MACRO_HANDLER = _ShortcutHandler('macro', None, _run_macro, _macro_code, count=None, block=True)
+
+# SHORTCUTS THAT TAKE AN RGB OR COLOR ARGUMENT:
+_COLOR_MISSING_MESSAGE = 'Missing required RGB argument.'
+_COLOR_INVALID_MESSAGE = 'Invalid RGB argument. It must either be a color name like `red` or three numbers like `1.0 0.5 0.0` or `255 0 255` or `FF 00 FF`.'
+_define_shortcut('pc', (1, 3), lambda t, *args: t.pencolor(_color_arg(t, args)), _color_code('pencolor'), convert=_convert_color,
+                 missing_message=_COLOR_MISSING_MESSAGE, invalid_message=_COLOR_INVALID_MESSAGE)
+_define_shortcut('fc', (1, 3), lambda t, *args: t.fillcolor(_color_arg(t, args)), _color_code('fillcolor'), convert=_convert_color,
+                 missing_message=_COLOR_MISSING_MESSAGE, invalid_message=_COLOR_INVALID_MESSAGE)
+_define_shortcut('bc', (1, 3), lambda t, *args: t.getscreen().bgcolor(_color_arg(t, args)), _color_code('bgcolor'), convert=_convert_color,
+                 missing_message=_COLOR_MISSING_MESSAGE, invalid_message=_COLOR_INVALID_MESSAGE)
+
+# The full names of shortcuts (like `forward` for `f`) use the same handler:
+for _full_name, _name in _MAP_FULL_TO_SHORT_NAMES.items():
+    _SHORTCUT_HANDLERS[_full_name] = _SHORTCUT_HANDLERS[_name]
+
+ALL_SHORTCUTS = frozenset(_SHORTCUT_HANDLERS)  # Every shortcut name. register_shortcut() replaces it with a new frozenset.
+_BUILT_IN_SHORTCUTS = frozenset(_SHORTCUT_HANDLERS)
+
+
+def register_shortcut(name, arity, func, code_template=None):
+    """Add a new shortcut that sc() can run. The shortcut's numeric arguments are converted to floats and passed to
+    func along with the turtle object, i.e. func(turtle_obj, *args). The arity is the number of arguments the shortcut
+    takes (or a tuple of the allowed numbers of arguments.) For example:
+
+    >>> def triangle(turtle_obj, size):
+    ...     for i in range(3):
+    ...         turtle_obj.forward(size)
+    ...         turtle_obj.left(120)
+    ...
+    >>> register_shortcut('tri', 1, triangle, 'for i in range(3):\n    forward({0})\n    left(120)')
+    >>> sc('tri 100, f 100, tri 50')
+    3
+
+    The code_template is the Python code that scs() and psc() return for the shortcut. The `{0}`, `{1}`, etc. in it
+    are replaced with the arguments, and `{args}` is replaced by all of them separated by commas. Newlines separate
+    multiple lines of code. If code_template is None, it is the name of the shortcut called like a function.
+
+    Registering a name again replaces the shortcut, but the names of built-in shortcuts can't be registered."""
+    if not isinstance(name, str) or not re.match(r'^[A-Za-z_][A-Za-z0-9_]*$', name):
+        raise TurtleShortcutException('Shortcut names must be a letter or underscore followed by letters, numbers, or underscores, not ' + repr(name) + '.')
+    name = name.lower()
+    if name in _BUILT_IN_SHORTCUTS:
+        raise TurtleShortcutException('`' + name + '` is a built-in shortcut and cannot be registered.')
+    if name in _MACROS:
+        raise TurtleShortcutException('`' + name + '` is a macro and cannot be registered.')
+
+    if isinstance(arity, int):
+        arity = (arity,)
+    elif arity is not None:
+        arity = tuple(sorted(arity))
+    if code_template is None:
+        code_template = name + '({args})'
+
+    global ALL_SHORTCUTS
+    _SHORTCUT_HANDLERS[name] = _ShortcutHandler(name, arity, func, code_template)
+    ALL_SHORTCUTS = frozenset(_SHORTCUT_HANDLERS)
+    clear_sc_cache()  # Programs already in the cache could be using an old handler for this name.
+
+
+def unregister_shortcut(name):
+    """Remove a shortcut that was added with register_shortcut()."""
+    name = name.lower()
+    if name in _BUILT_IN_SHORTCUTS or name not in _SHORTCUT_HANDLERS:
+        raise TurtleShortcutException('`' + name + '` is not a registered shortcut.')
+    global ALL_SHORTCUTS
+    del _SHORTCUT_HANDLERS[name]
+    ALL_SHORTCUTS = frozenset(_SHORTCUT_HANDLERS)
+    clear_sc_cache()
+
+
+class SimTurtle:
+    """A turtle that only keeps track of its state and doesn't draw anything, so it doesn't need Tk or a display.
+    It has the turtle.py methods that shortcuts use, and can be passed as the turtle_obj to sc() and compile_sc():
+
+    >>> t = SimTurtle()
+    >>> sc('f 100, l 90, f 50', turtle_obj=t)
+    3
+    >>> t.position()
+    (100.00,50.00)
+
+    Instead of drawing, it adds each primitive drawing operation to its operations list as a tuple:
+    ('line', (x1, y1), (x2, y2), pencolor, pensize), ('dot', (x, y), size, color),
+    ('stamp', stamp_id, (x, y), heading), ('clearstamp', stamp_id), ('fill', points, fillcolor),
+    ('bgcolor', color), or ('clear',). A SimTurtle is also its own screen, so getscreen() returns itself."""
+
+    def __init__(self):
+        self.operations = []
+        self._colormode = 1.0
+        self._bgcolor = 'white'
+        self._tracer = 1
+        self._delay = 10
+        self._next_stamp_id = 1
+        self._undo_buffer = collections.deque(maxlen=1000)  # The same size as turtle.py's undo buffer.
+        # How many undo entries were added and not undone or removed, counting the ones that the full undo buffer
+        # dropped. Replay uses this to tell when an undo reaches back before a keyframe:
+        self._undo_height = 0
+        # The angle units, which reset() doesn't change, the same as turtle.py. These names are the same as turtle.py's.
+        self._degreesPerAU = 1.0
+        self._fullcircle = 360.0
+        self._angleOffset = 0.0  # A SimTurtle is always in 'standard' mode, where headings start at east...
+        self._angleOrient = 1  # ...and go counterclockwise.
+        self._reset_state()
+
+    def _reset_state(self):
+        self._x, self._y = 0.0, 0.0
+        self._orient = (1.0, 0.0)  # The heading as a unit vector.
+        self._pendown = True
+        self._pensize = 1
+        self._pencolor = 'black'
+        self._fillcolor = 'black'
+        self._fill_path = None
+        self._visible = True
+        self._speed = 3
+        self._stamps = ()
+
+    def __repr__(self):
+        return '<SimTurtle at ' + str(self.position()) + ' heading ' + str(self.heading()) + '>'
+
+    def _state(self):
+        fill_length = None if self._fill_path is None else len(self._fill_path)
+        return (self._x, self._y, self._orient, self._degreesPerAU, self._fullcircle, self._pendown, self._pensize,
+                self._pencolor, self._fillcolor, self._fill_path, fill_length, self._visible, self._stamps, self._speed)
+
+    def _push_undo(self, kind):
+        # Each entry is (kind, state, operations length). Like turtle.py, undoing an entry only puts back what its
+        # kind changes: 'move' for the position and heading, 'turn' for the heading, 'pen' for pen() changes (such as
+        # penup(), pencolor(), hideturtle(), and speed()), and 'fill' for fills. Stamp entries have the stamp id as
+        # their kind, so clearstamp() can remove them:
+        self._undo_buffer.append((kind, self._state(), len(self.operations)))
+        self._undo_height += 1
+
+    def _snapshot(self):
+        '''Returns a copy of everything about the SimTurtle except its operations list, and the length of that list,
+        for _restore(). The fill paths are copied, since the SimTurtle changes its fill path lists.'''
+        def copy_state(state):
+            return state if state[9] is None else state[:9] + (tuple(state[9][:state[10]]),) + state[10:]
+        return (copy_state(self._state()), tuple((kind, copy_state(state), length) for kind, state, length in self._undo_buffer),
+                len(self.operations), self._colormode, self._bgcolor, self._tracer, self._delay, self._next_stamp_id,
+                self._speed, self._undo_height)
+
+    def _restore(self, snapshot, operations):
+        '''Sets the SimTurtle to a snapshot from _snapshot(). Its operations list becomes a copy of the start of
+        operations, which is the operations list of the SimTurtle that the snapshot came from.'''
+        def copy_state(state):
+            return state if state[9] is None else state[:9] + (list(state[9]),) + state[10:]
+        (state, undo_entries, operations_length, self._colormode, self._bgcolor, self._tracer, self._delay,
+         self._next_stamp_id, self._speed, self._undo_height) = snapshot
+        (self._x, self._y, self._orient, self._degreesPerAU, self._fullcircle, self._pendown, self._pensize,
+         self._pencolor, self._fillcolor, self._fill_path, fill_length, self._visible, self._stamps,
+         self._speed) = copy_state(state)
+        self._undo_buffer.clear()
+        self._undo_buffer.extend((kind, copy_state(state), length) for kind, state, length in undo_entries)
+        self.operations = operations[:operations_length]
+
+    def _goto(self, x, y):
+        if self._pendown:
+            self.operations.append(('line', (self._x, self._y), (x, y), self._pencolor, self._pensize))
+        self._x, self._y = x, y
+        if self._fill_path is not None:
+            self._fill_path.append((x, y))
+
+    def _rotate(self, angle):
+        '''Turns the turtle counterclockwise by the angle (in the turtle's angle units.)'''
+        radians = math.radians(angle * self._degreesPerAU)
+        c, s = math.cos(radians), math.sin(radians)
+        self._orient = (self._orient[0] * c - self._orient[1] * s, self._orient[0] * s + self._orient[1] * c)
+
+    # MOVEMENT:
+    def forward(self, distance):
+        self._push_undo('move')
+        self._goto(self._x + self._orient[0] * distance, self._y + self._orient[1] * distance)
+
+    def backward(self, distance):
+        self.forward(-distance)
+
+    def right(self, angle):
+        self._push_undo('turn')
+        self._rotate(-angle)
+
+    def left(self, angle):
+        self._push_undo('turn')
+        self._rotate(angle)
+
+    def goto(self, x, y=None):
+        if y is None:
+            x, y = x  # goto() can also be called with a single (x, y) tuple.
+        self._push_undo('move')
+        self._goto(float(x), float(y))
+
+    def teleport(self, x=None, y=None, *, fill_gap=False):
+        # Like turtle.py, this lifts the pen and puts it back with pen changes, and ends the fill and begins a new
+        # one. The move itself isn't in the undo buffer, so undoing a teleport doesn't move the turtle back:
+        pendown = self._pendown
+        filling = self._fill_path is not None and not fill_gap
+        if pendown:
+            self.penup()
+        if filling:
+            self.end_fill()
+        self._goto(self._x if x is None else float(x), self._y if y is None else float(y))
+        self._push_undo('pen')
+        self._pendown = pendown
+        if filling:
+            self.begin_fill()
+
+    def setx(self, x):
+        self.goto(x, self._y)
+
+    def sety(self, y):
+        self.goto(self._x, y)
+
+    def setheading(self, to_angle):
+        self._push_undo('turn')
+        angle = to_angle - self.heading()
+        full = self._fullcircle
+        self._rotate((angle + full / 2.0) % full - full / 2.0)
+
+    def home(self):
+        self.goto(0, 0)
+        self.setheading(0)
+
+    def circle(self, radius, extent=None, steps=None):
+        # This uses the same steps and angles as turtle.py, so a SimTurtle ends up in the same place.
+        self._push_undo('move')
+        if extent is None:
+            extent = self._fullcircle
+        if steps is None:
+            frac = abs(extent) / self._fullcircle
+            steps = 1 + int(min(11 + abs(radius) / 6.0, 59.0) * frac)
+        w = 1.0 * extent / steps
+        w2 = 0.5 * w
+        length = 2.0 * radius * math.sin(math.radians(w2 * self._degreesPerAU))
+        if radius < 0:
+            length, w, w2 = -length, -w, -w2
+        self._rotate(w2)
+        for i in range(steps):
+            self._goto(self._x + self._orient[0] * length, self._y + self._orient[1] * length)
+            self._rotate(w)
+        self._rotate(-w2)
+
+    def degrees(self, fullcircle=360.0):
+        self._fullcircle = fullcircle
+        self._degreesPerAU = 360 / fullcircle
+
+    def radians(self):
+        self.degrees(2 * math.pi)
+
+    # STATE:
+    def position(self):
+        return turtle.Vec2D(self._x, self._y)
+
+    pos = position
+
+    def xcor(self):
+        return self._x
+
+    def ycor(self):
+        return self._y
+
+    def heading(self):
+        result = round(math.degrees(math.atan2(self._orient[1], self._orient[0])), 10) % 360.0
+        return (result / self._degreesPerAU) % self._fullcircle
+
+    def distance(self, x, y=None):
+        if y is None:
+            x, y = x
+        return math.hypot(x - self._x, y - self._y)
+
+    def isdown(self):
+        return self._pendown
+
+    def isvisible(self):
+        return self._visible
+
+    def filling(self):
+        return self._fill_path is not None
+
+    # PEN:
+    # Like turtle.py, pendown(), penup(), pencolor(), and fillcolor() don't add an undo entry when they don't change
+    # anything, but the other pen changes always do:
+    def pendown(self):
+        if self._pendown:
+            return
+        self._push_undo('pen')
+        self._pendown = True
+
+    def penup(self):
+        if not self._pendown:
+            return
+        self._push_undo('pen')
+        self._pendown = False
+
+    pd, pu = pendown, penup
+
+    def pensize(self, width=None):
+        if width is None:
+            return self._pensize
+        self._push_undo('pen')
+        self._pensize = width
+
+    width = pensize
+
+    def speed(self, speed=None):
+        if speed is None:
+            return self._speed
+        self._push_undo('pen')
+        self._speed = int(round(speed)) if 0.5 < speed < 10.5 else 0
+
+    def showturtle(self):
+        self._push_undo('pen')
+        self._visible = True
+
+    def hideturtle(self):
+        self._push_undo('pen')
+        self._visible = False
+
+    def _color_arg(self, args):
+        '''Returns the color for pencolor(), fillcolor(), or bgcolor() arguments, raising TurtleGraphicsError if it's invalid.'''
+        color = args[0] if len(args) == 1 else tuple(args)
+        resolved = _resolve_color(color, self._colormode)
+        if resolved is None:
+            raise turtle.TurtleGraphicsError('bad color ' + ('string: ' if isinstance(color, str) else 'sequence: ') + str(color))
+        return resolved
+
+    def pencolor(self, *args):
+        if not args:
+            return self._pencolor
+        color = self._color_arg(args)
+        if color == self._pencolor:
+            return
+        self._push_undo('pen')
+        self._pencolor = color
+
+    def fillcolor(self, *args):
+        if not args:
+            return self._fillcolor
+        color = self._color_arg(args)
+        if color == self._fillcolor:
+            return
+        self._push_undo('pen')
+        self._fillcolor = color
+
+    def begin_fill(self):
+        # Like turtle.py, undoing begin_fill() stops filling, even if there was a fill before it:
+        self._fill_path = None
+        self._push_undo('fill')
+        self._fill_path = [(self._x, self._y)]
+
+    def end_fill(self):
+        # Like turtle.py, this only adds an undo entry if it fills something, and undoing that entry erases the fill
+        # without filling again, so the entry has the state from after the fill ended:
+        fill_path, self._fill_path = self._fill_path, None
+        if fill_path is not None and len(fill_path) > 2:
+            self._push_undo('fill')
+            self.operations.append(('fill', tuple(fill_path), self._fillcolor))
+
+    def dot(self, size=None, *color):
+        self._push_undo('move')
+        if not size:
+            size = self._pensize + max(self._pensize, 4)
+        self.operations.append(('dot', (self._x, self._y), size, self._color_arg(color) if color else self._pencolor))
+
+    def stamp(self):
+        stamp_id = self._next_stamp_id
+        self._push_undo(stamp_id)
+        self._next_stamp_id += 1
+        self._stamps += (stamp_id,)
+        self.operations.append(('stamp', stamp_id, (self._x, self._y), self.heading()))
+        return stamp_id
+
+    def clearstamp(self, stampid):
+        if stampid in self._stamps:
+            self._stamps = tuple(stamp_id for stamp_id in self._stamps if stamp_id != stampid)
+            self.operations.append(('clearstamp', stampid))
+        # Like turtle.py, this also takes the stamp out of the undo buffer, so undo() skips it:
+        for entry in self._undo_buffer:
+            if entry[0] == stampid:
+                self._undo_buffer.remove(entry)
+                self._undo_height -= 1
+                break
+
+    def clearstamps(self, n=None):
+        if n is None:
+            to_delete = self._stamps
+        elif n >= 0:
+            to_delete = self._stamps[:n]
+        else:
+            to_delete = self._stamps[n:]
+        for stamp_id in to_delete:
+            self.clearstamp(stamp_id)
+
+    def clear(self):
+        self._fill_path = None  # Like turtle.py, clearing ends any fill without filling it.
+        self._stamps = ()
+        self._undo_buffer.clear()
+        self.operations.append(('clear',))
+
+    def reset(self):
+        self.clear()
+        self._reset_state()
+
+    def undo(self):
+        if not self._undo_buffer:
+            return
+        kind, state, operations_length = self._undo_buffer.pop()
+        self._undo_height -= 1
+        if kind == 'pen':
+            self._pendown, self._pensize, self._pencolor, self._fillcolor = state[5:9]
+            self._visible, self._speed = state[11], state[13]
+            return
+        if kind == 'move':
+            self._x, self._y, self._orient = state[:3]
+        elif kind == 'turn':
+            self._orient = state[2]
+
+        # Like turtle.py, undoing a move takes its points off the fill path, and undoing begin_fill() or end_fill()
+        # stops filling. Their entries have the state from when the turtle wasn't filling:
+        if kind == 'fill' or state[9] is None:
+            self._fill_path = None
+        elif self._fill_path is not None:
+            del self._fill_path[state[10]:]
+
+        # The stamps and clearstamp() operations stay, since clearstamp() isn't in the undo buffer:
+        stamps = state[12]
+        cleared = [operation for operation in self.operations[operations_length:]
+                   if operation[0] == 'clearstamp' and operation[1] in stamps]
+        del self.operations[operations_length:]
+        self.operations.extend(cleared)
+        self._stamps = tuple(stamp_id for stamp_id in stamps if stamp_id in self._stamps)
+
+    # SCREEN:
+    def getscreen(self):
+        return self
+
+    def mode(self, mode=None):
+        if mode is None:
+            return 'standard'
+        raise turtle.TurtleGraphicsError('A SimTurtle is always in standard mode, not ' + str(mode))
+
+    def colormode(self, cmode=None):
+        if cmode is None:
+            return self._colormode
+        if cmode not in (1.0, 255):
+            raise turtle.TurtleGraphicsError('colormode must be 1.0 or 255, not ' + str(cmode))
+        self._colormode = 255 if cmode == 255 else 1.0
+
+    def bgcolor(self, *args):
+        if not args:
+            return self._bgcolor
+        self._bgcolor = self._color_arg(args)
+        self.operations.append(('bgcolor', self._bgcolor))
+
+    def tracer(self, n=None, delay=None):
+        if n is None:
+            return self._tracer
+        self._tracer = int(n)
+        if delay is not None:
+            self._delay = int(delay)
+
+    def delay(self, delay=None):
+        if delay is None:
+            return self._delay
+        self._delay = int(delay)
+
+    def update(self):
+        pass  # There is nothing to draw.
+
+    def bye(self):
+        pass
+
+    def done(self):
+        pass
+
+    mainloop = done
+
+    def exitonclick(self):
+        pass
+
+
+class VirtualCanvas:
+    """An in-memory stand-in for the Tk canvas that turtle.py draws on. It has the Tk canvas methods that
+    turtle.py calls, but instead of making Tk items it keeps each item's type, coordinates, and options,
+    with the coordinates stored compactly in an array of floats. Like a Tk canvas, the y coordinates are
+    flipped, so (100, -50) is the turtle's (100, 50). You normally get one from a VirtualScreen's getcanvas(),
+    and can look at the drawing with the same find_all(), type(), coords(), and itemcget() methods as Tk's canvas."""
+
+    def __init__(self, width=turtle._CFG['canvwidth'], height=turtle._CFG['canvheight'], bg='white'):
+        # Keys are item ids, values are [type, coordinates array, options dict]. Dicts keep their insertion
+        # order, which is the order the items are stacked in, so raising an item just reinserts it at the end.
+        self._items = {}
+        self._next_item_id = 1
+        self._config = {'width': width, 'height': height, 'bg': bg, 'scrollregion': None}
+        self._bindings = {}  # Keys are (item id or None, event sequence), values are the callback functions.
+        self._callbacks = []  # The functions passed to after() and after_idle(), which update() calls.
+
+    def _create(self, item_type, coords, options):
+        item_id = self._next_item_id
+        self._next_item_id += 1
+        self._items[item_id] = [item_type, array.array('d', _flatten_coords(coords)), options]
+        return item_id
+
+    def create_line(self, *coords, **options):
+        return self._create('line', coords, options)
+
+    def create_polygon(self, *coords, **options):
+        return self._create('polygon', coords, options)
+
+    def create_image(self, *coords, **options):
+        return self._create('image', coords, options)
+
+    def create_text(self, *coords, **options):
+        return self._create('text', coords, options)
+
+    def coords(self, item, *coords):
+        if not coords:
+            return list(self._items[item][1])
+        self._items[item][1] = array.array('d', _flatten_coords(coords))
+
+    def itemconfigure(self, item, **options):
+        self._items[item][2].update(options)
+
+    itemconfig = itemconfigure
+
+    def itemcget(self, item, option):
+        return self._items[item][2].get(option, '')
+
+    def type(self, item):
+        return self._items[item][0] if item in self._items else None
+
+    def find_all(self):
+        return tuple(self._items)
+
+    def delete(self, *items):
+        if 'all' in items:
+            self._items.clear()
+        for item in items:
+            self._items.pop(item, None)
+
+    def tag_raise(self, item):
+        self._items[item] = self._items.pop(item)
+
+    def tag_lower(self, item, belowThis=None):
+        lowered = self._items.pop(item)
+        items = list(self._items.items())
+        index = 0 if belowThis is None else list(self._items).index(belowThis)
+        self._items = dict(items[:index] + [(item, lowered)] + items[index:])
+
+    def bbox(self, *items):
+        xs, ys = [], []
+        for item in items:
+            item_type, coords, options = self._items[item]
+            if item_type == 'text':
+                # There's no font to measure, so guess the text's size from the font size:
+                font_size = options.get('font', ('Arial', 8))[1]
+                width, height = len(options.get('text', '')) * font_size * 0.6, font_size * 1.5
+                left = {'sw': 0, 's': -width / 2, 'se': -width}[options.get('anchor', 'sw')]
+                xs.extend((coords[0] + left, coords[0] + left + width))
+                ys.extend((coords[1] - height, coords[1]))
+            else:
+                xs.extend(coords[0::2])
+                ys.extend(coords[1::2])
+        if not xs:
+            return None
+        return (int(min(xs)), int(min(ys)), int(max(xs)), int(max(ys)))
+
+    def config(self, **options):
+        self._config.update(options)
+
+    configure = config
+
+    def cget(self, option):
+        return self._config[option]
+
+    __getitem__ = cget
+
+    def winfo_rgb(self, color):
+        rgb = _tk_color_rgb(color)
+        if rgb is None:
+            raise turtle.TK.TclError('unknown color name "' + str(color) + '"')
+        return rgb
+
+    def winfo_width(self):
+        return self._config['width']
+
+    def winfo_height(self):
+        return self._config['height']
+
+    def winfo_toplevel(self):
+        return self
+
+    def call(self, *args):
+        pass  # turtle.py calls this through winfo_toplevel() to raise the window on macOS.
+
+    def canvasx(self, x):
+        return x
+
+    def canvasy(self, y):
+        return y
+
+    def bind(self, sequence, func=None, add=None):
+        self._bindings[(None, sequence)] = func
+
+    def unbind(self, sequence, funcid=None):
+        self._bindings.pop((None, sequence), None)
+
+    def tag_bind(self, item, sequence, func=None, add=None):
+        self._bindings[(item, sequence)] = func
+
+    def tag_unbind(self, item, sequence, funcid=None):
+        self._bindings.pop((item, sequence), None)
+
+    def focus_force(self):
+        pass
+
+    def after(self, ms, func=None):
+        # There's no window to animate, so after() doesn't wait. Callbacks run on the next update().
+        if func is not None:
+            self._callbacks.append(func)
+
+    def after_idle(self, func):
+        self._callbacks.append(func)
+
+    def update(self):
+        callbacks, self._callbacks = self._callbacks, []
+        for func in callbacks:
+            func()
+
+
+class _VirtualImage:
+    '''Stands in for the Tk PhotoImage objects that turtle.py uses for the blank shape, gif shapes, and bgpic().'''
+    def __init__(self, filename=None):
+        self.filename = filename
+
 
+class VirtualScreen(turtle.TurtleScreen):
+    """A TurtleScreen that draws on a VirtualCanvas instead of a Tk window, so the real turtle module (with
+    undo(), stamps, fills, and everything else) runs without a display. Pass it to turtle.RawTurtle(), or call
+    use_virtual_screen() to make the turtle module's functions use it:
 
-def in_degrees_mode():
-    """Returns True if turtle is in degrees mode, False if in radians mode."""
-    return not in_radians_mode()
+    >>> screen = VirtualScreen()
+    >>> t = turtle.RawTurtle(screen)
+    >>> sc('f 100, l 90, f 50', turtle_obj=t)
+    3
+    >>> t.position()
+    (100.00,50.00)"""
 
+    def __init__(self, width=turtle._CFG['canvwidth'], height=turtle._CFG['canvheight'], mode=turtle._CFG['mode'],
+                 colormode=turtle._CFG['colormode'], delay=turtle._CFG['delay']):
+        turtle.TurtleScreen.__init__(self, VirtualCanvas(width, height), mode, colormode, delay)
+
+    def _blankimage(self):
+        return _VirtualImage()
+
+    def _image(self, filename):
+        return _VirtualImage(filename)
+
+    def mainloop(self):
+        pass  # There's no window to keep open.
+
+    done = mainloop
+
+    def exitonclick(self):
+        pass
+
+    def bye(self):
+        pass
+
+    def setup(self, width=turtle._CFG['width'], height=turtle._CFG['height'], startx=None, starty=None):
+        # Without a display, there's no screen size for float (fraction of the screen) sizes to use:
+        if isinstance(width, int):
+            self.cv.config(width=width)
+        if isinstance(height, int):
+            self.cv.config(height=height)
+
+    def title(self, titlestring):
+        self.titlestring = titlestring
+
+
+def use_virtual_screen(width=turtle._CFG['canvwidth'], height=turtle._CFG['canvheight']):
+    """Makes the turtle module's functions (forward(), pencolor(), and so on) and new Turtle objects draw on
+    a VirtualScreen instead of opening a Tk window, and returns that VirtualScreen. Call this before any
+    other turtle functions, such as at the top of a program or test suite that runs without a display."""
+    screen = VirtualScreen(width, height)
+    turtle.Turtle._screen = screen
+    turtle.Turtle._pen = None  # The next turtle function call makes a new Turtle on the VirtualScreen.
+    return screen
+
+
+def _flatten_coords(coords):
+    '''Returns the coordinates passed to a canvas method as a flat sequence of numbers. Like Tk, the canvas
+    methods accept either separate numbers or a single sequence of them.'''
+    if len(coords) == 1 and not isinstance(coords[0], (int, float)):
+        coords = coords[0]
+    if coords and not isinstance(coords[0], (int, float)):
+        coords = [n for point in coords for n in point]  # Flatten (x, y) pairs.
+    return coords
+
+
+def _tk_color_rgb(color):
+    '''Returns the (red, green, blue) of a Tk color string like 'red', 'dark green', or '#FF0000', with each
+    value from 0 to 65535 like Tk's winfo_rgb(). Returns None if Tk wouldn't accept the color string.'''
+    if not isinstance(color, str):
+        return None
+    if color.startswith('#'):
+        digits = color[1:]
+        if len(digits) not in (3, 6, 9, 12) or re.match(r'^[0-9A-Fa-f]+$', digits) is None:
+            return None
+        n = len(digits) // 3
+        # Scale each value up to 16 bits, so '#F00' and '#FF0000' are both 65535 red:
+        return tuple(int(digits[i:i + n], 16) * 65535 // (16 ** n - 1) for i in range(0, len(digits), n))
+    value = _COLOR_NAMES.get(color.replace(' ', '').lower())
+    if value is None:
+        return None
+    return ((value >> 16) * 257, ((value >> 8) & 0xFF) * 257, (value & 0xFF) * 257)
+
+
+def in_radians_mode(turtle_obj=None):
+    """Returns True if the turtle is in radians mode, False if in degrees mode. If turtle_obj is None, this checks
+    the main turtle. This reads the turtle's angle units directly, so it doesn't move the turtle or add to its
+    undo buffer."""
+    # turtle.py's radians() sets the number of angle units in a full circle to 2 pi:
+    return _get_turtle(turtle_obj)._fullcircle == 2 * math.pi
+
+
+def in_degrees_mode(turtle_obj=None):
+    """Returns True if the turtle is in degrees mode, False if in radians mode. If turtle_obj is None, this checks
+    the main turtle."""
+    return not in_radians_mode(turtle_obj)
+
+
+def scs(*args, file=None):
+    """Returns the shortcut string of Python code that would be executed by the sc() function, suitable for printing to the screen.
+
+    If file is a file-like object (anything with a write() method), the code is written to it one line at a time
+    instead, and scs() returns None. This keeps memory use low for very long shortcut strings."""
+    if file is None:
+        return sc(*args, _return_turtle_code=True)
+    for line in iscs(*args):
+        file.write(line + '\n')
+
+
+def iscs(*args, turtle_obj=None):
+    """A generator version of scs() that yields the lines of Python code one at a time, without the newlines:
+
+    >>> list(iscs('f 100, l 90'))
+    ['forward(100)', 'left(90)']
+
+    Like sc(), all of the shortcuts are checked for syntax errors before the first line is yielded."""
+    shortcuts = ','.join(args)
+    if shortcuts == '':
+        return
+
+    if turtle_obj is None:
+        turtle_obj = turtle  # Use the main turtle given by the module.
+
+    program = compile_sc(shortcuts, turtle_obj=turtle_obj)
+    if program._rgb_instructions:
+        colormode = turtle_obj.colormode()
+        for instruction in program._rgb_instructions:
+            _check_rgb_instruction(instruction, colormode)
+    for instruction in program.instructions:
+        yield from _run_instruction(instruction, turtle_obj, _return_turtle_code=True)
 
-def scs(*args):
-    """Returns the shortcut string of Python code that would be executed by the sc() function, suitable for printing to the screen."""
-    return sc(*args, _return_turtle_code=True)
 
 def psc(*args):
     """Prints the Python code that would be executed by the sc() function."""
+    for line in iscs(*args):
+        print(line)
 
-    # end='' because sc() already adds a newline to the last line.
-    print(sc(*args, _return_turtle_code=True), end='')
 
+def sc_export(shortcuts, file, batch_size=1000):
+    """Write a standalone Python program that draws the shortcuts without turtlesc. The shortcuts can be a shortcut
+    string, a list of shortcut strings such as the one end_recording() returns, or a ShortcutProgram. The file is a
+    filename or a file-like object, and the program is written to it one line at a time.
 
-def begin_recording(shortcut_list=None):
-    """Start recording turtlesc function calls."""
+    The program has a main() function that draws on a turtle it's passed (or a new turtle) with tracer() turned off,
+    updating the screen every batch_size shortcuts, so you can run it or import it:
+
+    >>> sc_export(end_recording(), 'drawing.py')
+
+    The shortcuts are parsed and written one at a time, so exporting a long recording doesn't compile all of it at
+    once, and doesn't add it to the sc() cache or define its macros for sc(). Macros from earlier sc() calls are
+    written into the program. Registered shortcuts whose code calls their own function can't be exported, and raise
+    TurtleShortcutException before anything is written.
+    """
+    if not isinstance(shortcuts, (str, ShortcutProgram)) and iter(shortcuts) is shortcuts:
+        shortcuts = list(shortcuts)  # The shortcuts are gone through twice, so a one-time iterator becomes a list.
+
+    # Check the shortcuts and find the variables and earlier macros that the program needs before writing anything:
+    variable_names, macro_lines = _export_names(shortcuts)
+    if isinstance(file, str):
+        with open(file, 'w') as file_obj:
+            _write_script(shortcuts, file_obj, batch_size, variable_names, macro_lines)
+    else:
+        _write_script(shortcuts, file, batch_size, variable_names, macro_lines)
+
+
+def _export_instructions(shortcuts, func):
+    '''Parses sc_export()'s shortcuts one at a time and calls func with each instruction tuple, so the instructions
+    for the whole program are never in memory at once. The macros that the shortcuts define are only used while
+    parsing them, and aren't added to _MACROS.'''
+    if isinstance(shortcuts, ShortcutProgram):
+        for instruction in shortcuts.instructions:
+            func(instruction)
+        return
+    if isinstance(shortcuts, str):
+        shortcuts = (shortcuts,)
+
+    def parse(strings):
+        # Newlines join the strings instead of commas, so that comments don't swallow shortcuts:
+        for shortcut, blocks in _split_shortcuts('\n'.join(strings)):
+            func(_parse_shortcut(shortcut, blocks=blocks))
+
+    with _MacroDefinitions(keep=False):
+        # A [ ] block can go on in the strings after it, so strings are joined until their brackets are all closed:
+        strings = []
+        open_brackets = 0
+        for shortcut_str in shortcuts:
+            strings.append(shortcut_str)
+            open_brackets += shortcut_str.count('[') - shortcut_str.count(']')
+            if open_brackets <= 0:
+                parse(strings)
+                strings, open_brackets = [], 0
+        if strings:
+            parse(strings)  # This raises the exception for the [ that has no matching ].
+
+
+_DEF_LINE_REGEX = re.compile(r'^\s*def ([A-Za-z_][A-Za-z0-9_]*)\(')
+
+
+def _export_names(shortcuts):
+    '''Checks sc_export()'s shortcuts and returns a list of the names of the variables they assign, and a list of
+    the lines of code that define the macros from earlier sc() calls that they call. Raises TurtleShortcutException
+    if the code calls a function that the exported program doesn't have, such as a registered shortcut's function.'''
+    variable_names = []
+    macro_lines = []
+    defined_names = set()  # The names of the macros whose code comes before the current line.
+    code_turtle = SimTurtle()
+
+    def check_lines(lines, shortcut):
+        for line in lines:
+            mo = _DEF_LINE_REGEX.match(line)
+            if mo is not None:
+                defined_names.add(mo.group(1))
+                continue
+            mo = _LINE_CALL_REGEX.match(_bind_turtle_call(line))
+            if mo is None:
+                continue
+            name = mo.group(2)
+            if name in defined_names or name in ('random', 'randint', 'uniform', 'sleep') or hasattr(builtins, name):
+                continue
+            if name not in _MACROS:
+                raise TurtleShortcutException('`' + shortcut.strip() + '` cannot be exported: Its code calls `' + name + '()`, which the exported program does not have.')
+            # The code for a macro from an earlier sc() call goes at the start of main(), along with any macros it calls:
+            definition_lines = tuple(_run_instruction(_MACROS[name], code_turtle, _return_turtle_code=True))
+            check_lines(definition_lines, shortcut)
+            macro_lines.extend(definition_lines)
+
+    def check_instruction(instruction):
+        variable_names.extend(name for name in _assigned_variables((instruction,)) if name not in variable_names)
+        check_lines(_run_instruction(instruction, code_turtle, _return_turtle_code=True), instruction[3])
+
+    _export_instructions(shortcuts, check_instruction)
+    return variable_names, macro_lines
+
+
+def _write_script(shortcuts, file, batch_size, variable_names, macro_lines):
+    '''Writes sc_export()'s program for the shortcuts to the file-like object.'''
+    file.write('"""A turtle drawing exported by turtlesc. Run this file to draw it, or import it and call main()."""\n'
+               'import turtle\n'
+               'from random import random, randint, uniform\n'
+               'from time import sleep\n'
+               '\n\n'
+               'def main(t=None):\n'
+               '    """Draws on the turtle t, or on a new turtle if t is None."""\n')
+    if variable_names:
+        file.write('    global ' + ', '.join(variable_names) + '\n')
+    file.write('    if t is None:\n'
+               '        t = turtle.Turtle()\n'
+               '    screen = t.getscreen()\n'
+               '    _tracer, _delay = screen.tracer(), screen.delay()\n'
+               '    screen.tracer(0, 0)\n')
+    for line in macro_lines:
+        file.write('    ' + _bind_turtle_call(line) + '\n')
+
+    # The code is written for a new turtle, which is in degrees mode and colormode 1.0 like a new SimTurtle. Using
+    # a SimTurtle here means exporting doesn't open a turtle window.
+    code_turtle = SimTurtle()
+
+    # Update the screen between top-level lines every batch_size shortcuts:
+    shortcuts_since_update = 0
+    def write_instruction(instruction):
+        nonlocal shortcuts_since_update
+        if shortcuts_since_update >= batch_size:
+            file.write('    screen.update()\n')
+            shortcuts_since_update = 0
+        for line in _run_instruction(instruction, code_turtle, _return_turtle_code=True):
+            file.write('    ' + _bind_turtle_call(line) + '\n')
+        if instruction[0].count != 0:
+            shortcuts_since_update += 1  # Blanks and comments don't count.
+
+    _export_instructions(shortcuts, write_instruction)
+    file.write('    screen.update()\n'
+               '    screen.tracer(_tracer, _delay)\n'
+               '\n\n'
+               "if __name__ == '__main__':\n"
+               '    main()\n'
+               '    turtle.done()\n')
+
+
+_LINE_CALL_REGEX = re.compile(r'^(\s*)([A-Za-z_][A-Za-z0-9_]*)\(')
+
+
+def _bind_turtle_call(line):
+    '''Returns the line of scs() code with a `t.` or `screen.` in front of the turtle function call that starts it,
+    such as 't.forward(100)' for 'forward(100)'. Other lines, like variable assignments and macro calls, are the same.'''
+    match = _LINE_CALL_REGEX.match(line)
+    if match is None:
+        return line
+    indent, name = match.groups()
+    if hasattr(turtle.RawTurtle, name):
+        return indent + 't.' + line[len(indent):]
+    if hasattr(turtle._Screen, name):
+        return indent + 'screen.' + line[len(indent):]
+    return line
+
+
+class ShortcutRecording:
+    """A compact list of recorded shortcut strings. begin_recording() records into one of these, which is the
+    RECORDED_SHORTCUTS variable. It works like a list of strings: you can append() to it, iterate over it, index it,
+    and compare it to a list. Most shortcuts aren't stored as strings, though. Each one is a number for its name in
+    one array plus its numeric arguments in an array of floats. The string is made again when you iterate over the
+    recording or index it. Shortcuts that can't be stored this way, like comments and color names, are kept as
+    strings, but each different string is only stored once.
+
+    If merge is True, the shortcuts are merged as they're appended, the way merge_shortcuts() merges them, and only
+    the last few shortcuts that a later one could still merge with are kept unmerged. Call finish_merging() once
+    everything is appended to merge those too.
+
+    Save a recording to a binary file with save_recording(), and load it with load_recording(). A loaded recording
+    reads from a memory map of the file until close() is called, which is also called at the end of a with statement:
+
+    >>> with load_recording('session.tsc') as recording:
+    ...     shortcuts = recording[:100]"""
+
+    def __init__(self, shortcuts=(), merge=False):
+        self._names = [None]  # The shortcut names, indexed by their opcode. Opcode 0 means the shortcut is a string.
+        self._name_opcodes = {}  # Keys are shortcut names, values are their opcodes.
+        self._strings = []  # The shortcuts stored as strings. Their index in this list is their only argument.
+        self._string_indexes = {}  # Keys are the strings, values are their indexes in _strings.
+        self._opcodes = array.array('H')
+        self._arg_counts = array.array('B')
+        self._args = array.array('d')
+        self._offsets = None  # Each shortcut's index in _args. This is only made if a shortcut is looked up by index.
+        self._mmap = None  # The memory map of the file, for a recording from load_recording().
+        self._merger = _ShortcutMerger(self._store) if merge else None
+        for shortcut in shortcuts:
+            self.append(shortcut)
+
+    def append(self, shortcut):
+        """Add a shortcut string to the end of the recording."""
+        if self._merger is not None:
+            self._merger.append(shortcut)  # The merger calls _store() once the merged shortcuts can't change.
+        else:
+            self._store(shortcut)
+
+    def finish_merging(self):
+        """Merge the last shortcuts of a recording made with merge=True, and stop merging shortcuts that are
+        appended after this. The recording then has the same shortcuts that merge_shortcuts() returns for all of
+        the shortcuts that were appended."""
+        if self._merger is not None:
+            self._merger.finish()
+            self._merger = None
+
+    def _store(self, shortcut):
+        '''Stores a shortcut string in the recording's arrays.'''
+        if not isinstance(self._args, array.array):
+            self._make_writable()
+
+        parts = shortcut.split(' ')
+        name = parts[0]
+        args = None
+        if _SHORTCUT_NAME_REGEX.match(name) and len(parts) <= 256:
+            try:
+                args = [float(arg_str) for arg_str in parts[1:]]
+            except ValueError:
+                pass
+        # Only store the numbers if the shortcut string can be made again exactly the same, i.e. not for `f 1.50`:
+        if args is not None and all(math.isfinite(arg) for arg in args) and ' '.join([name] + [_number_str(arg) for arg in args]) == shortcut:
+            opcode = self._name_opcodes.get(name)
+            if opcode is None:
+                opcode = self._name_opcodes[name] = len(self._names)
+                self._names.append(name)
+        else:
+            opcode = 0
+            string_index = self._string_indexes.get(shortcut)
+            if string_index is None:
+                string_index = self._string_indexes[shortcut] = len(self._strings)
+                self._strings.append(shortcut)
+            args = (string_index,)
+
+        if self._offsets is not None:
+            self._offsets.append(len(self._args))
+        self._opcodes.append(opcode)
+        self._arg_counts.append(len(args))
+        self._args.extend(args)
+
+    def _make_writable(self):
+        '''Copies the arrays of a recording from load_recording(), which are read-only views of the file, so that
+        shortcuts can be appended to it.'''
+        self._opcodes = array.array('H', self._opcodes)
+        self._arg_counts = array.array('B', self._arg_counts)
+        self._args = array.array('d', self._args)
+
+    def close(self):
+        """Close the memory map of the file that load_recording() loaded this recording from. The recording still
+        works afterwards, since its shortcuts are copied into memory first. This does nothing for other recordings."""
+        if self._mmap is None:
+            return
+        views = (self._opcodes, self._arg_counts, self._args)
+        if not isinstance(self._args, array.array):
+            self._make_writable()
+        for view in views:
+            if isinstance(view, memoryview):
+                view.release()
+        self._mmap.close()
+        self._mmap = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _shortcut(self, opcode, offset, arg_count):
+        '''Returns the shortcut string for an opcode and the offset and count of its arguments in _args.'''
+        if opcode == 0:
+            return self._strings[int(self._args[offset])]
+        return ' '.join([self._names[opcode]] + [_number_str(arg) for arg in self._args[offset:offset + arg_count]])
+
+    def _unstored(self):
+        '''Returns a list of the shortcuts that are still being merged, which come after the stored ones.'''
+        return [] if self._merger is None else self._merger.pending()
+
+    def __len__(self):
+        return len(self._opcodes) + len(self._unstored())
+
+    def __iter__(self):
+        offset = 0
+        for opcode, arg_count in zip(self._opcodes, self._arg_counts):
+            yield self._shortcut(opcode, offset, arg_count)
+            offset += arg_count
+        yield from self._unstored()
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('recording index out of range')
+        if index >= len(self._opcodes):
+            return self._unstored()[index - len(self._opcodes)]
+        if self._offsets is None:
+            self._offsets = array.array('Q', [0])
+            for arg_count in self._arg_counts[:-1]:
+                self._offsets.append(self._offsets[-1] + arg_count)
+        return self._shortcut(self._opcodes[index], self._offsets[index], self._arg_counts[index])
+
+    def __eq__(self, other):
+        if not isinstance(other, (ShortcutRecording, list, tuple)):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    __hash__ = None  # Recordings can change, so they aren't hashable, like lists.
+
+    def __repr__(self):
+        return '<ShortcutRecording of ' + str(len(self)) + ' shortcuts>'
+
+
+_SHORTCUT_NAME_REGEX = re.compile(r'[A-Za-z_][A-Za-z0-9_]*\Z')
+_RECORDING_FILE_MAGIC = b'TURTLESC'
+_RECORDING_FILE_VERSION = 1
+# The header: magic, version, number of shortcuts, number of arguments, and the byte lengths of the names and strings.
+_RECORDING_FILE_HEADER = struct.Struct('<8sIQQQQ')
+
+
+def save_recording(path, recording=None):
+    """Save a recording to a binary file. The recording is RECORDED_SHORTCUTS if it's None, and can also be a
+    ShortcutRecording or a list of shortcut strings, such as the one end_recording() returns."""
+    if recording is None:
+        recording = RECORDED_SHORTCUTS
+    if not isinstance(recording, ShortcutRecording) or recording._merger is not None:
+        recording = ShortcutRecording(recording)  # This also stores the shortcuts that are still being merged.
+
+    # The file is the header, the names and strings, and then the arrays. The names can't have newlines, but the
+    # strings can, so each string is its UTF-8 length followed by its UTF-8 bytes.
+    names = '\n'.join(recording._names[1:]).encode('utf-8')
+    strings = b''.join(struct.pack('<Q', len(s)) + s for s in (string.encode('utf-8') for string in recording._strings))
+    opcodes, arg_counts, args = array.array('H', recording._opcodes), array.array('B', recording._arg_counts), array.array('d', recording._args)
+    if sys.byteorder == 'big':
+        opcodes.byteswap()  # The file is always little-endian.
+        args.byteswap()
+
+    with open(path, 'wb') as file:
+        file.write(_RECORDING_FILE_HEADER.pack(_RECORDING_FILE_MAGIC, _RECORDING_FILE_VERSION, len(opcodes), len(args), len(names), len(strings)))
+        file.write(names)
+        file.write(strings)
+        file.write(opcodes.tobytes())
+        file.write(arg_counts.tobytes())
+        file.write(b'\0' * (-file.tell() % 8))  # Align the floats to 8 bytes.
+        file.write(args.tobytes())
+
+
+def load_recording(path):
+    """Load a recording that was saved with save_recording(), returning a ShortcutRecording. The file is memory-mapped,
+    so the recording's arrays aren't read into memory until they're used. Call the recording's close() method (or use
+    it in a with statement) to close the memory map when you're done with it. Raises TurtleShortcutException if the file
+    isn't a turtlesc recording or is from a newer version of turtlesc."""
+    with open(path, 'rb') as file:
+        header = file.read(_RECORDING_FILE_HEADER.size)
+        if len(header) < _RECORDING_FILE_HEADER.size or not header.startswith(_RECORDING_FILE_MAGIC):
+            raise TurtleShortcutException(str(path) + ' is not a turtlesc recording file.')
+        magic, version, shortcut_count, arg_count, names_length, strings_length = _RECORDING_FILE_HEADER.unpack(header)
+        if version > _RECORDING_FILE_VERSION:
+            raise TurtleShortcutException(str(path) + ' is a version ' + str(version) + ' recording file, which needs a newer version of turtlesc.')
+        data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    recording = ShortcutRecording()
+    view = memoryview(data)
+    position = _RECORDING_FILE_HEADER.size
+    names = bytes(view[position:position + names_length]).decode('utf-8')
+    position += names_length
+    if names:
+        recording._names.extend(names.split('\n'))
+    recording._name_opcodes = {name: opcode for opcode, name in enumerate(recording._names) if opcode != 0}
+
+    strings_end = position + strings_length
+    while position < strings_end:
+        length = struct.unpack_from('<Q', data, position)[0]
+        recording._strings.append(bytes(view[position + 8:position + 8 + length]).decode('utf-8'))
+        position += 8 + length
+    recording._string_indexes = {string: index for index, string in enumerate(recording._strings)}
+
+    # The arrays are views of the memory-mapped file, which ShortcutRecording copies if anything is appended:
+    recording._opcodes = view[position:position + shortcut_count * 2].cast('H')
+    position += shortcut_count * 2
+    recording._arg_counts = view[position:position + shortcut_count].cast('B')
+    position += shortcut_count
+    position += -position % 8
+    recording._args = view[position:position + arg_count * 8].cast('d')
+    view.release()  # The arrays are separate views, so this view isn't needed anymore.
+    recording._mmap = data
+    if sys.byteorder == 'big':
+        recording.close()  # This copies the arrays, so they can be byte-swapped.
+        recording._opcodes.byteswap()
+        recording._args.byteswap()
+    return recording
+
+
+def begin_recording(shortcut_list=None, merge=False):
+    """Start recording turtlesc function calls into RECORDED_SHORTCUTS, which is a new ShortcutRecording.
+
+    If merge is True, the shortcuts are merged while they're recorded instead of by end_recording(), so a long
+    session only keeps the merged shortcuts in memory instead of every shortcut. The results are the same."""
     global RECORDED_SHORTCUTS, _NOW_RECORDING
-    RECORDED_SHORTCUTS = []
+    RECORDED_SHORTCUTS = ShortcutRecording(merge=merge)
 
     _NOW_RECORDING = True
 
 
 def end_recording(merge=True):
-    """Stop recording turtlesc function calls and return the list of recorded function calls."""
+    """Stop recording turtlesc function calls and return the list of recorded function calls. If merge is False,
+    they aren't merged. Either way, RECORDED_SHORTCUTS is still the ShortcutRecording that they were recorded into.
+    If begin_recording() was called with merge=True, the shortcuts were already merged while they were recorded."""
     global RECORDED_SHORTCUTS, _NOW_RECORDING
 
     _NOW_RECORDING = False
+    if isinstance(RECORDED_SHORTCUTS, ShortcutRecording) and RECORDED_SHORTCUTS._merger is not None:
+        # begin_recording(merge=True) merged the shortcuts while they were recorded:
+        RECORDED_SHORTCUTS.finish_merging()
+        return list(RECORDED_SHORTCUTS)
     if merge:
         return merge_shortcuts(RECORDED_SHORTCUTS)
     else:
-        return RECORDED_SHORTCUTS
+        return list(RECORDED_SHORTCUTS)
 
 
 def merge_shortcuts(shortcuts):
-    """Return the shortcuts with redundant function calls merged, i.e. ['f 100', ' f 50', ' r 90', ' l 30'] returns ['f 150', r 60']"""
-    if len(shortcuts) in (0, 1): return shortcuts
-
-    def get_num_str(n):
-        if float(n) % 1 == 0.0:
-            n = int(n)
-        return str(n)
-
-    prev_sc = _MAP_FULL_TO_SHORT_NAMES.get(shortcuts[0], shortcuts[0])
-    pen_is_up = shortcuts[0] == 'pu'  # If it's unknown that the pen is down, set this to True anyway.
-    merged_shortcuts = [shortcuts[0]]
-
-    for i, sc in enumerate(shortcuts):
-        if i == 0: continue  # skip first one.
-
-        sc_parts = sc.lower().split(' ')
-        prev_sc_parts = merged_shortcuts[-1].split(' ')
-
-        if sc_parts[0] == 'f':
-            if prev_sc_parts[0] == 'f':
-                sc_parts[1] = get_num_str(float(prev_sc_parts[1]) + float(sc_parts[1]))
-                merged_shortcuts.pop()
-            elif prev_sc_parts[0] == 'b' and pen_is_up:
-                sc_parts[0] = 'b'
-                sc_parts[1] = get_num_str(float(prev_sc_parts[1]) - float(sc_parts[1]))
-                merged_shortcuts.pop()
-        elif sc_parts[0] == 'b':
-            if prev_sc_parts[0] == 'b':
-                sc_parts[1] = get_num_str(float(prev_sc_parts[1]) + float(sc_parts[1]))
-                merged_shortcuts.pop()
-            elif prev_sc_parts[0] == 'f' and pen_is_up:
-                sc_parts[0] = 'f'
-                sc_parts[1] = get_num_str(float(prev_sc_parts[1]) - float(sc_parts[1]))
-                merged_shortcuts.pop()
-        elif sc_parts[0] == 'l':
-            if prev_sc_parts[0] == 'l':
-                sc_parts[1] = get_num_str(float(prev_sc_parts[1]) + float(sc_parts[1]))
-                merged_shortcuts.pop()
-            elif prev_sc_parts[0] == 'r':
-                sc_parts[0] = 'r'
-                sc_parts[1] = get_num_str(float(prev_sc_parts[1]) - float(sc_parts[1]))
-                merged_shortcuts.pop()
-        elif sc_parts[0] == 'r':
-            if prev_sc_parts[0] == 'r':
-                sc_parts[1] = get_num_str(float(prev_sc_parts[1]) + float(sc_parts[1]))
-                merged_shortcuts.pop()
-            elif prev_sc_parts[0] == 'l':
-                sc_parts[0] = 'l'
-                sc_parts[1] = get_num_str(float(prev_sc_parts[1]) - float(sc_parts[1]))
-                merged_shortcuts.pop()
-        elif sc_parts[0] == 'h':
-            if prev_sc_parts[0] == 'h':
-                merged_shortcuts.pop()
-            elif pen_is_up and prev_sc_parts[0] in ('f', 'b', 'l', 'r', 'sh', 'g', 'n', 's', 'e', 'w', 'nw', 'ne', 'sw', 'se'):
-                merged_shortcuts.pop()
-        elif sc_parts[0] == 'c':
-            if prev_sc_parts[0] == 'c':
-                merged_shortcuts.pop()
-        elif sc_parts[0] == 'g':
-            if pen_is_up and prev_sc_parts[0] in ('f', 'b', 'g'):
-                merged_shortcuts.pop()
-        elif sc_parts[0] == 'tele':
-            if prev_sc_parts[0] == 'tele':
-                merged_shortcuts.pop()
-        elif sc_parts[0] == 'x':
-            if pen_is_up and prev_sc_parts[0] == 'x':
-                merged_shortcuts.pop()
-        elif sc_parts[0] == 'y':
-            if pen_is_up and prev_sc_parts[0] == 'y':
-                merged_shortcuts.pop()
-        elif sc_parts[0] == 'st':
-            pass
-        elif sc_parts[0] == 'pd':
-            if prev_sc_parts[0] == 'pd':
-                merged_shortcuts.pop()
-            pen_is_up = False
-        elif sc_parts[0] == 'pu':
-            if prev_sc_parts[0] == 'pu':
-                merged_shortcuts.pop()
-            pen_is_up = True
-        elif sc_parts[0] == 'ps':
-            if prev_sc_parts[0] == 'ps':
-                merged_shortcuts.pop()
-        elif sc_parts[0] == 'pc':
-            if prev_sc_parts[0] == 'pc':
-                merged_shortcuts.pop()
-        elif sc_parts[0] == 'fc':
-            if prev_sc_parts[0] == 'fc':
-                merged_shortcuts.pop()
-        elif sc_parts[0] == 'bc':
-            if prev_sc_parts[0] == 'bc':
-                merged_shortcuts.pop()
-        elif sc_parts[0] == 'sh':
-            if prev_sc_parts[0] in ('sh', 'l', 'r'):
-                merged_shortcuts.pop()
-        elif sc_parts[0] == 'cir':
-            pass
-        elif sc_parts[0] == 'undo':
-            pass
-        elif sc_parts[0] == 'bf':
-            pass
-        elif sc_parts[0] == 'ef':
-            pass
-        elif sc_parts[0] == 'sleep':
-            if prev_sc_parts[0] == 'sleep':
-                sc_parts[1] = get_num_str(float(prev_sc_parts[1]) + float(sc_parts[1]))
-                merged_shortcuts.pop()
-        elif sc_parts[0] == 'n':
-            if prev_sc_parts[0] == 'n':
-                sc_parts[1] = get_num_str(float(prev_sc_parts[1]) + float(sc_parts[1]))
-                merged_shortcuts.pop()
-            elif prev_sc_parts[0] == 's' and pen_is_up:
-                sc_parts[0] = 's'
-                sc_parts[1] = get_num_str(float(prev_sc_parts[1]) - float(sc_parts[1]))
-                merged_shortcuts.pop()                
-        elif sc_parts[0] == 's':
-            if prev_sc_parts[0] == 's':
-                sc_parts[1] = get_num_str(float(prev_sc_parts[1]) + float(sc_parts[1]))
-                merged_shortcuts.pop()
-            elif prev_sc_parts[0] == 'n' and pen_is_up:
-                sc_parts[0] = 'n'
-                sc_parts[1] = get_num_str(float(prev_sc_parts[1]) - float(sc_parts[1]))
-                merged_shortcuts.pop()
-        elif sc_parts[0] == 'e':
-            if prev_sc_parts[0] == 'e':
-                sc_parts[1] = get_num_str(float(prev_sc_parts[1]) + float(sc_parts[1]))
-                merged_shortcuts.pop()
-            elif prev_sc_parts[0] == 'w' and pen_is_up:
-                sc_parts[0] = 'w'
-                sc_parts[1] = get_num_str(float(prev_sc_parts[1]) - float(sc_parts[1]))
-                merged_shortcuts.pop()
-        elif sc_parts[0] == 'w':
-            if prev_sc_parts[0] == 'w':
-                sc_parts[1] = get_num_str(float(prev_sc_parts[1]) + float(sc_parts[1]))
-                merged_shortcuts.pop()
-            elif prev_sc_parts[0] == 'e' and pen_is_up:
-                sc_parts[0] = 'e'
-                sc_parts[1] = get_num_str(float(prev_sc_parts[1]) - float(sc_parts[1]))
-                merged_shortcuts.pop()
-        elif sc_parts[0] == 'nw':
-            if prev_sc_parts[0] == 'nw':
-                sc_parts[1] = get_num_str(float(prev_sc_parts[1]) + float(sc_parts[1]))
-                merged_shortcuts.pop()
-            elif prev_sc_parts[0] == 'se' and pen_is_up:
-                sc_parts[0] = 'se'
-                sc_parts[1] = get_num_str(float(prev_sc_parts[1]) - float(sc_parts[1]))
-                merged_shortcuts.pop()
-        elif sc_parts[0] == 'ne':
-            if prev_sc_parts[0] == 'ne':
-                sc_parts[1] = get_num_str(float(prev_sc_parts[1]) + float(sc_parts[1]))
-                merged_shortcuts.pop()
-            elif prev_sc_parts[0] == 'sw' and pen_is_up:
-                sc_parts[0] = 'sw'
-                sc_parts[1] = get_num_str(float(prev_sc_parts[1]) - float(sc_parts[1]))
-                merged_shortcuts.pop()
-        elif sc_parts[0] == 'sw':
-            if prev_sc_parts[0] == 'sw':
-                sc_parts[1] = get_num_str(float(prev_sc_parts[1]) + float(sc_parts[1]))
-                merged_shortcuts.pop()
-            elif prev_sc_parts[0] == 'ne' and pen_is_up:
-                sc_parts[0] = 'ne'
-                sc_parts[1] = get_num_str(float(prev_sc_parts[1]) - float(sc_parts[1]))
-                merged_shortcuts.pop()
-        elif sc_parts[0] == 'se':
-            if prev_sc_parts[0] == 'se':
-                sc_parts[1] = get_num_str(float(prev_sc_parts[1]) + float(sc_parts[1]))
-                merged_shortcuts.pop()
-            elif prev_sc_parts[0] == 'nw' and pen_is_up:
-                sc_parts[0] = 'nw'
-                sc_parts[1] = get_num_str(float(prev_sc_parts[1]) - float(sc_parts[1]))
-                merged_shortcuts.pop()
-        elif sc_parts[0] == 'u':
-            pass
-        elif sc_parts[0] == 't':
-            pass
-        elif sc_parts[0] == 'cs':
-            pass
-        elif sc_parts[0] == 'css':
-            pass
-        elif sc_parts[0] == 'spd':
-            if prev_sc_parts[0] == 'spd':
-                merged_shortcuts.pop()
-        elif sc_parts[0] == 'eoc':
-            pass
-        elif sc_parts[0].startswith('#'):
-            pass
+    """Return the shortcuts with redundant function calls merged, i.e. ['f 100', ' f 50', ' r 90', ' l 30'] returns ['f 150', r 60']
+
+    The shortcuts are parsed into a list of instructions that goes through several optimizer passes, each of which
+    takes linear time: redundant pen, color, size, speed, and tracer changes are removed, consecutive moves and
+    turns are merged (including turns before a `sh` that replaces them, and pen-up moves that return to the same
+    point), and repeated updates are removed. Shortcuts that aren't built-in, like registered shortcuts, are kept
+    as they are and nothing is merged across them. Shortcuts that aren't changed are returned as they were."""
+    merged = []
+    merger = _ShortcutMerger(merged.append)
+    for shortcut in shortcuts:
+        merger.append(shortcut)
+    merger.finish()
+    return merged
+
+
+# Moves that merge_shortcuts() can merge with the same move, or cancel with the opposite move when the pen is up:
+_OPPOSITE_MOVES = {'f': 'b', 'b': 'f', 'n': 's', 's': 'n', 'e': 'w', 'w': 'e', 'ne': 'sw', 'sw': 'ne', 'nw': 'se', 'se': 'nw'}
+_HEADING_CHANGES = ('l', 'r', 'sh')
+_POSITION_CHANGES = ('f', 'b', 'g', 'tele', 'x', 'y')  # Moves that change the position but not the heading.
+_REMOVABLE_MOVES = frozenset(_HEADING_CHANGES + _POSITION_CHANGES + tuple(_OPPOSITE_MOVES))
+
+# The turtle state that each of these shortcuts sets. They only change the state, and don't draw anything.
+_STATE_SHORTCUTS = {'pc': 'pencolor', 'fc': 'fillcolor', 'ps': 'pensize', 'bc': 'bgcolor', 'spd': 'speed',
+                    'pu': 'pen', 'pd': 'pen', 't': 'tracer'}
+
+# How many undo buffer entries back an `undo` can reach. This is the size of turtle.py's (and SimTurtle's) undo
+# buffer, so undoing further back than this doesn't undo anything.
+_MERGE_UNDO_WINDOW = 1000
+
+# How many entries each shortcut adds to the undo buffer, which is the same for turtle.py and SimTurtle. Comments
+# and blank shortcuts don't add any either. Other shortcuts add a number of entries that depends on the turtle (like
+# a cardinal direction, which only sets the heading if it's different, or pu, pd, pc, and fc, which don't add an
+# entry if they don't change anything) or that merge_shortcuts() doesn't know.
+_UNDO_ENTRIES = {'f': 1, 'b': 1, 'l': 1, 'r': 1, 'g': 1, 'x': 1, 'y': 1, 'sh': 1, 'cir': 1, 'ps': 1, 'spd': 1,
+                 'hide': 1, 'show': 1, 'bf': 1, 'dot': 1, 'st': 1, 'h': 2,
+                 'u': 0, 't': 0, 'sleep': 0, 'bc': 0, 'degrees': 0, 'radians': 0, '': 0}
+# The fewest entries that some of the other shortcuts add, so the undo window knows they're at least this many. A
+# stamp's entry doesn't count, since clearstamp() takes it out of the undo buffer:
+_MIN_UNDO_ENTRIES = dict(_UNDO_ENTRIES, tele=1, st=0, **{name: 1 for name in _OPPOSITE_MOVES})
+
+# The most instructions the undo window keeps, even if they add fewer undo entries than _MERGE_UNDO_WINDOW. Older
+# instructions are frozen when they leave the window, so an undo that reaches them still works.
+_MERGE_UNDO_WINDOW_LIMIT = 4 * _MERGE_UNDO_WINDOW
+
+
+class _ShortcutMerger:
+    '''Merges shortcut strings one at a time for merge_shortcuts() and for recordings that are merged while
+    they're recorded, so both give the same results. Each shortcut is parsed into a [name, args, text, frozen]
+    instruction and goes through the optimizer passes in order. Each pass only keeps the instructions at its end
+    that a later shortcut could still change, and hands the rest to the next pass. The merged shortcut strings
+    that can't change anymore are passed to the output function.'''
+
+    def __init__(self, output):
+        self._output = output
+
+        # Instructions that a later `undo` could still undo, which makes them frozen so they can't be changed:
+        self._undo_window = collections.deque()
+        self._window_entries = 0  # The fewest undo buffer entries that the instructions in _undo_window add.
+        # The (undo sum, instruction, known) of the unfrozen instructions in _undo_window that add undo entries. Known
+        # is False if the number of entries isn't known.
+        self._unfrozen = collections.deque()
+        self._undo_sum = 0  # Goes up by one for each undo and down by each other shortcut's number of undo entries.
+
+        # The state pass:
+        self._state_tail = []
+        self._known_values = {}  # Keys are _STATE_SHORTCUTS values, values are what the latest shortcut set them to.
+        self._unused_indexes = {}  # Keys are _STATE_SHORTCUTS values, values are the index of an unused change.
+
+        # The motion pass:
+        self._motion_tail = []
+        self._pen_up = self._filling = False  # If the pen state is unknown, it's treated as down.
+
+        # The update pass:
+        self._last_instruction = None
+
+    def append(self, shortcut):
+        '''Adds the next shortcut string.'''
+        instruction = _parse_merge_instruction(shortcut)
+
+        # Each `undo` undoes the last undo buffer entry, so the instruction that added it has to stay as it is. An
+        # undo right after another one undoes the entry before the one the first undo undid, and so on.
+        name = instruction[0]
+        if name == 'undo':
+            self._undo_sum += 1
+            while self._unfrozen and self._unfrozen[-1][0] < self._undo_sum:
+                undo_sum, undone, known = self._unfrozen.pop()
+                undone[3] = True
+                if not known:
+                    # It's unknown how far back the undos go from here, so nothing before this can change:
+                    while self._unfrozen:
+                        self._unfrozen.pop()[1][3] = True
         else:
-            assert False, 'Unknown shortcut: ' + str(sc)
+            entries = _UNDO_ENTRIES.get(name, 0 if name.startswith('#') else None)
+            if entries != 0:
+                # Instructions with an unknown number of entries count as one, and freeze everything when undone:
+                self._undo_sum -= 1 if entries is None else entries
+                self._unfrozen.append((self._undo_sum, instruction, entries is not None))
+        self._undo_window.append(instruction)
+        self._window_entries += _MIN_UNDO_ENTRIES.get(name, 0)
+
+        # An instruction can't be undone anymore once the instructions after it add a full undo buffer of entries:
+        while self._undo_window and (self._window_entries - _MIN_UNDO_ENTRIES.get(self._undo_window[0][0], 0) >= _MERGE_UNDO_WINDOW or
+                                     len(self._undo_window) > _MERGE_UNDO_WINDOW_LIMIT):
+            if self._window_entries - _MIN_UNDO_ENTRIES.get(self._undo_window[0][0], 0) < _MERGE_UNDO_WINDOW:
+                self._undo_window[0][3] = True  # A later undo might still reach it.
+            self._release_undo_window()
+
+    def finish(self):
+        '''Passes all of the remaining merged shortcuts to the output function.'''
+        while self._undo_window:
+            self._release_undo_window()
+        self._release_state_tail(len(self._state_tail))
+        self._release_motion_tail(len(self._motion_tail))
+        if self._last_instruction is not None:
+            self._output(_merge_instruction_str(self._last_instruction))
+            self._last_instruction = None
+
+    def pending(self):
+        '''Returns a list of the shortcut strings that haven't been passed to the output function yet, as they are
+        merged so far.'''
+        instructions = [] if self._last_instruction is None else [self._last_instruction]
+        instructions.extend(self._motion_tail)
+        instructions.extend(instruction for instruction in self._state_tail if instruction is not None)
+        instructions.extend(self._undo_window)
+        return [_merge_instruction_str(instruction) for instruction in instructions]
+
+    def _release_undo_window(self):
+        '''Passes the oldest instruction in the undo window to the state pass.'''
+        instruction = self._undo_window.popleft()
+        self._window_entries -= _MIN_UNDO_ENTRIES.get(instruction[0], 0)
+        if self._unfrozen and self._unfrozen[0][1] is instruction:
+            self._unfrozen.popleft()
+        self._state_pass(instruction)
+
+    def _state_pass(self, instruction):
+        '''The first optimizer pass: removes pen, color, size, speed, and tracer changes that set the same value the
+        turtle already has, or that are replaced by another change before anything is drawn.'''
+        name, args, text, frozen = instruction
+        state = _STATE_SHORTCUTS.get(name)
+        if state is not None and not frozen:
+            # Color names are case-insensitive, and pu and pd are different values of the pen state:
+            value = (name, args if args is not None else tuple(text.lower().split()[1:]))
+            if self._known_values.get(state) == value:
+                return  # The turtle already has this value.
+            if state in self._unused_indexes:
+                self._state_tail[self._unused_indexes[state]] = None  # Nothing used the earlier change before this one.
+            self._unused_indexes[state] = len(self._state_tail)
+            self._known_values[state] = value
+        elif name.startswith('#'):
+            pass  # Comments don't use or change anything.
+        elif _is_barrier(instruction):
+            self._known_values.clear()
+            self._unused_indexes.clear()
+        else:
+            self._unused_indexes.clear()  # Anything else could draw with the current state.
+        self._state_tail.append(instruction)
+
+        # Only the unused changes at the end, and the comments after them, can still be removed:
+        self._release_state_tail(min(self._unused_indexes.values(), default=len(self._state_tail)))
+
+    def _release_state_tail(self, count):
+        '''Passes the first count instructions of the state pass's tail to the motion pass.'''
+        if count == 0:
+            return
+        released = self._state_tail[:count]
+        del self._state_tail[:count]
+        self._unused_indexes = {state: index - count for state, index in self._unused_indexes.items()}
+        for instruction in released:
+            if instruction is not None:
+                self._motion_pass(instruction)
+
+    def _motion_pass(self, instruction):
+        '''The second optimizer pass: merges consecutive moves and turns, removes turns that a `sh`, `h`, or cardinal
+        direction replaces, and removes pen-up moves that a later absolute move makes pointless.'''
+        merged = self._motion_tail
+        name, args, text, frozen = instruction
+        can_cancel = self._pen_up and not self._filling  # Pen-up moves in a fill still add points to the fill's shape.
+        if not frozen and args is not None:
+            if name in _OPPOSITE_MOVES:
+                if name not in ('f', 'b'):
+                    _pop_while(merged, _HEADING_CHANGES)  # Cardinal directions set the heading themselves.
+                if _merge_move(merged, instruction, can_cancel):
+                    return
+            elif name in ('l', 'r'):
+                if _merge_turn(merged, instruction):
+                    return
+            elif name == 'sh':
+                _pop_while(merged, _HEADING_CHANGES)
+            elif name == 'h':
+                _pop_while(merged, _HEADING_CHANGES)
+                if can_cancel:
+                    _pop_while(merged, _HEADING_CHANGES + _POSITION_CHANGES + tuple(_OPPOSITE_MOVES))
+                if _last_mergeable(merged, ('h',)) is not None:
+                    return  # The turtle is already home.
+            elif name in ('g', 'tele'):
+                if can_cancel:
+                    _pop_while(merged, _POSITION_CHANGES)
+                elif name == 'tele' and not self._filling:
+                    _pop_while(merged, ('tele',))  # Teleporting never draws.
+            elif name in ('x', 'y') and can_cancel:
+                _pop_while(merged, (name,))
+            elif name == 'c' and _last_mergeable(merged, ('c',)) is not None:
+                return  # The screen was already cleared.
+            elif name == 'sleep' and _last_mergeable(merged, ('sleep',)) is not None:
+                merged[-1] = ['sleep', (merged[-1][1][0] + args[0],), None, False]
+                return
+
+        if name == 'pu':
+            self._pen_up = True
+        elif name == 'pd':
+            self._pen_up = False
+        elif name == 'bf':
+            self._filling = True
+        elif name == 'ef':
+            self._filling = False
+        elif _is_barrier(instruction):
+            self._pen_up = False
+        merged.append(instruction)
+
+        # Turns are always removable, and moves are only removable if they were made with the pen up (or are
+        # teleports). Nothing before an instruction that can't be removed can change anymore:
+        if frozen or args is None or name not in _REMOVABLE_MOVES or (name not in _HEADING_CHANGES and name != 'tele' and not can_cancel):
+            self._release_motion_tail(len(merged) - 1)
+
+    def _release_motion_tail(self, count):
+        '''Passes the first count instructions of the motion pass's tail to the update pass.'''
+        if count == 0:
+            return
+        released = self._motion_tail[:count]
+        del self._motion_tail[:count]
+        for instruction in released:
+            self._update_pass(instruction)
+
+    def _update_pass(self, instruction):
+        '''The third optimizer pass: removes `u` updates that come right after another update.'''
+        last = self._last_instruction
+        if instruction[0] == 'u' and not instruction[3] and last is not None and _last_mergeable([last], ('u',)) is not None:
+            return
+        if self._last_instruction is not None:
+            self._output(_merge_instruction_str(self._last_instruction))
+        self._last_instruction = instruction
+
+
+def _parse_merge_instruction(shortcut):
+    '''Parses a shortcut string into a [name, args, text, frozen] instruction for _ShortcutMerger. The name is the
+    short name in lowercase, the args are a tuple of floats (or None if they aren't all numbers), and text is the
+    original shortcut string, which is set to None when an optimizer pass changes the instruction. Frozen
+    instructions are ones that an `undo` undoes, so they can't be changed or merged.'''
+    parts = shortcut.split()
+    name = parts[0].lower() if parts else ''
+    name = _MAP_FULL_TO_SHORT_NAMES.get(name, name)
+    try:
+        args = tuple(float(arg_str) for arg_str in parts[1:])
+    except ValueError:
+        args = None
+    if name not in _BUILT_IN_SHORTCUTS or name.startswith('#'):
+        args = None  # Registered shortcuts, comments, and other strings are never changed.
+    return [name, args, shortcut, False]
+
+
+def _merge_instruction_str(instruction):
+    '''Returns the shortcut string for a _ShortcutMerger instruction.'''
+    name, args, text, frozen = instruction
+    if text is not None:
+        return text
+    return ' '.join([name] + [_number_str(arg) for arg in args])
+
+
+def _is_barrier(instruction):
+    '''Returns True if nothing is known about the turtle after the instruction, such as a registered shortcut or
+    an `undo`, so the optimizer passes can't merge anything across it.'''
+    name, args, text, frozen = instruction
+    return frozen or name in ('undo', 'reset') or (args is None and not name.startswith('#') and name not in _STATE_SHORTCUTS)
+
+
+def _last_mergeable(merged, names):
+    '''Returns the last instruction in merged if it has one of the names and can be changed, otherwise None.'''
+    if merged and merged[-1][0] in names and not merged[-1][3] and merged[-1][1] is not None:
+        return merged[-1]
+    return None
+
+
+def _pop_while(merged, names):
+    '''Removes instructions from the end of merged while they have one of the names and can be changed.'''
+    while _last_mergeable(merged, names) is not None:
+        merged.pop()
+
+
+def _merge_move(merged, instruction, can_cancel):
+    '''Merges a move like `f 10` or `n 10` into the last instruction in merged if it's the same or opposite move.
+    Returns True if it was merged.'''
+    name, distance = instruction[0], instruction[1][0]
+    last = _last_mergeable(merged, (name, _OPPOSITE_MOVES[name]))
+    if last is None:
+        return False
+    if last[0] == name and (can_cancel or (last[1][0] >= 0) == (distance >= 0)):
+        total = last[1][0] + distance  # With the pen down, `f 5, f -5` draws a line, so it can't become `f 0`.
+    elif last[0] != name and can_cancel:
+        total = last[1][0] - distance
+    else:
+        return False
 
-        merged_shortcuts.append(' '.join(sc_parts))
+    if name not in ('f', 'b'):
+        # Cardinal directions also set the heading, so the last one's direction is kept, even for a move of 0:
+        merged[-1] = [name, (total if last[0] == name else -total,), None, False]
+    elif total == 0 and can_cancel:
+        merged.pop()  # The moves returned to the same point with the pen up.
+    else:
+        merged[-1] = [last[0], (total,), None, False]
+    return True
 
-    return merged_shortcuts
 
+def _merge_turn(merged, instruction):
+    '''Merges an `l` or `r` turn into the last instruction in merged if it's also a turn. Returns True if it was merged.'''
+    last = _last_mergeable(merged, ('l', 'r'))
+    if last is None:
+        return False
+    angle = instruction[1][0] if last[0] == instruction[0] else -instruction[1][0]
+    total = last[1][0] + angle
+    if total == 0:
+        merged.pop()  # The turns cancel out.
+    else:
+        merged[-1] = [last[0], (total,), None, False]
+    return True
+
+
+def compress_shortcuts(shortcuts):
+    """Return the shortcuts with repeated runs turned into `rep` loops, i.e. ['f 100', 'r 90'] repeated four times
+    returns ['rep 4 [f 100, r 90]']. Runs where the numbers change by the same amount each time, like the lengths
+    in a spiral, also become loops that use `set` and `inc` variables:
+
+    >>> compress_shortcuts(['f 10', 'r 90', 'f 20', 'r 90', 'f 30', 'r 90'])
+    ['set loop1_0 10', 'rep 3 [f $loop1_0, r 90, inc loop1_0 10]']
+
+    Loops can be nested inside other loops. Running the compressed shortcuts with sc() draws the same thing as the
+    original shortcuts, and scs() turns them into Python `for` loops. The loop variables (named like `loop1_0`)
+    are left in SC_VARIABLES afterwards. Repeats are found with rolling hashes, so this stays fast for recordings
+    with millions of shortcuts. Comments and other strings with commas, brackets, or newlines are never put in a loop."""
+    entries = []
+    parsed_entries = {}  # Recordings repeat the same strings a lot, so each different one is only parsed once.
+    for i, shortcut in enumerate(shortcuts):
+        entry = parsed_entries.get(shortcut)
+        if entry is None:
+            entry = parsed_entries[shortcut] = _loop_entry(shortcut)
+        if entry[0] is None:
+            entry = (('unloopable', i), None, shortcut, 0)  # A template that no other entry has.
+        entries.append(entry)
+    return [entry[2] for entry in _compress_loop_entries(entries)]
+
+
+_LOOP_MAX_PERIOD = 256  # The most shortcuts that compress_shortcuts() puts in one loop's body.
+_LOOP_CANDIDATES = 8  # How many of the next places with the same shortcut compress_shortcuts() tries as a loop's period.
+_LOOP_MAX_REPEATS = 10000  # The most repeats compress_shortcuts() checks for one loop. Longer runs become several loops.
+_LOOP_HASH_MODULUS = (1 << 61) - 1
+_LOOP_HASH_BASE = 1000003
+_LOOP_PLACEHOLDER = '\x01'  # Marks where the loop's height goes in its variable names until the height is known.
+
+
+def _loop_entry(shortcut):
+    '''Returns a (template, args, text, height) entry for compress_shortcuts(). Shortcuts with numeric arguments
+    have a (name, number of args) template and a tuple of the arguments, so loops can change the numbers. Other
+    shortcuts have their text as the template and None for args, so they only match exactly the same text. The
+    height is how deeply nested the loops in the entry are, which is 0 for a shortcut. Shortcuts that can't be put
+    in a loop have None for the template.'''
+    parts = shortcut.split(' ')
+    name = parts[0].lower()
+    if name.startswith('#') or any(c in shortcut for c in ',[]\n'):
+        return (None, None, shortcut, 0)  # These can't be put inside a [ ] block.
+    if name in _BUILT_IN_SHORTCUTS and name not in ('set', 'inc', 'rep', 'def') and len(parts) > 1:
+        try:
+            args = tuple(float(arg_str) for arg_str in parts[1:])
+        except ValueError:
+            args = None
+        # The loop writes the numbers with _number_str(), so they have to already be written that way:
+        if args is not None and all(math.isfinite(arg) for arg in args) and ' '.join([parts[0]] + [_number_str(arg) for arg in args]) == shortcut:
+            return ((parts[0], len(args)), tuple(_loop_value(arg) for arg in args), shortcut, 0)
+    return (shortcut, None, shortcut, 0)
+
+
+def _loop_value(number):
+    '''Returns the number the way `set` and `inc` convert it: whole numbers are ints, and the rest are floats.'''
+    return int(number) if number == int(number) else number
+
+
+def _compress_loop_entries(entries, depth=0):
+    '''Compresses the entries with _compress_loops() until it can't make them any shorter. The depth is how many
+    loop bodies the entries are inside of.'''
+    while True:
+        compressed = _compress_loops(entries, depth)
+        if len(compressed) == len(entries):
+            return entries
+        # Each pass finds every loop that doesn't have a loop in its body, so another pass can only find a loop
+        # around loops, which has to have the same loop in it at least twice:
+        loop_templates = [entry[0] for entry in compressed if entry[3] > 0]
+        if len(set(loop_templates)) == len(loop_templates):
+            return compressed
+        entries = compressed
+
+
+def _compress_loops(entries, depth):
+    '''One pass of compress_shortcuts(): replaces repeated runs of entries with loops, working from the start. At
+    each entry, the periods it tries are the distances to the next few entries with the same template, and it keeps
+    the loop that saves the most entries. Runs are compared with rolling hashes of the templates.'''
+    count = len(entries)
+    template_ids = {}
+    ids = [template_ids.setdefault(entry[0], len(template_ids)) for entry in entries]
+
+    # prefix_hashes[i] is the hash of ids[:i], so the hash of any run of ids takes constant time to get:
+    prefix_hashes = [0] * (count + 1)
+    for i, template_id in enumerate(ids):
+        prefix_hashes[i + 1] = (prefix_hashes[i] * _LOOP_HASH_BASE + template_id + 1) % _LOOP_HASH_MODULUS
+    powers = [1] * (_LOOP_MAX_PERIOD + 1)
+    for i in range(1, _LOOP_MAX_PERIOD + 1):
+        powers[i] = powers[i - 1] * _LOOP_HASH_BASE % _LOOP_HASH_MODULUS
+
+    def run_hash(start, length):
+        return (prefix_hashes[start + length] - prefix_hashes[start] * powers[length]) % _LOOP_HASH_MODULUS
+
+    # next_indexes[i] is the index of the next entry with the same template as entry i, or None:
+    next_indexes = [None] * count
+    last_indexes = {}
+    for i in range(count - 1, -1, -1):
+        next_indexes[i] = last_indexes.get(ids[i])
+        last_indexes[ids[i]] = i
+
+    def pair_changes(index, period):
+        # How many numbers are different in entry index and the entry period entries after it.
+        args, other_args = entries[index][1], entries[index + period][1]
+        if args is None or other_args is None or args == other_args:
+            return 0
+        return sum(map(operator.ne, args, other_args))
+
+    # number_counts[i] is how many numbers the entries before entry i have:
+    number_counts = [0] * (count + 1)
+    for i, entry in enumerate(entries):
+        number_counts[i + 1] = number_counts[i] + (0 if entry[1] is None else len(entry[1]))
+
+    # windows[period] is (start, changes): how many numbers change between the run of period entries at start and
+    # the run after it. Moving start up by one only changes two pairs of entries, so the window is slid up from where
+    # it was last used when that's less work than comparing the whole run again:
+    windows = {}
+
+    compressed = []
+    i = 0
+    while i < count:
+        best = None  # The (entries saved, period, repeats, steps) of the best loop found.
+        candidate = next_indexes[i]
+        for attempt in range(_LOOP_CANDIDATES):
+            if candidate is None or candidate - i > _LOOP_MAX_PERIOD or i + 2 * (candidate - i) > count:
+                break
+            period = candidate - i
+            # Two repeats with 2 * period - 1 or more `set`s wouldn't save any entries, so those runs are only tried
+            # if there's a third repeat. Runs with fewer numbers than that can skip counting the changes:
+            if number_counts[i + period] - number_counts[i] >= 2 * period - 1:
+                window = windows.get(period)
+                if window is not None and 2 * (i - window[0]) < period:
+                    changes = window[1]
+                    for start in range(window[0], i):
+                        changes += pair_changes(start + period, period) - pair_changes(start, period)
+                else:
+                    changes = sum(pair_changes(index, period) for index in range(i, i + period))
+                windows[period] = (i, changes)
+
+                if changes >= 2 * period - 1 and not _loop_continues(entries, ids, i, period, run_hash):
+                    candidate = next_indexes[candidate]
+                    continue
+            repeats, steps = _loop_repeats(entries, ids, i, period, run_hash)
+            if repeats > 1:
+                saved = period * repeats - 1 - len(steps)  # The loop is one `rep` and one `set` per variable.
+                if saved > 0 and (best is None or saved > best[0]):
+                    best = (saved, period, repeats, steps)
+            candidate = next_indexes[candidate]
+
+        if best is None:
+            compressed.append(entries[i])
+            i += 1
+        else:
+            saved, period, repeats, steps = best
+            steps = {key: _loop_value(step) for key, step in steps.items()}
+            compressed.extend(_loop_entries(entries[i:i + period], repeats, steps, depth))
+            i += period * repeats
+    return compressed
+
+
+def _loop_repeats(entries, ids, start, period, run_hash):
+    '''Returns how many times the run of period entries at start repeats with numbers that change by the same amount
+    each time, and a dict of the changes. The dict's keys are (index in the run, index of the argument) tuples and
+    its values are how much that argument changes, for the ones that change. Each repeat is checked as the run is
+    extended, so this stops at the first repeat that doesn't fit instead of scanning the rest of the run, and it
+    checks at most _LOOP_MAX_REPEATS repeats. The numbers are added up the same way `inc` adds them, so the loop
+    makes exactly the same numbers.'''
+    count = len(entries)
+    block_hash = run_hash(start, period)
+    second = start + period
+    if second + period > count or run_hash(second, period) != block_hash or ids[start:second] != ids[second:second + period]:
+        return 1, {}  # The hashes didn't match, or they matched but the templates don't.
+
+    steps = {}
+    for offset in range(period):
+        first_args, second_args = entries[start + offset][1], entries[second + offset][1]
+        if first_args is None or first_args == second_args:
+            continue
+        for arg_index, (first, arg) in enumerate(zip(first_args, second_args)):
+            if first != arg:
+                steps[(offset, arg_index)] = arg - first
+
+    # Each repeat's numbers must be the last repeat's numbers plus the changes. The second repeat is checked too,
+    # since adding the change to the first number might not make the second one:
+    repeats = 1
+    block = second
+    while (repeats < _LOOP_MAX_REPEATS and block + period <= count and run_hash(block, period) == block_hash
+            and ids[start:second] == ids[block:block + period]):
+        for offset in range(period):
+            first_args, last_args, args = entries[start + offset][1], entries[block - period + offset][1], entries[block + offset][1]
+            if first_args is None:
+                continue  # The templates match, so the text does too.
+            for arg_index, arg in enumerate(args):
+                step = steps.get((offset, arg_index))
+                if (arg != first_args[arg_index]) if step is None else (last_args[arg_index] + step != arg):
+                    return repeats, steps
+        repeats += 1
+        block += period
+    return repeats, steps
+
+
+def _loop_continues(entries, ids, start, period, run_hash):
+    '''Returns True if the run of period entries at start repeats at least three times, going by the change in each
+    number between the first two repeats. This is a quick check that stops at the first number that doesn't fit, and
+    _loop_repeats() does the full check.'''
+    second, third = start + period, start + 2 * period
+    if third + period > len(entries) or ids[third] != ids[start]:
+        return False
+    first_args = entries[start][1]
+    if first_args is not None:
+        # Most runs don't repeat, and that usually shows in the first entry's numbers, so check them before hashing:
+        for first, second_arg, arg in zip(first_args, entries[second][1], entries[third][1]):
+            if second_arg + (second_arg - first) != arg:
+                return False
+    if (run_hash(start, period) != run_hash(second, period)
+            or run_hash(start, period) != run_hash(third, period) or ids[start:second] != ids[third:third + period]):
+        return False
+    for offset in range(period):
+        first_args, second_args, args = entries[start + offset][1], entries[second + offset][1], entries[third + offset][1]
+        if first_args is None:
+            continue
+        for first, second_arg, arg in zip(first_args, second_args, args):
+            if second_arg + (second_arg - first) != arg:
+                return False
+    return True
+
+
+def _loop_entries(body, repeats, steps, depth):
+    '''Returns the entries for a loop of the body entries: a `set` entry for each variable and then the `rep`
+    entry. The body is compressed as well, so loops can be nested.'''
+    placeholder = _LOOP_PLACEHOLDER + str(depth) + _LOOP_PLACEHOLDER  # Loops inside this one use other placeholders.
+    # Arguments that start at the same number and change by the same amount share a variable. The variables get
+    # their real names once the height of the loop is known:
+    variables = {}  # Keys are (start, step) tuples, values are the variable names.
+    names = {key: variables.setdefault((body[key[0]][1][key[1]], step), 'loop' + placeholder + str(len(variables)))
+             for key, step in sorted(steps.items())}
+    loop_body = []
+    for offset, entry in enumerate(body):
+        if entry[1] is not None and any((offset, arg_index) in names for arg_index in range(len(entry[1]))):
+            text = ' '.join([entry[0][0]] + [('$' + names[(offset, arg_index)]) if (offset, arg_index) in names else _number_str(arg)
+                                             for arg_index, arg in enumerate(entry[1])])
+            entry = (text, None, text, 0)
+        loop_body.append(entry)
+    loop_body = _compress_loop_entries(loop_body, depth + 1)
+
+    # Loops at different heights never share variable names, so a loop never changes the variables of the loops
+    # it's inside of. Loops at the same height can share them, since each loop sets its variables first:
+    height = 1 + max(entry[3] for entry in loop_body)
+    texts = [entry[2] for entry in loop_body] + ['inc ' + name + ' ' + _number_str(step) for (start, step), name in variables.items()]
+    texts = ['set ' + name + ' ' + _number_str(start) for (start, step), name in variables.items()] + \
+            ['rep ' + str(repeats) + ' [' + ', '.join(texts) + ']']
+    texts = [text.replace(placeholder, str(height) + '_') for text in texts]
+    return [(text, None, text, height) for text in texts]
+
+
+def simplify_shortcuts(shortcuts, tolerance=1.0, start=(0, 0, 0)):
+    """Return the shortcuts with each run of moves and turns (such as `f`, `l`, `r`, `g`, and `n`) replaced by
+    `g X Y` moves to fewer points, so that no point of the original path is more than tolerance pixels away from
+    the new path. This makes freehand drawings much shorter, since they have lots of points in nearly straight
+    lines. If a run turns the turtle, it ends with a `sh` shortcut so the turtle has the same heading afterwards.
+
+    Runs end at any other shortcut, such as `pu`, `pc`, or `st`, so those still happen at the same places. The
+    start is the turtle's (x, y, heading) when the shortcuts begin, which is a new turtle's home by default. If it's
+    None, moves aren't simplified until the position and heading are known, such as after an `h` shortcut. The
+    turtle is assumed to be in the standard mode, with degrees unless there's a `radians` shortcut. The points are
+    simplified with the Ramer-Douglas-Peucker algorithm, using NumPy if it's installed.
+
+    The moves and turns that an `undo` shortcut can reach aren't simplified, so the `undo` undoes the same thing."""
+    # Going backwards, find the shortcuts that the `undo` shortcuts after them can undo. The fewest undo buffer
+    # entries each shortcut could add are used, so this finds every shortcut an undo might reach:
+    undoable = set()
+    undos = 0  # How many undos are still reaching back.
+    for index in range(len(shortcuts) - 1, -1, -1):
+        parts = shortcuts[index].split()
+        name = parts[0].lower() if parts else ''
+        name = _MAP_FULL_TO_SHORT_NAMES.get(name, name)
+        if name == 'undo':
+            undos += 1
+        elif name in ('c', 'reset'):
+            undos = 0  # These clear the undo buffer, so undos can't reach anything before them.
+        elif undos:
+            undoable.add(index)
+            undos = max(undos - _MIN_UNDO_ENTRIES.get(name, 0), 0)
+
+    simplified = []
+    x = y = heading = None  # The turtle's position and heading in degrees, or None if they're unknown.
+    if start is not None:
+        x, y, heading = (float(n) for n in start)
+    degrees_per_unit = 1.0
+    run = []  # The shortcut strings in the current run of moves and turns.
+    run_xs, run_ys = [], []  # The points of the current run's path.
+    run_heading = None  # The heading when the current run started.
+
+    def end_run():
+        if len(run) > 1:
+            kept = _simplify_path_indexes(run_xs, run_ys, tolerance)
+            # The points are rounded so that tiny floating point errors like 6.1e-16 don't make long shortcuts:
+            replacement = ['g ' + _number_str(round(run_xs[i], 9)) + ' ' + _number_str(round(run_ys[i], 9)) for i in kept[1:]]
+            if heading % 360 != run_heading % 360:
+                replacement.append('sh ' + _number_str((heading % 360) / degrees_per_unit))
+            if len(replacement) < len(run):
+                simplified.extend(replacement)
+                return
+        simplified.extend(run)
+
+    for index, shortcut in enumerate(shortcuts):
+        parts = shortcut.split()
+        name = parts[0].lower() if parts else ''
+        name = _MAP_FULL_TO_SHORT_NAMES.get(name, name)
+        try:
+            args = [float(arg_str) for arg_str in parts[1:]]
+        except ValueError:
+            args = None
+
+        if args is None or len(args) != _PATH_MOVES.get(name) or not all(math.isfinite(arg) for arg in args):
+            # Anything that isn't a move or turn ends the run:
+            end_run()
+            run, run_xs, run_ys = [], [], []
+            simplified.append(shortcut)
+            if name == 'reset':
+                x, y, heading = 0.0, 0.0, 0.0
+            elif name in ('degrees', 'radians') and args == []:
+                degrees_per_unit = 1.0 if name == 'degrees' else 180 / math.pi
+            elif name not in _PATH_NEUTRAL_SHORTCUTS:
+                x = y = heading = None  # Registered shortcuts, `cir`, `undo`, and so on could go anywhere.
+            continue
+
+        if name == 'tele':
+            # Teleporting doesn't draw, so it can't be part of a path:
+            end_run()
+            run, run_xs, run_ys = [], [], []
+            simplified.append(shortcut)
+            x, y = args
+            continue
+
+        if index in undoable:
+            # An undo can reach this, so the run ends before it, and it stays as it is:
+            end_run()
+            run, run_xs, run_ys = [], [], []
+        elif not run and x is not None and heading is not None:
+            run_xs, run_ys, run_heading = [x], [y], heading  # Start a new run here.
+
+        # Work out where the shortcut moves the turtle:
+        if name in ('l', 'r'):
+            if heading is not None:
+                heading += args[0] * degrees_per_unit * (1 if name == 'l' else -1)
+        elif name == 'sh':
+            heading = args[0] * degrees_per_unit
+        elif name == 'h':
+            x, y, heading = 0.0, 0.0, 0.0
+        elif name == 'g':
+            x, y = args
+        elif name == 'x':
+            x = args[0] if y is not None else None
+        elif name == 'y':
+            y = args[0] if x is not None else None
+        else:
+            if name in CARDINAL_TO_DEGREES:
+                heading = float(CARDINAL_TO_DEGREES[name])
+            if x is not None and heading is not None:
+                distance = args[0] if name != 'b' else -args[0]
+                x += distance * math.cos(math.radians(heading))
+                y += distance * math.sin(math.radians(heading))
+            else:
+                x = y = None
 
+        if run_xs:
+            run.append(shortcut)
+            if name not in ('l', 'r', 'sh'):
+                run_xs.append(x)
+                run_ys.append(y)
+        else:
+            simplified.append(shortcut)  # The position isn't known yet, so this can't be simplified.
+    end_run()
+    return simplified
+
+
+# The moves and turns that simplify_shortcuts() simplifies, and their number of arguments:
+_PATH_MOVES = {'f': 1, 'b': 1, 'l': 1, 'r': 1, 'sh': 1, 'g': 2, 'tele': 2, 'x': 1, 'y': 1, 'h': 0,
+               'n': 1, 's': 1, 'e': 1, 'w': 1, 'ne': 1, 'nw': 1, 'se': 1, 'sw': 1}
+# The shortcuts that don't move or turn the turtle:
+_PATH_NEUTRAL_SHORTCUTS = frozenset(('#', 'pu', 'pd', 'pc', 'fc', 'bc', 'ps', 'spd', 'st', 'dot', 'bf', 'ef', 'c', 'cs',
+                                     'css', 'hide', 'show', 'u', 't', 'sleep', 'set', 'inc', 'def', 'bye', 'done', 'eoc'))
+
+
+def _simplify_path_indexes(xs, ys, tolerance):
+    '''Returns a list of the indexes of the points to keep in the path, using the Ramer-Douglas-Peucker algorithm.
+    The first and last points are always kept, and every other point is within tolerance of the kept path. The
+    distances are to the line segments, not the infinite lines, so paths that double back on themselves are kept.
+
+    Ramer-Douglas-Peucker splits each part of the path at its farthest point, which can be next to the end on paths
+    like spirals. Splitting off one point at a time takes time proportional to the square of the number of points,
+    so if the farthest point is in the first or last eighth, the part is split at the farthest point in the middle
+    instead. Then each split at least takes an eighth off the part, which keeps the time to about n log n.'''
+    count = len(xs)
+    if count < 3:
+        return list(range(count))
+
+    if _numpy is not None:
+        xs, ys = _numpy.asarray(xs, dtype=float), _numpy.asarray(ys, dtype=float)
+        keep = _numpy.zeros(count, dtype=bool)
+    else:
+        keep = [False] * count
+    keep[0] = keep[count - 1] = True
+
+    ranges = [(0, count - 1)]
+    while ranges:
+        first, last = ranges.pop()
+        if last - first < 2:
+            continue
+        dx, dy = xs[last] - xs[first], ys[last] - ys[first]
+        length_squared = dx * dx + dy * dy
+        if _numpy is not None:
+            # Find the distance from each point in between to the segment from the first to the last point:
+            px, py = xs[first + 1:last] - xs[first], ys[first + 1:last] - ys[first]
+            if length_squared:
+                t = _numpy.clip((px * dx + py * dy) / length_squared, 0.0, 1.0)
+                px, py = px - t * dx, py - t * dy
+            distances = _numpy.hypot(px, py)
+            farthest = int(distances.argmax())
+        else:
+            distances = []
+            for i in range(first + 1, last):
+                px, py = xs[i] - xs[first], ys[i] - ys[first]
+                if length_squared:
+                    t = min(max((px * dx + py * dy) / length_squared, 0.0), 1.0)
+                    px, py = px - t * dx, py - t * dy
+                distances.append(math.hypot(px, py))
+            farthest = max(range(len(distances)), key=distances.__getitem__)
+
+        if distances[farthest] > tolerance:
+            # distances[i] is for the point at first + 1 + i, so the middle of the part is from low to high:
+            low, high = (last - first) // 8, len(distances) - (last - first) // 8
+            if not low <= farthest < high:
+                if _numpy is not None:
+                    farthest = low + int(distances[low:high].argmax())
+                else:
+                    farthest = max(range(low, high), key=distances.__getitem__)
+            index = first + 1 + farthest
+            keep[index] = True
+            ranges.append((first, index))
+            ranges.append((index, last))
+
+    if _numpy is not None:
+        return _numpy.flatnonzero(keep).tolist()
+    return [i for i in range(count) if keep[i]]
+
+
+class Replay:
+    """Plays a recording back on a turtle, such as the list that end_recording() returns or a ShortcutRecording
+    from load_recording(). replay() makes one of these and starts playing it. The shortcuts are run with the
+    screen's ontimer() at speed shortcuts per second, updating the screen once per frame:
+
+    >>> playback = replay(load_recording('session.tsc'), speed=500)
+    >>> playback.pause()
+    >>> playback.seek(100000)  # Jump to just after the 100,000th shortcut.
+    >>> playback.play()
+
+    Seeking doesn't run every shortcut from the start again. The shortcuts are run on a SimTurtle (which is fast,
+    since it doesn't draw anything) that saves a keyframe of its state every keyframe_interval shortcuts, along
+    with how many drawing operations it had made. A seek resets the turtle, draws the nearest keyframe's drawing
+    operations with the turtle's own goto(), dot(), stamp(), and fill methods with the tracer off, gives the turtle
+    the keyframe's position, heading, pen, and colors, and then runs the shortcuts from the keyframe to the step.
+    The SimTurtle starts with the turtle's state when the Replay is made. A turtle drawn from a keyframe only has
+    the undo entries from after it, so an `undo` that reaches back before a keyframe makes the seek use an earlier
+    one. Shortcuts that SimTurtle doesn't have, such as `write` in a registered shortcut, can't be seeked past.
+    While a recording is replayed, its shortcuts aren't recorded again by begin_recording().
+
+    Stamps that a seek draws again get new ids, so the Replay changes the ids in the recording's `cs` shortcuts to
+    the ids of the same stamps now. The ids in the recording are the ones the stamps got the first time the Replay
+    made them, which are the same as when the recording was made if it's played from the start of a new program."""
+
+    def __init__(self, recording, speed=60, turtle_obj=None, keyframe_interval=1000):
+        if speed <= 0:
+            raise TurtleShortcutException('The replay speed must be more than 0, not ' + str(speed) + '.')
+        if keyframe_interval < 1:
+            raise TurtleShortcutException('The keyframe interval must be at least 1, not ' + str(keyframe_interval) + '.')
+        self.recording = recording
+        self.speed = speed
+        self.step = 0  # The index of the next shortcut to run.
+        self.playing = False
+        self._turtle = _get_turtle(turtle_obj)
+        self._keyframe_interval = keyframe_interval
+        self._tracer = None  # The screen's tracer setting from before play() turned it off.
+        self._play_step = self._play_time = 0  # The step and time.perf_counter() time when play() was called.
+        self._bgcolor = self._turtle.getscreen().bgcolor()  # For seeking back to before a `bc` shortcut.
+
+        # Stamps are numbered in the order the recording makes them, starting at 0. The SimTurtle's id for each
+        # stamp is its number plus 1:
+        self._stamp_count = 0  # How many stamps the turtle has made, so this is the number of the next one.
+        self._stamp_ids = {}  # The turtle's id for each stamp now, by the stamp's number.
+        self._stamp_numbers = {}  # The stamp numbers, by the id that the stamp got the first time it was made.
+
+        # The SimTurtle that makes the keyframes. It only ever runs forward. Each keyframe is a (step, snapshot)
+        # tuple, and the snapshot has the length of the SimTurtle's operations list at that step:
+        self._sim = SimTurtle()
+        self._sim._colormode = self._turtle.getscreen().colormode()
+        _copy_turtle_state(self._turtle, self._sim)
+        self._sim._undo_buffer.clear()  # Copying the state added undo entries that the turtle doesn't have.
+        self._sim._undo_height = 0
+        self._sim_step = 0
+        self._keyframes = [(0, self._sim._snapshot())]
+        self._keyframe_steps = [0]  # The steps of the keyframes, for bisect.
+        # The keyframe that the turtle was last drawn from. The turtle's undo buffer only has the entries added
+        # since then, so it's drawn from an earlier keyframe if an undo reaches back before this one:
+        self._drawn_keyframe = self._keyframes[0]
+
+    def __len__(self):
+        return len(self.recording)
+
+    def __repr__(self):
+        return '<Replay at step ' + str(self.step) + ' of ' + str(len(self)) + (' playing>' if self.playing else ' paused>')
+
+    @property
+    def finished(self):
+        """True if every shortcut in the recording has been run."""
+        return self.step >= len(self)
+
+    def play(self):
+        """Start or continue playing the recording from the current step. Returns the Replay."""
+        if not self.playing and not self.finished:
+            self.playing = True
+            screen = self._turtle.getscreen()
+            self._tracer = screen.tracer()
+            screen.tracer(0)  # The screen is updated once per frame instead of after each shortcut.
+            self._play_step, self._play_time = self.step, time.perf_counter()
+            self._tick()
+        return self
+
+    def pause(self):
+        """Stop playing the recording. play() continues from the same step."""
+        if self.playing:
+            self.playing = False
+            self._turtle.getscreen().tracer(self._tracer)
+
+    def seek(self, step):
+        """Make the turtle's drawing and state the same as after the first step shortcuts of the recording were
+        run, so that playing continues from there. Seeking forward by less than the keyframe interval just runs
+        the shortcuts in between."""
+        step = min(max(int(step), 0), len(self))
+        screen = self._turtle.getscreen()
+        tracer = screen.tracer()
+        screen.tracer(0)
+        try:
+            if self.step <= step <= self.step + self._keyframe_interval:
+                self._run_forward(step)
+            else:
+                keyframe_step, sim = self._keyframe_before(step)
+                self._draw_keyframe(keyframe_step, sim)
+                self._run_shortcuts(self._turtle, keyframe_step, step)
+            self.step = step
+        finally:
+            screen.tracer(tracer)
+        # If it's playing, keep the same speed from the new step:
+        self._play_step, self._play_time = self.step, time.perf_counter()
+
+    def _tick(self):
+        '''Runs the shortcuts that are due by now at the replay's speed, and schedules the next frame.'''
+        if not self.playing:
+            return
+        due = self._play_step + int((time.perf_counter() - self._play_time) * self.speed)
+        end = min(max(due, self.step + 1), len(self))
+        self._run_forward(end)
+        self.step = end
+        screen = self._turtle.getscreen()
+        screen.update()
+        if self.finished:
+            self.pause()
+        else:
+            screen.ontimer(self._tick, max(_REPLAY_FRAME_MS, int(1000 / self.speed)))
+
+    def _run_shortcuts(self, turtle_obj, start, end):
+        '''Runs the recording's shortcuts from index start up to end on the turtle or a SimTurtle, without
+        recording them. The ids in `cs` shortcuts are changed to that turtle's ids for the same stamps.'''
+        global _NOW_RECORDING
+        now_recording, _NOW_RECORDING = _NOW_RECORDING, False
+        try:
+            for i in range(start, end):
+                shortcut = self.recording[i]
+                parts = shortcut.split()
+                name = parts[0].lower() if parts else ''
+                name = _MAP_FULL_TO_SHORT_NAMES.get(name, name)
+                if name == 'st' and len(parts) == 1 and turtle_obj is self._turtle:
+                    # The turtle's stamp() is called here to get the new stamp's id:
+                    self._made_stamp(self._stamp_count, turtle_obj.stamp())
+                    self._stamp_count += 1
+                    if _FRAME_CAPTURE is not None:
+                        _FRAME_CAPTURE._shortcuts_run(turtle_obj, 1)
+                    continue
+                if name == 'cs' and len(parts) == 2 and parts[1].isdigit():
+                    number = self._stamp_numbers.get(int(parts[1]))
+                    if number is not None:
+                        stamp_id = self._stamp_ids[number] if turtle_obj is self._turtle else number + 1
+                        shortcut = parts[0] + ' ' + str(stamp_id)
+                sc(shortcut, turtle_obj=turtle_obj)
+        finally:
+            _NOW_RECORDING = now_recording
+
+    def _run_forward(self, end):
+        '''Runs the shortcuts from the current step up to end on the turtle. If an undo in them reaches back before
+        the keyframe that the turtle was drawn from, the turtle is drawn from an earlier keyframe first, since its
+        undo buffer doesn't have the entry that the undo would undo.'''
+        self._run_sim(end)
+        drawn_step = self._drawn_keyframe[0]
+        if self._keyframes[bisect.bisect_right(self._keyframe_steps, drawn_step) - 1] is not self._drawn_keyframe:
+            keyframe_step, sim = self._keyframe_before(self.step)
+            self._draw_keyframe(keyframe_step, sim)
+            self._run_shortcuts(self._turtle, keyframe_step, self.step)
+        self._run_shortcuts(self._turtle, self.step, end)
+
+    def _made_stamp(self, number, stamp_id):
+        '''Records that the turtle made stamp number number with the id stamp_id. The first id a stamp gets is
+        the id that the recording's `cs` shortcuts use for it.'''
+        if number not in self._stamp_ids:
+            self._stamp_numbers[stamp_id] = number
+        self._stamp_ids[number] = stamp_id
+
+    def _run_sim(self, step):
+        '''Runs the keyframe SimTurtle forward to step, saving keyframes on the way.'''
+        sim = self._sim
+        for i in range(self._sim_step, step):
+            self._run_shortcuts(sim, i, i + 1)
+            # A turtle drawn from a keyframe doesn't have the undo entries from before the keyframe, so an undo that
+            # reaches back before a keyframe makes it wrong. It also changes the drawing operations that the keyframe
+            # has. The keyframes after it are wrong too, since their undo heights are at least as high:
+            while self._keyframes[-1][1][-1] > sim._undo_height:
+                self._keyframes.pop()
+                self._keyframe_steps.pop()
+            if (i + 1) % self._keyframe_interval == 0:
+                self._keyframes.append((i + 1, sim._snapshot()))
+                self._keyframe_steps.append(i + 1)
+        self._sim_step = max(self._sim_step, step)
+
+    def _keyframe_before(self, step):
+        '''Returns the step of the last keyframe at or before step, and a new SimTurtle with that keyframe's state
+        and drawing operations. The keyframe is right for every step up to the keyframe SimTurtle's step.'''
+        self._run_sim(step)
+        keyframe_step, snapshot = self._keyframes[bisect.bisect_right(self._keyframe_steps, step) - 1]
+        sim = SimTurtle()
+        sim._restore(snapshot, self._sim.operations)
+        return keyframe_step, sim
+
+    def _draw_keyframe(self, keyframe_step, sim):
+        '''Resets the turtle and makes its drawing and state the same as the keyframe SimTurtle's, using turtle.py's
+        public methods. The tracer should be off.'''
+        self._drawn_keyframe = self._keyframes[bisect.bisect_right(self._keyframe_steps, keyframe_step) - 1]
+        self._turtle.reset()
+        bgcolor = self._bgcolor
+        for operation in reversed(sim.operations):
+            if operation[0] == 'bgcolor':
+                bgcolor = operation[1]
+                break
+        self._turtle.getscreen().bgcolor(bgcolor)
+
+        for sim_stamp_id, stamp_id in _draw_sim_operations(self._turtle, sim.operations, sim._stamps).items():
+            self._made_stamp(sim_stamp_id - 1, stamp_id)
+        self._stamp_count = sim._next_stamp_id - 1
+        _copy_turtle_state(sim, self._turtle)
+        # Drawing the keyframe added undo entries that the recording didn't, so the undo buffer is emptied. Undos
+        # from here only reach the entries added after the keyframe, the same as in the keyframe SimTurtle:
+        if self._turtle.undobuffer is not None:
+            self._turtle.setundobuffer(self._turtle.undobuffer.bufsize)
+
+
+_REPLAY_FRAME_MS = 16  # The fewest milliseconds between a replay's frames, which is about 60 frames per second.
+
+
+def replay(recording, speed=60, turtle_obj=None, keyframe_interval=1000):
+    """Start playing a recording back on the turtle at speed shortcuts per second, and return the Replay object
+    that can pause(), play(), and seek() it. The recording can be the list that end_recording() returns, a
+    ShortcutRecording such as one from load_recording(), or any other list of shortcut strings. See Replay."""
+    return Replay(recording, speed, turtle_obj, keyframe_interval).play()
+
+
+def _copy_turtle_state(source, target):
+    '''Gives the target turtle the source turtle's position, heading, angle units, pen, and colors, and starts a fill
+    if the source is filling. Either turtle can be a turtle.py turtle or a SimTurtle, and only the public turtle.py
+    methods are used on turtle.py turtles.'''
+    target.penup()
+    target.degrees(source._fullcircle)  # in_radians_mode() reads the angle units the same way.
+    if isinstance(source, SimTurtle) and source.filling():
+        # Go through the source's fill points with the pen up, so the target's fill has the same points:
+        target.goto(*source._fill_path[0])
+        target.begin_fill()
+        for point in source._fill_path[1:]:
+            target.goto(*point)
+    elif source.filling():
+        target.goto(*source.position())
+        target.begin_fill()  # turtle.py turtles don't have a public way to get their fill's points.
+    if target.position() != source.position():
+        target.goto(*source.position())
+    target.setheading(source.heading())
+    target.pensize(source.pensize())
+    target.pencolor(source.pencolor())
+    target.fillcolor(source.fillcolor())
+    target.speed(source.speed())
+    target.showturtle() if source.isvisible() else target.hideturtle()
+    if source.isdown():
+        target.pendown()
+
+
+def _draw_sim_operations(turtle_obj, operations, stamps):
+    '''Draws a SimTurtle's drawing operations with the turtle's public goto(), dot(), stamp(), and fill methods,
+    so they're the turtle's own drawings that its clear() erases. Only the operations after the last `clear` are
+    drawn, and only the stamps in stamps. Returns a dict of the new stamps' ids, by their SimTurtle stamp ids. This
+    changes the turtle's position, heading, pen, and colors, and the tracer should be off.'''
+    start = 0
+    for i in range(len(operations) - 1, -1, -1):
+        if operations[i][0] == 'clear':
+            start = i + 1
+            break
+
+    # turtle.py makes a fill's polygon when the fill begins, so it's under the lines drawn around it. Each fill is
+    # drawn before the lines just before it that start and end on its points:
+    fills = {}  # The fill operations to draw before each operation, by the operation's index.
+    for i in range(start, len(operations)):
+        if operations[i][0] == 'fill':
+            fill_points = set(operations[i][1])
+            first = i
+            for j in range(i - 1, start - 1, -1):
+                kind = operations[j][0]
+                if kind == 'line' and operations[j][1] in fill_points and operations[j][2] in fill_points:
+                    first = j
+                elif kind not in ('dot', 'stamp', 'clearstamp', 'bgcolor'):
+                    break
+            fills.setdefault(first, []).append(operations[i])
+
+    stamp_ids = {}
+    turtle_obj.penup()
+    position, pen_down, color, width = tuple(turtle_obj.position()), False, None, None
+
+    def move_to(point, down):
+        nonlocal position, pen_down
+        if pen_down and (not down or position != point):
+            turtle_obj.penup()
+            pen_down = False
+        if position != point:
+            turtle_obj.goto(point)
+            position = point
+        if down and not pen_down:
+            turtle_obj.pendown()
+            pen_down = True
+
+    for i in range(start, len(operations)):
+        for fill in fills.get(i, ()):
+            # The pen is up, so this only draws the fill's polygon:
+            move_to(fill[1][0], False)
+            turtle_obj.fillcolor(fill[2])
+            turtle_obj.begin_fill()
+            for point in fill[1][1:]:
+                turtle_obj.goto(point)
+            turtle_obj.end_fill()
+            position = fill[1][-1]
+
+        operation = operations[i]
+        kind = operation[0]
+        if kind == 'line':
+            start_point, end_point, line_color, line_width = operation[1:]
+            if (line_color, line_width) != (color, width):
+                turtle_obj.pencolor(line_color)
+                turtle_obj.pensize(line_width)
+                color, width = line_color, line_width
+            move_to(start_point, True)
+            turtle_obj.goto(end_point)
+            position = end_point
+        elif kind == 'dot':
+            move_to(operation[1], False)
+            turtle_obj.dot(operation[2], operation[3])
+        elif kind == 'stamp' and operation[1] in stamps:
+            move_to(operation[2], False)
+            turtle_obj.setheading(operation[3])
+            stamp_ids[operation[1]] = turtle_obj.stamp()
+    return stamp_ids
+
+
+class FrameCapture:
+    """Captures frames of a turtle screen's drawing while shortcuts run, such as for making an animation or a chart
+    of how a drawing was made. begin_capture() makes one of these and end_capture() returns it. A frame is taken
+    after every `every` shortcuts that sc() runs, but only if the drawing changed since the last frame, so with
+    every=1 there is a frame for each change to the drawing:
+
+    >>> begin_capture(every=10)
+    >>> sc('rep 36 [rep 4 [f 100, l 90], l 10]')
+    324
+    >>> frames = end_capture()
+    >>> paths = frames.save('frames')  # Writes frames/frame_000000.svg, frames/frame_000001.svg, and so on.
+
+    Frames come from the canvas's items (the lines, polygons, and text that turtle.py draws), not from screenshots,
+    so they work on a VirtualScreen too. If the screen's tracer is off, the frames show the drawing as of the last
+    screen update, the same as the window does. While capturing, the screen's methods that turtle.py draws with
+    note which items were made, changed, raised, or deleted, so each frame only reads those items from the canvas.
+    That's the only work done while drawing, and a background thread turns each frame into an SVG file's contents.
+    At most max_memory_frames frames are kept in memory. Older frames are written to files in directory (a new
+    temporary directory if it's None) and read back when they're needed.
+
+    A FrameCapture works like a list of each frame's SVG file contents as bytes. The `steps` list has how many
+    shortcuts had run when each frame was taken."""
+
+    def __init__(self, every=1, turtle_obj=None, directory=None, max_memory_frames=100):
+        if every < 1:
+            raise TurtleShortcutException('Frames must be captured at least every 1 shortcut, not ' + str(every) + '.')
+        if max_memory_frames < 1:
+            raise TurtleShortcutException('max_memory_frames must be at least 1, not ' + str(max_memory_frames) + '.')
+        screen = _get_turtle(turtle_obj).getscreen()
+        if not hasattr(screen, 'cv'):
+            raise TurtleShortcutException('Frames can only be captured from a turtle screen with a canvas.')
+        self.every = every
+        self.directory = directory
+        self.max_memory_frames = max_memory_frames
+        self.steps = []
+        self.shortcut_count = 0  # The number of shortcuts that have run since the capture began.
+        self._screen = screen
+        self._last_step = 0  # The shortcut count when the last frame was taken.
+        self._last_frame = None  # The canvas items of the last frame, to tell if the drawing changed.
+
+        # _items has the _canvas_item() of each canvas item, by item id, in the order they're stacked in. _changed
+        # has the ids of the items that changed since the last frame. Its values are True for items that were made
+        # or raised, which go on top, and it's in the order that happened:
+        cv = screen.cv
+        self._items = {item: _canvas_item(cv, item, cv.type(item)) for item in cv.find_all()}
+        self._changed = {}
+        self._watched = {}  # The screen's own attributes that _watch_screen() replaced, for finish() to put back.
+        self._watch_screen()
+
+        # Each frame is either its SVG bytes, or the path of the file it was written to. The frames before
+        # _memory_start have all been written to files. The background thread adds to _frames:
+        self._frames = []
+        self._memory_start = 0
+        self._lock = threading.Lock()
+        self._error = None  # An exception that the background thread raised, which _wait() raises again.
+        self._queue = queue.Queue(maxsize=max_memory_frames)  # Frames waiting for the background thread.
+        self._thread = threading.Thread(target=self._encode_frames, name='turtlesc frame capture', daemon=True)
+        self._thread.start()
+
+    def __len__(self):
+        self._wait()
+        return len(self._frames)
+
+    def __getitem__(self, index):
+        self._wait()
+        with self._lock:
+            frame = self._frames[index]
+        if isinstance(frame, str):
+            with open(frame, 'rb') as frame_file:
+                return frame_file.read()
+        return frame
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __repr__(self):
+        return '<FrameCapture of ' + str(len(self)) + ' frames after ' + str(self.shortcut_count) + ' shortcuts>'
+
+    def capture(self):
+        """Take a frame of the drawing now, unless it's the same as the last frame. Returns True if it took one."""
+        if not self._thread.is_alive():
+            raise TurtleShortcutException('Frames can\'t be captured after the FrameCapture is finished.')
+        self._last_step = self.shortcut_count
+        screen, cv = self._screen, self._screen.cv
+        width, height = screen.screensize()
+        if not self._changed and self._last_frame is not None and self._last_frame[:3] == (width, height, screen._bgcolor()):
+            return False  # Nothing was drawn, so the canvas doesn't need to be read.
+
+        for item, raised in self._changed.items():
+            item_type = None if item == 'all' else cv.type(item)
+            if item_type is None:
+                self._items.pop(item, None)  # The item was deleted.
+                continue
+            if raised:
+                self._items.pop(item, None)
+            self._items[item] = _canvas_item(cv, item, item_type)
+        self._changed.clear()
+        frame = (width, height, screen._bgcolor(), tuple(item for item in self._items.values() if item is not None))
+        if frame == self._last_frame:
+            return False
+        self._last_frame = frame
+        self.steps.append(self.shortcut_count)
+        self._queue.put(frame)
+        return True
+
+    def finish(self):
+        """Take a last frame of the drawing (if it changed), and wait for the background thread to finish. No more
+        frames can be captured after this. Returns the FrameCapture."""
+        if self._thread.is_alive():
+            self.capture()
+            self._queue.put(None)  # Tells the background thread to stop.
+            self._thread.join()
+            for name, method in self._watched.items():
+                if method is None:
+                    delattr(self._screen, name)
+                else:
+                    setattr(self._screen, name, method)
+        self._wait()
+        return self
+
+    def save(self, directory):
+        """Write each frame to an SVG file named frame_000000.svg, frame_000001.svg, and so on in the directory,
+        which is made if it doesn't exist. Returns the list of file paths."""
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+        for i, frame in enumerate(self):
+            path = os.path.join(directory, 'frame_' + str(i).zfill(6) + '.svg')
+            with open(path, 'wb') as frame_file:
+                frame_file.write(frame)
+            paths.append(path)
+        return paths
+
+    def _shortcuts_run(self, turtle_obj, count):
+        '''Called by _run_instruction() after sc() runs count shortcuts on the turtle. Shortcuts that other screens'
+        turtles and SimTurtles run aren't counted.'''
+        if turtle_obj.getscreen() is not self._screen:
+            return
+        self.shortcut_count += count
+        if self.shortcut_count - self._last_step >= self.every:
+            self.capture()
+
+    def _watch_screen(self):
+        '''Replaces the screen's methods that turtle.py makes, changes, and deletes canvas items with, with ones that
+        also add the items to _changed. The replacements are attributes of the screen object, so the screen's
+        class and other screens aren't changed.'''
+        screen, items, changed = self._screen, self._items, self._changed
+
+        def watch(name, get_item, raises):
+            self._watched[name] = vars(screen).get(name)
+            method = getattr(screen, name)
+
+            def watched_method(*args, **kwargs):
+                result = method(*args, **kwargs)
+                item = get_item(args, result)
+                if item == 'all':
+                    # The screen was cleared, so there are no items left. The 'all' tells capture() that it changed:
+                    items.clear()
+                    changed.clear()
+                    changed['all'] = False
+                elif raises or kwargs.get('top'):  # turtle.py always passes top as a keyword argument.
+                    changed.pop(item, None)
+                    changed[item] = True
+                else:
+                    changed.setdefault(item, False)
+                return result
+            setattr(screen, name, watched_method)
+
+        watch('_createline', lambda args, result: result, True)
+        watch('_createpoly', lambda args, result: result, True)
+        watch('_drawline', lambda args, result: args[0], False)
+        watch('_drawpoly', lambda args, result: args[0], False)
+        watch('_delete', lambda args, result: args[0], False)
+        watch('_write', lambda args, result: result[0], True)  # _write() returns the text item and its right edge.
+
+    def _wait(self):
+        '''Waits until the background thread has encoded every frame captured so far.'''
+        self._queue.join()
+        if self._error is not None:
+            raise self._error
+
+    def _encode_frames(self):
+        '''Runs in the background thread: turns frames from the queue into SVG bytes, and writes the oldest frames
+        to files when there are more than max_memory_frames of them in memory.'''
+        while True:
+            frame = self._queue.get()
+            try:
+                if frame is None:
+                    return
+                if self._error is None:
+                    self._store(_frame_svg(frame))
+            except Exception as exc:
+                self._error = exc
+            finally:
+                self._queue.task_done()
+
+    def _store(self, svg):
+        '''Adds a frame's SVG bytes to the frames, writing older frames to files to keep max_memory_frames in memory.'''
+        with self._lock:
+            self._frames.append(svg)
+        while len(self._frames) - self._memory_start > self.max_memory_frames:
+            if self.directory is None:
+                self.directory = tempfile.mkdtemp(prefix='turtlesc_frames_')
+            else:
+                os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, 'frame_' + str(self._memory_start).zfill(6) + '.svg')
+            with open(path, 'wb') as frame_file:
+                frame_file.write(self._frames[self._memory_start])
+            with self._lock:
+                self._frames[self._memory_start] = path
+            self._memory_start += 1
+
+
+_FRAME_CAPTURE = None  # The FrameCapture that begin_capture() started, or None.
+
+
+def begin_capture(every=1, turtle_obj=None, directory=None, max_memory_frames=100):
+    """Start capturing frames of the turtle's screen after every `every` shortcuts that sc() runs. Call
+    end_capture() to stop and get the FrameCapture with the frames. Returns the new FrameCapture. See FrameCapture
+    for the other arguments."""
+    global _FRAME_CAPTURE
+    if _FRAME_CAPTURE is not None:
+        _FRAME_CAPTURE.finish()
+    _FRAME_CAPTURE = FrameCapture(every, turtle_obj, directory, max_memory_frames)
+    return _FRAME_CAPTURE
+
+
+def end_capture():
+    """Stop capturing frames, and return the FrameCapture that begin_capture() started after taking a last frame
+    of the drawing. Returns None if frames weren't being captured."""
+    global _FRAME_CAPTURE
+    capture, _FRAME_CAPTURE = _FRAME_CAPTURE, None
+    return None if capture is None else capture.finish()
+
+
+def _canvas_item(cv, item, item_type):
+    '''Returns a tuple of the type, coordinates, and options of a canvas item of the given type, or None if it
+    isn't in frames. This and FrameCapture.capture() are the only parts of capturing a frame that use the canvas,
+    since Tk can only be used from the main thread.'''
+    # Items that draw nothing are left out, so that they don't make a frame look changed. turtle.py makes
+    # invisible line items for the pen to draw on next, and hides turtles by making their polygon invisible.
+    if item_type == 'line':
+        fill = cv.itemcget(item, 'fill')
+        if fill != '':
+            return ('line', tuple(cv.coords(item)), fill, cv.itemcget(item, 'width'))
+    elif item_type == 'polygon':
+        fill, outline = cv.itemcget(item, 'fill'), cv.itemcget(item, 'outline')
+        if fill != '' or outline != '':
+            return ('polygon', tuple(cv.coords(item)), fill, outline, cv.itemcget(item, 'width'))
+    elif item_type == 'text':
+        return ('text', tuple(cv.coords(item)), cv.itemcget(item, 'text'), cv.itemcget(item, 'fill'),
+                cv.itemcget(item, 'font'), cv.itemcget(item, 'anchor'))
+    # Images, such as gif turtle shapes and bgpic() pictures, aren't in the frames.
+    return None
+
+
+_SVG_TEXT_ANCHORS = {'sw': 'start', 's': 'middle', 'se': 'end'}  # turtle.py's write() uses these Tk anchors.
+
+
+def _frame_svg(frame):
+    '''Returns the contents of an SVG file, as bytes, that draws a frame from FrameCapture.capture(). The frame is a
+    tuple of the screen's width, height, and background color, and the _canvas_item() of each canvas item. The
+    canvas's coordinates are used as they are, since both have y going down with (0, 0) in the middle of the picture.'''
+    width, height, bgcolor, items = frame
+    svg = ['<svg xmlns="http://www.w3.org/2000/svg" width="' + _number_str(width) + '" height="' + _number_str(height) +
+           '" viewBox="' + _number_str(-width / 2) + ' ' + _number_str(-height / 2) + ' ' + _number_str(width) + ' ' +
+           _number_str(height) + '">',
+           '<rect x="' + _number_str(-width / 2) + '" y="' + _number_str(-height / 2) + '" width="' + _number_str(width) +
+           '" height="' + _number_str(height) + '" fill="' + _svg_color(bgcolor) + '"/>']
+    for item in items:
+        item_type, coords = item[0], item[1]
+        points = ' '.join(_number_str(coords[i]) + ',' + _number_str(coords[i + 1]) for i in range(0, len(coords) - 1, 2))
+        if item_type == 'line':
+            if len(coords) >= 4:
+                # turtle.py's lines have round ends, which is also how its dots are drawn:
+                svg.append('<polyline points="' + points + '" fill="none" stroke="' + _svg_color(item[2]) +
+                           '" stroke-width="' + _number_str(float(item[3] or 1)) +
+                           '" stroke-linecap="round" stroke-linejoin="round"/>')
+        elif item_type == 'polygon':
+            svg.append('<polygon points="' + points + '" fill="' + _svg_color(item[2]) + '" stroke="' +
+                       _svg_color(item[3]) + '" stroke-width="' + _number_str(float(item[4] or 1)) + '"/>')
+        elif item_type == 'text':
+            text, color, font, anchor = item[2:]
+            # Tk gives the font as a string like '{Arial} 8 normal', and a VirtualCanvas as a tuple like ('Arial', 8):
+            if isinstance(font, str):
+                font = re.findall(r'\{[^}]*\}|\S+', font)
+            family = font[0].strip('{}') if len(font) > 0 else 'Arial'
+            size = font[1] if len(font) > 1 else 8
+            text = str(text).replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+            svg.append('<text x="' + _number_str(coords[0]) + '" y="' + _number_str(coords[1]) + '" fill="' +
+                       _svg_color(color) + '" font-family="' + family + '" font-size="' + str(size) +
+                       '" text-anchor="' + _SVG_TEXT_ANCHORS.get(anchor, 'start') + '">' + text + '</text>')
+    svg.append('</svg>\n')
+    return '\n'.join(svg).encode('utf-8')
+
+
+def _svg_color(color):
+    '''Returns a Tk color string as an SVG color like '#ff0000', or 'none' for no color.'''
+    rgb = _tk_color_rgb(color)
+    if rgb is None:
+        return 'none'
+    return '#' + ''.join(format(value // 257, '02x') for value in rgb)
 
 
 def record(*messages, sep=' ', end='\n'):
@@ -823,8 +4181,6 @@ def set_key(key, shortcuts):
     turtle.listen()
 
 
-# TODO - add jinja style templating with {{ }}
-
 def _move_turtle(x, y):
     pen_was_down = turtle.pen()['pendown']
     turtle.penup()
@@ -832,6 +4188,10 @@ def _move_turtle(x, y):
     if pen_was_down:
         turtle.pendown()
 
+    # If begin_recording() has been called, log the equivalent shortcut, which moves without drawing.
+    if _NOW_RECORDING:
+        RECORDED_SHORTCUTS.append('tele ' + _number_str(x) + ' ' + _number_str(y))
+
 
 def interactive(style='cardinal', length=20, turn=90):
     import re, math
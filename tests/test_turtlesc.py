@@ -1,8 +1,11 @@
-import pytest
+import pytest, os, sys, math
 from turtle import *
 from turtlesc import *
 from random import *
 
+if sys.platform.startswith('linux') and not os.environ.get('DISPLAY'):
+    use_virtual_screen()  # There's no display for a Tk window, so draw on an in-memory canvas instead.
+
 seed(42)  # Keep at 42 for reproducible tests (dependent on which tests are run and in what order, anyway)
 tracer(10000, 0)
 
@@ -24,9 +27,32 @@ def test_basic_sc_calls():
         sc('f 1 2')
     with pytest.raises(TurtleShortcutException):
         sc('f invalid')
+    with pytest.raises(TurtleShortcutException):
+        sc('forwar 1')  # Partial shortcut names are not shortcuts.
+    with pytest.raises(TurtleShortcutException):
+        sc('c s')
 
     assert sc('f 1, f -1') == 2
 
+def test_degrees_radians():
+    for name in ('degrees', 'DEGREES', 'dEgReEs'):
+        with pytest.raises(TurtleShortcutException):
+            sc(f'{name} 1')  # Too many arguments
+
+        radians()
+        assert sc(f'{name}') == 1
+        assert in_degrees_mode()
+
+    for name in ('radians', 'RADIANS', 'rAdIaNs'):
+        with pytest.raises(TurtleShortcutException):
+            sc(f'{name} 1')  # Too many arguments
+
+        degrees()
+        assert sc(f'{name}') == 1
+        assert in_radians_mode()
+    degrees()
+
+
 def test_in_radians_mode():
     radians()
     assert in_radians_mode()
@@ -42,6 +68,24 @@ def test_in_degrees_mode():
     degrees()  # These tests always use degrees mode.
 
 
+def test_angle_mode_of_turtle_obj():
+    # Checking the angle mode doesn't move the turtle or add to its undo buffer:
+    reset()
+    forward(10)
+    undo_buffer_length = undobufferentries()
+    assert in_degrees_mode(getturtle())
+    assert undobufferentries() == undo_buffer_length
+    assert heading() == 0
+
+    # Each turtle has its own angle mode:
+    t = SimTurtle()
+    t.radians()
+    assert in_radians_mode(t) and not in_degrees_mode(t)
+    assert in_degrees_mode() and not in_radians_mode()
+    t.degrees()
+    assert in_degrees_mode(t)
+
+
 def test_forward():
     turtle.reset()
 
@@ -669,6 +713,34 @@ def test_cardinal_directions_nsew():
         assert (int(pos()[0]), int(pos()[1])) == (0, 0)
 
 
+def test_cardinal_directions_turtle_obj():
+    # Cardinal shortcuts use the turtle_obj's own angle mode and don't change the main turtle:
+    reset()
+    undo_buffer_length = undobufferentries()
+    t = RawTurtle(getscreen())
+    t.radians()
+    assert sc('n 100, e 100, sw 100', turtle_obj=t) == 3
+    assert abs(t.pos() - (100 - 100 * 0.5 ** 0.5, 100 - 100 * 0.5 ** 0.5)) < 0.00001
+    assert abs(t.heading() - 5 * math.pi / 4) < 0.00001
+    assert in_radians_mode(t) and in_degrees_mode()
+    assert undobufferentries() == undo_buffer_length and pos() == (0, 0)
+    t.hideturtle()
+
+    # The moves land exactly on the grid, even after many of them:
+    t = SimTurtle()
+    for i in range(1000):
+        sc('n 10, e 10, ne 10, sw 10, s 10, w 10', turtle_obj=t)
+    assert t.position() == (0, 0) and (t.xcor(), t.ycor()) == (0.0, 0.0)
+
+    # In 'logo' mode, north is a heading of 0:
+    screen = VirtualScreen()
+    screen.mode('logo')
+    t = RawTurtle(screen)
+    assert sc('n 100, e 50', turtle_obj=t) == 2
+    assert t.pos() == (50, 100)
+    assert t.heading() == 90
+
+
 def test_sleep():
     with pytest.raises(TurtleShortcutException):
         sc('sleep')  # Missing argument
@@ -825,6 +897,9 @@ def test_scs():
     assert scs('pc red') == "pencolor('red')\n"
     assert scs('fc red') == "fillcolor('red')\n"
     assert scs('bc red') == "bgcolor('red')\n"
+    assert scs('pc #FF0000') == "pencolor('#FF0000')\n"
+    assert scs('degrees') == 'degrees()\n'
+    assert scs('radians') == 'radians()\n'
 
     colormode(255)
     assert scs('pc red') == "pencolor('red')\n"
@@ -1100,6 +1175,7 @@ def test_comment():
     assert sc('f 100, # ignore this, b 100') == 2
     assert sc('f 100, # ignore this, b 100, # ignore this') == 2
     assert sc('f 100, # ignore this, b 100, # ignore this, f 100') == 3
+    assert sc('#no space after the hashtag') == 0
 
     assert scs('# ignore this') == '# ignore this\n'
     assert scs('f 100, # ignore this') == 'forward(100)\n# ignore this\n'
@@ -1116,6 +1192,1033 @@ def test_recording():
     
 
 
+def test_compile_sc():
+    reset()
+    program = compile_sc('f 100, l 90, # comment')
+    assert len(program) == 3
+    assert program() == 2
+    assert (int(pos()[0]), int(pos()[1])) == (100, 0)
+    assert heading() == 90
+    assert program.run() == 2
+    assert (int(pos()[0]), int(pos()[1])) == (100, 100)
+    assert heading() == 180
+    assert program.run(_return_turtle_code=True) == ('forward(100)', 'left(90)', '# comment')
+
+    with pytest.raises(AttributeError):
+        program.source = 'f 1'  # Programs are immutable.
+
+    with pytest.raises(TurtleShortcutException):
+        compile_sc('f 100, f invalid')
+
+    colormode(1.0)
+    program = compile_sc('pc 255 0 0')  # The RGB range is checked when the program runs, not when it's compiled.
+    with pytest.raises(TurtleShortcutException):
+        program()
+    colormode(255)
+    assert program() == 1
+    assert pencolor() == (255, 0, 0)
+    colormode(1.0)
+
+
+def test_sc_syntax_errors_run_nothing():
+    # If any shortcut has a syntax error, none of the shortcuts are run:
+    reset()
+    with pytest.raises(TurtleShortcutException):
+        sc('f 100, l 90, f invalid')
+    assert pos() == (0, 0)
+    assert heading() == 0
+
+    colormode(1.0)
+    with pytest.raises(TurtleShortcutException):
+        sc('f 100, pc 255 0 0')
+    assert pos() == (0, 0)
+
+    with pytest.raises(TurtleShortcutException):
+        sc('f 100, pc xxyyzz')
+    assert pos() == (0, 0)
+
+
+def test_sc_cache():
+    clear_sc_cache()
+    assert sc('f 1, f -1') == 2
+    assert compile_sc('f 1, f -1') is compile_sc('f 1, f -1')
+    assert compile_sc('f 1', ' f -1') is compile_sc('f 1, f -1')
+
+    clear_sc_cache()
+    program = compile_sc('f 1, f -1')
+    assert compile_sc('f 1, f -1') is program
+    for i in range(SC_CACHE_SIZE):
+        compile_sc(f'f {i}')
+    assert compile_sc('f 1, f -1') is not program  # The least recently used program was evicted.
+
+
+def test_sc_compile_function():
+    reset()
+    colormode(1.0)
+    draw = sc_compile_function('f 100, l 90, pc red, # comment, rep 2 [f 10], fc 0 0 1, n 50, ps 3')
+    assert draw() == 8
+    assert abs(pos() - (100, 70)) < 0.00001
+    assert (pencolor(), fillcolor(), pensize()) == ('red', (0.0, 0.0, 1.0), 3)
+    assert sc_compile_function('f 100, l 90, pc red, # comment, rep 2 [f 10], fc 0 0 1, n 50, ps 3') is not draw
+    pensize(1)
+
+    # Syntax errors are raised when compiling, and RGB errors are raised before any shortcut runs:
+    with pytest.raises(TurtleShortcutException):
+        sc_compile_function('f 100, invalid')
+    reset()
+    with pytest.raises(TurtleShortcutException):
+        sc_compile_function('f 100, pc 255 0 0')()  # Invalid in colormode 1.0.
+    assert pos() == (0, 0)
+
+    # The function is bound to the turtle_obj:
+    t = SimTurtle()
+    assert sc_compile_function('set size 10, f $size, l 90, f 20', turtle_obj=t)() == 4
+    assert abs(t.position() - (10, 20)) < 0.00001 and pos() == (0, 0)
+    t = RawTurtle(getscreen())
+    t.hideturtle()
+    with pytest.raises(AttributeError):
+        sc_compile_function('pu, eoc', turtle_obj=t)()  # Like sc(), this calls t.exitonclick(), which doesn't exist.
+
+    # Recording still works through the compiled function:
+    begin_recording()
+    sc_compile_function('f 1, b 1')()
+    assert end_recording(merge=False) == ['f 1', 'b 1']
+
+
+def test_sc_template():
+    reset()
+    colormode(1.0)
+    step = sc_template('pc {{r}} {{g}} {{ b }}, f {{length}}, l 90, # comment {{ignored}}')
+    assert step.names == ('r', 'g', 'b', 'length')
+    assert step(r=1, g=0, b=1, length=100) == 3
+    assert pencolor() == (1.0, 0.0, 1.0)
+    assert (int(pos()[0]), int(pos()[1])) == (100, 0)
+    assert heading() == 90
+    assert step.bind(r=0, g=0, b=0, length=50).run(_return_turtle_code=True) == ('pencolor((0.0, 0.0, 0.0))', 'forward(50)', 'left(90)', '# comment {{ignored}}')
+
+    assert sc_template('pc {{color}}')(color='red') == 1
+    assert pencolor() == 'red'
+    assert sc_template('spd {{speed}}')(speed='fastest') == 1
+    assert speed() == 0
+    tracer(10000, 0)  # Restore the original tracer settings for other tests.
+
+    with pytest.raises(TurtleShortcutException):
+        step(r=1, g=0, b=0)  # Missing placeholder value.
+    with pytest.raises(TurtleShortcutException):
+        step(r=1, g=0, b=0, length=100, invalid=1)  # Unknown placeholder.
+    with pytest.raises(TurtleShortcutException):
+        step(r=1, g=0, b=0, length='invalid')  # Invalid argument.
+    with pytest.raises(TurtleShortcutException):
+        step(r=1, g=0, b=0, length='1 2')  # Placeholder values must be a single argument.
+    with pytest.raises(TurtleShortcutException):
+        step(r=255, g=0, b=0, length=100)  # Invalid RGB value for colormode 1.0.
+    with pytest.raises(TurtleShortcutException):
+        sc_template('{{name}} 100')
+    with pytest.raises(TurtleShortcutException):
+        sc_template('f {{length}}0')
+    with pytest.raises(TurtleShortcutException):
+        sc_template('f {{length}} 1')  # Too many arguments.
+    with pytest.raises(TurtleShortcutException):
+        sc_template('f invalid, f {{length}}')
+
+    # Placeholders in a shortcut with a [ ] block are filled in before the block is parsed:
+    reset()
+    square = sc_template('pc {{color}}, rep {{sides}} [f {{length}}, rep 2 [l {{turn}}]]')
+    assert square.names == ('color', 'sides', 'length', 'turn')
+    assert square(color='blue', sides=4, length=100, turn=45) == 13
+    assert pencolor() == 'blue'
+    assert (round(pos()[0]), round(pos()[1]), round(heading())) == (0, 0, 0)
+    assert square(color='red', sides=3, length=10, turn=60) == 10
+    assert round(heading()) == 0
+    with pytest.raises(TurtleShortcutException):
+        square(color='red', sides='invalid', length=10, turn=60)
+    with pytest.raises(TurtleShortcutException):
+        square(color='red', sides=3, length='10]', turn=60)  # Values can't change the blocks.
+    with pytest.raises(TurtleShortcutException):
+        sc_template('rep 2 [f {{length}}0]')
+    with pytest.raises(TurtleShortcutException):
+        sc_template('rep 2 [{{name}} 10]')(name='f')  # Placeholders can't be shortcut names.
+
+
+def test_register_shortcut():
+    import turtlesc
+    def triangle(turtle_obj, size):
+        for i in range(3):
+            turtle_obj.forward(size)
+            turtle_obj.left(120)
+
+    with pytest.raises(TurtleShortcutException):
+        sc('tri 100')  # Not registered yet.
+    with pytest.raises(TurtleShortcutException):
+        register_shortcut('f', 1, triangle)  # Can't replace built-in shortcuts.
+    with pytest.raises(TurtleShortcutException):
+        register_shortcut('tri angle', 1, triangle)  # Invalid name.
+
+    all_shortcuts = turtlesc.ALL_SHORTCUTS
+    register_shortcut('tri', 1, triangle, 'for i in range(3):\n    forward({0})\n    left(120)')
+    assert 'tri' in turtlesc.ALL_SHORTCUTS and isinstance(turtlesc.ALL_SHORTCUTS, frozenset)
+    assert 'tri' not in all_shortcuts  # The old frozenset doesn't change.
+
+    reset()
+    with pytest.raises(TurtleShortcutException):
+        sc('tri')  # Missing argument
+    with pytest.raises(TurtleShortcutException):
+        sc('tri 1 2')  # Too many arguments
+    with pytest.raises(TurtleShortcutException):
+        sc('tri invalid')  # Invalid argument
+
+    assert sc('tri 100, f 100, TRI 50') == 3
+    assert (round(pos()[0]), round(pos()[1])) == (100, 0)
+    assert scs('tri 100') == 'for i in range(3):\n    forward(100)\n    left(120)\n'
+    assert merge_shortcuts(['f 100', 'tri 100', 'f 100']) == ['f 100', 'tri 100', 'f 100']
+
+    # Registering the name again replaces the shortcut, even for already-compiled shortcut strings:
+    register_shortcut('tri', (0, 1), lambda turtle_obj, *args: None)
+    assert sc('tri') == 1
+    assert scs('tri 100') == 'tri(100)\n'
+
+    unregister_shortcut('tri')
+    assert 'tri' not in turtlesc.ALL_SHORTCUTS
+    with pytest.raises(TurtleShortcutException):
+        sc('tri 100')
+    with pytest.raises(TurtleShortcutException):
+        unregister_shortcut('f')
+
+
+def test_repeat_blocks():
+    reset()
+    assert sc('rep 4 [f 100, l 90]') == 8
+    assert (round(pos()[0]), round(pos()[1]), round(heading())) == (0, 0, 0)
+    assert sc('repeat 2 [f 10, rep 3 [l 30]]') == 8  # Nested blocks.
+    assert (round(pos()[0]), heading()) == (10, 180)
+    assert sc('rep 0 [f 10]') == 0
+    assert sc('rep 3 []') == 0
+    assert sc('rep 2 [f 1, # comment [with brackets]\n l 1], f 1') == 5
+
+    reset()
+    with pytest.raises(TurtleShortcutException):
+        sc('rep 2')  # Missing block
+    with pytest.raises(TurtleShortcutException):
+        sc('rep [f 1]')  # Missing number of repeats
+    with pytest.raises(TurtleShortcutException):
+        sc('rep -1 [f 1]')
+    with pytest.raises(TurtleShortcutException):
+        sc('rep 1.5 [f 1]')
+    with pytest.raises(TurtleShortcutException):
+        sc('rep 2 [f 1')  # Unmatched brackets
+    with pytest.raises(TurtleShortcutException):
+        sc('rep 2 [f 1]]')
+    with pytest.raises(TurtleShortcutException):
+        sc('rep 2 [f 1] l 90')  # Missing comma
+    with pytest.raises(TurtleShortcutException):
+        sc('f 1 [l 90]')  # Not a block shortcut
+    with pytest.raises(TurtleShortcutException):
+        sc('rep 2 [f 1, rep 2 [invalid]]')
+    assert pos() == (0, 0)
+
+    assert scs('rep 4 [f 100, rep 2 [l 45]]') == 'for _ in range(4):\n    forward(100)\n    for _ in range(2):\n        left(45)\n'
+    assert scs('rep 2 [# comment]') == 'for _ in range(2):\n    # comment\n    pass\n'
+
+    begin_recording()
+    sc('rep 2 [f 1, l 90]')
+    assert end_recording() == ['f 1', 'l 90', 'f 1', 'l 90']
+
+
+def test_random_arguments():
+    reset()
+    sc_seed(42)
+    assert sc('l rand -4 4, rep rand 2 5 [f rand 1.5 2.5], fc rand rand rand') >= 4
+    first_state = (pos(), heading(), fillcolor())
+    reset()
+    sc_seed(42)
+    sc('l rand -4 4, rep rand 2 5 [f rand 1.5 2.5], fc rand rand rand')
+    assert (pos(), heading(), fillcolor()) == first_state  # The same seed draws the same thing.
+
+    # The compiled program picks new random numbers each time it runs:
+    program = compile_sc('sh rand 0 359')
+    headings = set()
+    for i in range(20):
+        program()
+        assert 0 <= heading() <= 359 and heading() == int(heading())
+        headings.add(heading())
+    assert len(headings) > 1
+
+    with pytest.raises(TurtleShortcutException):
+        sc('l rand 4 -4')  # Low is larger than high
+    with pytest.raises(TurtleShortcutException):
+        sc('dot rand -1 1')  # Negative dot sizes are invalid
+    with pytest.raises(TurtleShortcutException):
+        sc('f rand 1 2 3')
+    with pytest.raises(TurtleShortcutException):
+        sc_template('f rand 1 {{i}}')
+
+    assert scs('l rand -4 4, f rand 1.5 2, fc rand rand rand') == 'left(randint(-4, 4))\nforward(uniform(1.5, 2.0))\nfillcolor((random(), random(), random()))\n'
+    assert scs('rep rand 1 3 [f 1]') == 'for _ in range(randint(1, 3)):\n    forward(1)\n'
+
+    # Recordings have the random numbers that were used:
+    begin_recording()
+    sc('f rand 10 10')
+    assert end_recording() == ['f 10']
+
+
+def test_variables_and_expressions():
+    reset()
+    assert sc('set i 0, rep 4 [f $i*10, l 90, inc i 1]') == 13
+    assert SC_VARIABLES['i'] == 4
+    assert (round(pos()[0]), round(pos()[1])) == (-20, -20)
+
+    SC_VARIABLES['size'] = 5  # Variables can also be set from Python code.
+    reset()
+    sc('f $(size+1)*2, l $-size**2, f $size/2-0')
+    assert heading() == 335
+    sc('set n 3, inc n, inc n -2, rep $n [f 1]')
+    assert SC_VARIABLES['n'] == 2
+    assert sc('set x 1.5, inc x 0.25') == 2 and SC_VARIABLES['x'] == 1.75
+
+    with pytest.raises(TurtleShortcutException):
+        sc('f $notavariable')
+    with pytest.raises(TurtleShortcutException):
+        sc('inc notavariable')
+    with pytest.raises(TurtleShortcutException):
+        sc('f $i*')  # Invalid expression
+    with pytest.raises(TurtleShortcutException):
+        sc('f $(i')
+    with pytest.raises(TurtleShortcutException):
+        sc('f $1/0')
+    with pytest.raises(TurtleShortcutException):
+        sc('set forward 1')  # Invalid variable names
+    with pytest.raises(TurtleShortcutException):
+        sc('set 1x 1')
+    with pytest.raises(TurtleShortcutException):
+        sc('set i')
+    with pytest.raises(TurtleShortcutException):
+        sc('set i 0, rep $i/2 [f 1]')  # rep needs an integer
+
+    assert scs('set i 0, rep 300 [f $i, l 91, inc i 1], f $i*2') == 'i = 0\nfor _ in range(300):\n    forward(i)\n    left(91)\n    i += 1\nforward(i*2)\n'
+    assert scs('inc i, set x $-(i+1)**2') == 'i += 1\nx = -(i+1)**2\n'
+
+    # Recordings have the values of the expressions, not the variables:
+    begin_recording()
+    sc('set i 7, f $i, l $i')
+    assert end_recording() == ['f 7', 'l 7']
+
+
+def test_macros():
+    reset()
+    assert sc('def square [f 10, l 90, f 10, l 90, f 10, l 90, f 10, l 90]') == 0
+    assert sc('square, rep 2 [square]') == 24
+    assert (round(pos()[0]), round(pos()[1]), heading()) == (0, 0, 0)
+
+    # Recursive macros are expanded up to their depth, where calls to themselves run the base block:
+    reset()
+    assert sc('def koch 3 [koch, l 60, koch, r 120, koch, l 60, koch] [f 1], koch') == 4 ** 3 + 3 * (4 ** 3 - 1) // 3
+    assert (round(pos()[0]), round(pos()[1])) == (27, 0)
+    assert sc('def kochnobase 2 [kochnobase, l 60, kochnobase], kochnobase') == 3
+
+    # Redefining a macro changes what it does, even for programs that were already compiled:
+    sc('def step [f 1]')
+    reset()
+    sc('step')
+    sc('def step [f 2]')
+    sc('step')
+    assert pos() == (3, 0)
+
+    with pytest.raises(TurtleShortcutException):
+        sc('def f [f 1]')  # Can't use a shortcut name.
+    with pytest.raises(TurtleShortcutException):
+        sc('def nope')  # Missing block
+    with pytest.raises(TurtleShortcutException):
+        sc('def nope [f 1] [f 2]')  # Only recursive macros have a base block.
+    with pytest.raises(TurtleShortcutException):
+        sc('def nope [nope]')  # Only macros with a depth can call themselves.
+    with pytest.raises(TurtleShortcutException):
+        sc('def nope ' + str(MACRO_DEPTH_LIMIT + 1) + ' [nope]')
+    with pytest.raises(TurtleShortcutException):
+        sc('step 5')  # Macros don't have arguments.
+    with pytest.raises(TurtleShortcutException):
+        sc('nope')
+
+    # A program with a syntax error doesn't define any of its macros or clear the cache:
+    import turtlesc
+    cache_size = len(turtlesc._SC_CACHE)
+    with pytest.raises(TurtleShortcutException):
+        sc('def good [f 1], def step [f 5], good, nonsense')
+    with pytest.raises(TurtleShortcutException):
+        sc('good')
+    assert len(turtlesc._SC_CACHE) == cache_size
+    with pytest.raises(TurtleShortcutException):
+        ShortcutTemplate('def good [f 1], f {{n}}, nonsense')
+    with pytest.raises(TurtleShortcutException):
+        sc('good')
+    reset()
+    sc('step')
+    assert pos() == (2, 0)
+
+    assert scs('def sq [f 10, inc n], sq') == 'def sq():\n    global n\n    forward(10)\n    n += 1\nsq()\n'
+    assert scs('def tree 2 [f 1, tree] [l 1]') == 'def tree(depth=1):\n    if depth > 2:\n        left(1)\n        return\n    forward(1)\n    tree(depth + 1)\n'
+
+    begin_recording()
+    sc('step, step')
+    assert end_recording() == ['f 4']
+
+
+def test_sc_path_and_points(monkeypatch):
+    import turtlesc
+    lengths = [10, 20, 30, 5]
+    turns = [15, -40, 100, 7]
+
+    reset()
+    left(30)
+    for length, turn in zip(lengths, turns):
+        forward(length)
+        left(turn)
+    expected_pos, expected_heading = pos(), heading()
+
+    # Try with NumPy (if it's installed) and without it:
+    for numpy_module in (turtlesc._numpy, None):
+        monkeypatch.setattr(turtlesc, '_numpy', numpy_module)
+        reset()
+        left(30)
+        assert sc_path(lengths, turns) == 4
+        assert abs(pos() - expected_pos) < 0.00001 and round(heading(), 5) == expected_heading
+
+        reset()
+        radians()
+        assert sc_path(lengths, 0.5) == 4  # The same turn after every length, in radians.
+        assert round(heading(), 5) == 2.0
+        degrees()
+
+        # In 'logo' mode, headings start at north and go clockwise:
+        mode('logo')
+        right(60)
+        assert sc_path(lengths, turns) == 4
+        assert abs(pos() - expected_pos) < 0.00001 and round(heading(), 5) == (90 - expected_heading) % 360
+        mode('standard')
+
+        # A SimTurtle draws the same path:
+        sim = SimTurtle()
+        sim.left(30)
+        assert sc_path(lengths, turns, turtle_obj=sim) == 4
+        assert abs(sim.pos() - expected_pos) < 0.00001 and round(sim.heading(), 5) == expected_heading
+
+        assert sc_points([1, 2, 3], (4, 5, 6)) == 3
+        assert pos() == (3, 6)
+        assert sc_path([], []) == 0
+
+        with pytest.raises(TurtleShortcutException):
+            sc_path([1, 2], [1, 2, 3])
+        with pytest.raises(TurtleShortcutException):
+            sc_points([1, 2], [1])
+
+    reset()
+    begin_recording()
+    sc_path([10, 10], 90)
+    sc_points([5], [5])
+    assert end_recording() == ['f 10', 'l 90', 'f 10', 'l 90', 'g 5 5']
+
+
+def test_sim_turtle():
+    program = """ps 3, pc red, fc 0 1 1, f 100, l 90, bf, cir 30, ef, r 45, b 20, g 10 -20, x 5, y 7, sh 33,
+        tele 1 2, n 10, se 3, pu, f 5, pd, radians, l 1, n 4, degrees, cir -20, undo, sh 100, f 2"""
+    sim = SimTurtle()
+    reset()
+    assert sc(program, turtle_obj=sim) == sc(program)
+    # The SimTurtle ends up in the same state as a real turtle:
+    assert abs(sim.position() - pos()) < 0.00001
+    assert round(sim.heading(), 5) == round(heading(), 5)
+    assert (sim.pencolor(), sim.fillcolor(), sim.pensize(), sim.isdown()) == (pencolor(), fillcolor(), pensize(), isdown())
+
+    # Like turtle.py, reset() keeps the angle units:
+    sim = SimTurtle()
+    sc('radians, reset, l 1', turtle_obj=sim)
+    assert in_radians_mode(sim) and round(sim.heading(), 5) == 1
+    t = RawTurtle(getscreen())
+    sc('radians, reset, l 1', turtle_obj=t)
+    assert in_radians_mode(t) and round(t.heading(), 5) == 1
+    t.hideturtle()
+
+    # Undo puts back the same things as turtle.py, since the shortcuts add the same undo buffer entries. Pen changes
+    # that don't change anything don't add entries, and undoing a turn or a stamp doesn't move the turtle back:
+    for program in ('f 10, l 90, f 10, hide, undo, f 5', 'f 10, spd 5, show, undo, undo, undo, f 3',
+                    'f 10, bf, l 90, tele 5 5, f 10, undo, undo, undo, undo, f 7', 'pd, pc black, f 10, pd, undo, f 2',
+                    'bf, f 10, bf, undo, l 90, f 10', 'l 30, tele -3 2, undo, undo, f 1', 'st, f 10, st, css 1, undo, undo',
+                    'pc red, pc red, fc blue, undo, undo, ps 3, ef, undo, f 4', 'bf, f 10, l 90, f 10, c, f 10'):
+        sim = SimTurtle()
+        t = RawTurtle(getscreen())
+        sc(program, turtle_obj=sim)
+        sc(program, turtle_obj=t)
+        assert abs(sim.position() - t.position()) < 0.00001, program
+        assert round(sim.heading(), 5) == round(t.heading(), 5), program
+        assert (sim.isdown(), sim.pencolor(), sim.fillcolor(), sim.pensize(), sim.isvisible(), sim.speed(), sim.filling()) == \
+               (t.isdown(), t.pencolor(), t.fillcolor(), t.pensize(), t.isvisible(), t.speed(), t.filling()), program
+        assert len(sim._stamps) == len(t.stampItems), program
+        t.clear()
+        t.hideturtle()
+
+    # Instead of drawing, it logs the drawing operations:
+    sim = SimTurtle()
+    sc('f 10, pu, f 10, pd, pc blue, bf, l 90, f 10, l 90, f 10, ef, dot 5', turtle_obj=sim)
+    assert sim.operations[0] == ('line', (0, 0), (10, 0), 'black', 1)
+    assert [operation[0] for operation in sim.operations] == ['line', 'line', 'line', 'fill', 'dot']
+    assert [(round(x), round(y)) for x, y in sim.operations[3][1]] == [(20, 0), (20, 10), (10, 10)]
+
+    sc('undo, undo', turtle_obj=sim)  # Undo the dot and the end of the fill.
+    assert [operation[0] for operation in sim.operations] == ['line', 'line', 'line']
+    assert not sim.filling()  # Like turtle.py, undoing the end of a fill erases it but doesn't start filling again.
+
+    stamp_id = sim.stamp()
+    sc('st, cs ' + str(stamp_id) + ', css, c', turtle_obj=sim)
+    assert [operation[0] for operation in sim.operations[-5:]] == ['stamp', 'stamp', 'clearstamp', 'clearstamp', 'clear']
+
+    # Like turtle.py, clearing ends the fill, so an `ef` after it doesn't fill anything:
+    sc('bf, f 10, l 90, c, f 10, l 90, f 10, ef', turtle_obj=sim)
+    assert [operation[0] for operation in sim.operations[-3:]] == ['clear', 'line', 'line']
+
+    with pytest.raises(TurtleShortcutException):
+        sc('pc notacolor!', turtle_obj=sim)
+    with pytest.raises(TurtleShortcutException):
+        sc('pc 2 0 0', turtle_obj=sim)
+    sim.colormode(255)
+    sc('bc 255 0 0, t 0 0', turtle_obj=sim)
+    assert sim.bgcolor() == (255, 0, 0)
+    assert sim.getscreen().tracer() == 0
+
+
+def test_virtual_screen():
+    screen = VirtualScreen()
+    t = RawTurtle(screen)
+    canvas = screen.getcanvas()
+    assert isinstance(canvas, VirtualCanvas)
+
+    # The turtle draws lines on the canvas with the y coordinates flipped, like a Tk canvas:
+    assert sc('f 100, l 90, f 50', turtle_obj=t) == 3
+    assert t.position() == (100, 50)
+    lines = [canvas.coords(item) for item in canvas.find_all() if canvas.type(item) == 'line']
+    assert [0, 0, 100, 0, 100, -50] in lines
+
+    # undo() works the same as with a Tk canvas:
+    t.undo()
+    assert t.position() == (100, 0)
+    lines = [canvas.coords(item) for item in canvas.find_all() if canvas.type(item) == 'line']
+    assert [0, 0, 100, 0] in lines
+
+    # Fills make polygon items:
+    sc('fc #FF0000, bf, f 10, l 90, f 10, ef', turtle_obj=t)
+    fills = [([round(n) for n in canvas.coords(item)], canvas.itemcget(item, 'fill')) for item in canvas.find_all() if canvas.type(item) == 'polygon']
+    assert ([100, 0, 100, -10, 90, -10], '#FF0000') in fills
+
+    # Stamps make items, and clearstamps deletes them:
+    num_items = len(canvas.find_all())
+    sc('st, st, st', turtle_obj=t)
+    assert len(canvas.find_all()) == num_items + 3
+    sc('css 2', turtle_obj=t)
+    assert len(canvas.find_all()) == num_items + 1
+
+    # Colors are checked without Tk:
+    assert sc('pc red, bc #00FF00', turtle_obj=t) == 2
+    assert screen.bgcolor() == (0.0, 1.0, 0.0)
+    with pytest.raises(TurtleShortcutException):
+        sc('pc xxyyzz', turtle_obj=t)
+    assert canvas.winfo_rgb('alice blue') == canvas.winfo_rgb('AliceBlue') == (240 * 257, 248 * 257, 255 * 257)
+    assert canvas.winfo_rgb('#F00') == canvas.winfo_rgb('#FF0000') == (65535, 0, 0)
+
+
+def test_color_validation():
+    import turtlesc
+    reset()
+
+    # Checking color shortcuts doesn't touch the turtle's pen color:
+    pencolor('blue')
+    program = compile_sc('pc #00FF00, fc DarkGreen, bc 0.5 0.5 0.5')
+    assert pencolor() == 'blue'
+    program()
+    assert pencolor() == (0.0, 1.0, 0.0)
+    assert fillcolor() == 'DarkGreen'
+
+    # Color names are case-insensitive, like Tk:
+    assert sc('pc DarkGreen, pc darkgreen, pc #abcdef, pc #ABCDEF') == 4
+    for invalid_color in ('FF0000', '#FF00', '#GG0000', 'xxyyzz'):
+        with pytest.raises(TurtleShortcutException):
+            sc('pc ' + invalid_color)
+
+    # The RGB numbers are converted for the colormode:
+    assert turtlesc._resolve_color((255.0, 0.0, 127.0), 255) == (255, 0, 127)
+    assert turtlesc._resolve_color((1, 0, 0.5), 1.0) == (1.0, 0.0, 0.5)
+    assert turtlesc._resolve_color((255, 0, 0), 1.0) is None
+    colormode(255)
+    assert sc('pc 255 0 127') == 1
+    assert pencolor() == (255, 0, 127)
+    colormode(1.0)
+
+    # SimTurtle uses the same color names:
+    t = SimTurtle()
+    t.pencolor('alice blue')
+    with pytest.raises(turtlesc.turtle.TurtleGraphicsError):
+        t.pencolor('not a color')
+
+
+def test_iscs_and_scs_file():
+    import io
+    assert list(iscs('f 100, l 90')) == ['forward(100)', 'left(90)']
+    assert list(iscs('')) == []
+    assert list(iscs('rep 2 [f 10]')) == ['for _ in range(2):', '    forward(10)']
+
+    # The shortcuts are all checked before any lines are yielded:
+    lines = iscs('f 100, invalid')
+    with pytest.raises(TurtleShortcutException):
+        next(lines)
+
+    # scs() can write the code to a file instead of returning it:
+    shortcuts = ', '.join('f ' + str(i) for i in range(1000))
+    file = io.StringIO()
+    assert scs(shortcuts, file=file) is None
+    assert file.getvalue() == scs(shortcuts)
+    assert file.getvalue().count('\n') == 1000
+
+
+def test_sc_export(tmp_path):
+    import runpy
+    shortcuts = 'pc red, f 100, l 90, # comment, set size 20, rep 3 [f $size, r 120, inc size 10], def sq [rep 4 [f 5, l 90]], sq, n 30, bc blue'
+    expected = SimTurtle()
+    sc(shortcuts, turtle_obj=expected)
+
+    # Export a recording to a file, and run its main() function on a turtle:
+    begin_recording()
+    sc(shortcuts)
+    filename = str(tmp_path / 'drawing.py')
+    assert sc_export(end_recording(merge=False), filename, batch_size=2) is None
+    script = runpy.run_path(filename)
+    t = SimTurtle()
+    script['main'](t)
+    assert abs(t.position() - expected.position()) < 0.00001 and t.heading() == expected.heading()
+    assert (t.pencolor(), t.bgcolor(), len(t.operations)) == (expected.pencolor(), expected.bgcolor(), len(expected.operations))
+
+    # Shortcut strings with variables and macros can be exported too:
+    import io
+    file = io.StringIO()
+    sc_export(shortcuts, file)
+    namespace = {'__name__': 'drawing'}
+    exec(file.getvalue(), namespace)
+    t = SimTurtle()
+    namespace['main'](t)
+    assert abs(t.position() - expected.position()) < 0.00001 and len(t.operations) == len(expected.operations)
+    assert namespace['size'] == 50  # Variables are globals, like they are in SC_VARIABLES.
+
+    # The code calls the bound turtle's methods, and updates the screen in batches:
+    with open(filename) as file:
+        code = file.read()
+    assert '    t.forward(100)\n    screen.update()\n' in code
+    assert "    screen.bgcolor('blue')\n" in code
+    assert code.endswith("if __name__ == '__main__':\n    main()\n    turtle.done()\n")
+
+    # Exporting doesn't compile the program into the sc() cache or define its macros:
+    import turtlesc
+    cache_size = len(turtlesc._SC_CACHE)
+    sc_export('def exportonly [f 1], exportonly', io.StringIO())
+    with pytest.raises(TurtleShortcutException):
+        sc('exportonly')
+    assert len(turtlesc._SC_CACHE) == cache_size
+
+    # Macros from earlier sc() calls are written into the program, along with the macros they call:
+    sc('def tri3 [rep 3 [f 10, l 120]], def twotri [tri3, l 60, tri3], def tree 3 [f 1, tree, r 5, tree] [l 1]')
+    expected = SimTurtle()
+    shortcuts = ['twotri, tree', 'rep 2 [f 5', 'l 90]']  # A [ ] block can go on in the next strings.
+    sc('\n'.join(shortcuts), turtle_obj=expected)
+    file = io.StringIO()
+    sc_export(shortcuts, file)
+    namespace = {'__name__': 'drawing'}
+    exec(file.getvalue(), namespace)
+    t = SimTurtle()
+    namespace['main'](t)
+    assert abs(t.position() - expected.position()) < 0.00001 and t.heading() == expected.heading()
+    assert len(t.operations) == len(expected.operations)
+
+    # Registered shortcuts that call their own function can't be exported, and nothing is written:
+    register_shortcut('zigzag', 1, lambda turtle_obj, size: turtle_obj.forward(size))
+    try:
+        file = io.StringIO()
+        with pytest.raises(TurtleShortcutException):
+            sc_export('f 10, rep 2 [zigzag 5]', file)
+        assert file.getvalue() == ''
+    finally:
+        unregister_shortcut('zigzag')
+
+
+def test_save_and_load_recording(tmp_path):
+    import turtlesc
+    begin_recording()
+    sc('f 100, pc red, # comment, rep 2 [l 1.50, pc red], g -5 2.5')
+    shortcuts = ['f 100', 'pc red', '# comment', 'l 1.50', 'pc red', 'l 1.50', 'pc red', 'g -5 2.5']
+    assert type(end_recording(merge=False)) is list  # end_recording() always returns a list...
+    recorded = turtlesc.RECORDED_SHORTCUTS  # ...but the shortcuts are recorded into a ShortcutRecording.
+    assert isinstance(recorded, ShortcutRecording)
+    assert recorded == shortcuts
+    assert recorded[0] == 'f 100' and recorded[-1] == 'g -5 2.5' and recorded[1:3] == shortcuts[1:3]
+    assert len(recorded._strings) == 3  # Each different string is only stored once.
+
+    filename = str(tmp_path / 'recording.tsc')
+    save_recording(filename)
+    recording = load_recording(filename)
+    assert len(recording) == 8 and list(recording) == shortcuts and recording[6] == 'pc red'
+    recording.append('tele 1 2')
+    assert recording[-1] == 'tele 1 2' and len(recording) == 9
+    recording.close()
+
+    # close() closes the memory map, and the recording still works afterwards:
+    with load_recording(filename) as recording:
+        assert recording[0] == 'f 100'
+    assert recording._mmap is None and list(recording) == shortcuts
+
+    # Lists of strings can be saved too:
+    save_recording(filename, ['f 1', 'message with\nnewline', 'forward 2'])
+    assert list(load_recording(filename)) == ['f 1', 'message with\nnewline', 'forward 2']
+
+    with open(filename, 'wb') as file:
+        file.write(b'not a recording')
+    with pytest.raises(TurtleShortcutException):
+        load_recording(filename)
+
+
+def test_merge_shortcuts_optimizer():
+    # Full names are merged like short names, and unknown strings are kept as they are:
+    assert merge_shortcuts(['forward 100', 'f 50', 'left 90', 'r 30']) == ['f 150', 'l 60']
+    assert merge_shortcuts(['hello world', 'hello world']) == ['hello world', 'hello world']
+
+    # Turns before a sh, h, or cardinal direction are removed:
+    assert merge_shortcuts(['l 90', 'r 45', 'sh 180']) == ['sh 180']
+    assert merge_shortcuts(['sh 90', 'l 10', 'sh 45']) == ['sh 45']
+    assert merge_shortcuts(['l 30', 'n 10']) == ['n 10']
+    assert merge_shortcuts(['l 90', 'r 90', 'f 10']) == ['f 10']
+
+    # Pen-up moves that return to the same point, or that are followed by a goto, are removed:
+    assert merge_shortcuts(['pu', 'f 100', 'b 100', 'pd']) == ['pu', 'pd']
+    assert merge_shortcuts(['pu', 'l 90', 'f 10', 'x 5', 'g 0 0']) == ['pu', 'l 90', 'g 0 0']
+    assert merge_shortcuts(['pu', 'bf', 'f 100', 'b 100', 'ef']) == ['pu', 'bf', 'f 100', 'b 100', 'ef']
+    assert merge_shortcuts(['f 5', 'f -5']) == ['f 5', 'f -5']
+
+    # Cardinal directions also set the heading, so the last direction is kept:
+    assert merge_shortcuts(['pu', 'e 5', 'w 3']) == ['pu', 'w -2']
+    assert merge_shortcuts(['pu', 'e 5', 'w 5']) == ['pu', 'w 0']
+    assert merge_shortcuts(['pu', 'e 5', 'e 5']) == ['pu', 'e 10']
+
+    # Redundant state changes are removed:
+    assert merge_shortcuts(['pc red', 'ps 2', 'pc blue', 'f 10']) == ['ps 2', 'pc blue', 'f 10']
+    assert merge_shortcuts(['pc red', 'f 10', 'pc RED', 'f 10']) == ['pc red', 'f 20']
+    assert merge_shortcuts(['pu', 'pd', 'f 10', 'pd', 'f 10']) == ['pd', 'f 20']
+    assert merge_shortcuts(['pc red', '# comment', 'pc blue']) == ['# comment', 'pc blue']
+    assert merge_shortcuts(['pc red', 'tri 10', 'pc red']) == ['pc red', 'tri 10', 'pc red']
+
+    # Tracer and update noise is removed:
+    assert merge_shortcuts(['t 0 0', 't 100 0', 'f 10', 'u', 'u', 'u']) == ['t 100 0', 'f 10', 'u']
+    assert merge_shortcuts(['t 0 0', 'f 10', 't 0 0']) == ['t 0 0', 'f 10']
+
+    # Shortcuts that an undo undoes aren't merged:
+    assert merge_shortcuts(['f 10', 'f 20', 'undo']) == ['f 10', 'f 20', 'undo']
+    assert merge_shortcuts(['f 10', 'f 20', 'f 30', 'undo']) == ['f 30', 'f 30', 'undo']
+    assert merge_shortcuts(['f 10', 'f 20', 'u', 'undo']) == ['f 10', 'f 20', 'u', 'undo']  # `u` isn't undone.
+    assert merge_shortcuts(['pc red', 'tele 2 2', 'n 10', 'pu', 'pu', 'u', 'undo']) == ['pc red', 'tele 2 2', 'n 10', 'pu', 'pu', 'u', 'undo']
+    # It's unknown how many entries a cardinal direction adds to the undo buffer, so nothing before one is merged:
+    assert merge_shortcuts(['f 1', 'f 1', 'n 10', 'undo', 'undo']) == ['f 1', 'f 1', 'n 10', 'undo', 'undo']
+
+    # The merged shortcuts leave a SimTurtle in the same state as the original shortcuts:
+    def sim_state(shortcuts):
+        sim = SimTurtle()
+        for shortcut in shortcuts:
+            sc(shortcut, turtle_obj=sim)
+        return (round(sim.xcor(), 6), round(sim.ycor(), 6), round(sim.heading(), 6) % round(sim._fullcircle, 6), sim.isdown(),
+                sim.pencolor(), sim.pensize(), sim.fillcolor(), sim.filling(), len(sim._stamps), sim._fullcircle)
+    rng = Random(1)
+    choices = ['f 10', 'b 10', 'f -5', 'l 90', 'r 45', 'sh 90', 'n 10', 's 10', 'e 5', 'w 5', 'w 3', 'h', 'g 1 1',
+               'tele 2 2', 'x 3', 'y 3', 'pu', 'pu', 'pd', 'pc red', 'pc blue', 'ps 2', 'bf', 'ef', 'u', 't 0 0', 't 1 0',
+               'c', 'undo', 'undo', 'sleep 0', '# comment', 'st', 'dot 3', 'cir 5', 'spd 3', 'degrees', 'radians']
+    for trial in range(1000):
+        shortcuts = [rng.choice(choices) for i in range(rng.randint(0, 30))]
+        assert sim_state(merge_shortcuts(shortcuts)) == sim_state(shortcuts), shortcuts
+
+    # The merged shortcuts draw the same thing:
+    shortcuts = ['pu', 'forward 50', 'b 50', 'pd', 'pc red', 'pc blue', 'l 45', 'r 45', 'f 10', 'f 20', 'u', 'u']
+    sc('reset')
+    sc(*shortcuts)
+    unmerged_pos, unmerged_color = pos(), pencolor()
+    sc('reset')
+    sc(*merge_shortcuts(shortcuts))
+    assert pos() == unmerged_pos and pencolor() == unmerged_color
+
+
+def test_merge_while_recording():
+    import turtlesc
+
+    begin_recording(merge=True)
+    sc('f 1, f 1, l 90')
+    assert turtlesc.RECORDED_SHORTCUTS == ['f 1', 'f 1', 'l 90']  # The shortcuts that are still being merged are included.
+    sc('r 90, pu, f 5, b 5, pd')
+    assert end_recording() == ['f 2', 'pu', 'pd']
+
+    # Repeated key presses only keep the merged shortcuts in memory:
+    begin_recording(merge=True)
+    sc('t 0 0')
+    for i in range(3000):
+        sc('n 20')
+    for i in range(3000):
+        sc('e 20')
+    recording = turtlesc.RECORDED_SHORTCUTS
+    assert len(recording) == 1003  # 't 0 0', 'n 60000', the merged 'e' shortcuts, and the last 1000 unmerged ones.
+    assert len(recording._merger._undo_window) == 1000 and len(recording._merger._motion_tail) == 1
+    assert end_recording() == ['t 0 0', 'n 60000', 'e 60000']
+
+    # The merged recording leaves the turtle where the recorded shortcuts did, including undos and cardinal directions:
+    for program, expected in (('pu, e 5, w 3', (2, 0, 180)), ('pu, e 5, w 5', (0, 0, 180)), ('f 10, f 20, u, undo', (10, 0, 0)),
+                              ('sh 90, sh 90, l 90, undo', (0, 0, 90)), ('pu, n 10, s 4, pd, f 1, f 2, t 0 0, undo', (0, 5, 270))):
+        sim = SimTurtle()
+        begin_recording(merge=True)
+        sc(program, turtle_obj=sim)
+        recorded = end_recording()
+        assert (round(sim.xcor(), 5), round(sim.ycor(), 5), round(sim.heading(), 5)) == expected, program
+        sim = SimTurtle()
+        sc(*recorded, turtle_obj=sim)
+        assert (round(sim.xcor(), 5), round(sim.ycor(), 5), round(sim.heading(), 5)) == expected, recorded
+
+    # Merging while recording gives the same results as merging at the end:
+    rng = Random(42)
+    choices = ['f 10', 'b 10', 'f -5', 'l 90', 'r 45', 'sh 90', 'n 10', 's 10', 'e 5', 'w 5', 'h', 'g 1 1', 'tele 2 2',
+               'x 3', 'y 3', 'pu', 'pd', 'pc red', 'pc blue', 'ps 2', 'bf', 'ef', 'u', 't 0 0', 't 1 0', 'c', 'undo',
+               'sleep 0', '# comment', 'st', 'hello world', 'forward 10', 'left 90']
+    for trial in range(50):
+        shortcuts = [rng.choice(choices) for i in range(rng.randint(0, 3000))]
+        recording = turtlesc.ShortcutRecording(merge=True)
+        for shortcut in shortcuts:
+            recording.append(shortcut)
+        recording.finish_merging()
+        assert recording == merge_shortcuts(shortcuts)
+        # ...and the merged shortcuts leave a SimTurtle in the same state as the recorded ones:
+        original, merged = SimTurtle(), SimTurtle()
+        for shortcut in shortcuts:
+            sc(shortcut, turtle_obj=original, skip=shortcut == 'hello world')  # Unknown strings are kept as they are.
+        for shortcut in recording:
+            sc(shortcut, turtle_obj=merged, skip=shortcut == 'hello world')
+        assert (original.isdown(), original.pencolor(), original.pensize(), original.filling()) == (merged.isdown(), merged.pencolor(), merged.pensize(), merged.filling())
+        assert abs(original.pos() - merged.pos()) < 0.00001 and abs(original.heading() - merged.heading()) % 360 < 0.00001
+
+
+def test_compress_shortcuts():
+    assert compress_shortcuts([]) == []
+    assert compress_shortcuts(['f 100', 'l 90'] * 4) == ['rep 4 [f 100, l 90]']
+    assert compress_shortcuts((['f 100', 'l 90'] * 4 + ['l 10']) * 36) == ['rep 36 [rep 4 [f 100, l 90], l 10]']
+    assert compress_shortcuts(['f 10', 'r 90', 'f 20', 'r 90', 'f 30', 'r 90']) == ['set loop1_0 10', 'rep 3 [f $loop1_0, r 90, inc loop1_0 10]']
+    assert compress_shortcuts(['f 0.1', 'f 0.2', 'f 0.30000000000000004']) == ['set loop1_0 0.1', 'rep 3 [f $loop1_0, inc loop1_0 0.1]']
+    assert compress_shortcuts(['f 1', 'l 90', 'f 2']) == ['f 1', 'l 90', 'f 2']
+    assert compress_shortcuts(['# hello'] * 3) == ['# hello'] * 3  # Comments aren't put in loops.
+
+    # The compressed shortcuts draw the same thing, and scs() turns them into for loops:
+    shortcuts = []
+    for i in range(20):
+        shortcuts.extend(['f ' + str(10 + 5 * i), 'l 90'] * 4 + ['pc red', 'l 10', 'f 1.5', 'pc blue'])
+    compressed = compress_shortcuts(shortcuts)
+    assert compressed == ['set loop2_0 10', 'rep 20 [rep 4 [f $loop2_0, l 90], pc red, l 10, f 1.5, pc blue, inc loop2_0 5]']
+    assert scs(*compressed).count('for _ in range(') == 2
+
+    original_sim, compressed_sim = SimTurtle(), SimTurtle()
+    sc(*shortcuts, turtle_obj=original_sim)
+    sc(*compressed, turtle_obj=compressed_sim)
+    assert len(original_sim.operations) == len(compressed_sim.operations) == 100
+    for original, compressed in zip(original_sim.operations, compressed_sim.operations):
+        assert original[0] == compressed[0] and original[3:] == compressed[3:]
+        assert all(abs(a - b) < 0.00001 for a, b in zip(original[1] + original[2], compressed[1] + compressed[2]))
+
+    # A long run of the same shortcut with numbers that don't make a loop takes about linear time:
+    import time
+    rng = Random(42)
+    shortcuts = ['g ' + str(rng.randint(-10 ** 6, 10 ** 6)) + ' ' + str(rng.randint(-10 ** 6, 10 ** 6)) for i in range(50000)]
+    start_time = time.perf_counter()
+    assert compress_shortcuts(shortcuts) == shortcuts
+    assert time.perf_counter() - start_time < 20
+
+
+def test_simplify_shortcuts(monkeypatch):
+    import turtlesc
+    assert simplify_shortcuts([]) == []
+    assert simplify_shortcuts(['f 10', 'f 10', 'l 90', 'f 10', 'f 10']) == ['g 20 0', 'g 20 20', 'sh 90']
+    assert simplify_shortcuts(['f 10', 'l 90']) == ['f 10', 'l 90']  # It isn't shorter, so it stays the same.
+    assert simplify_shortcuts(['f 10', 'f 10', 'pc red', 'f 10', 'f 10']) == ['g 20 0', 'pc red', 'g 40 0']
+    assert simplify_shortcuts(['f 10', 'f 10', 'tele 0 0', 'n 5', 'n 5', 'n 5']) == ['g 20 0', 'tele 0 0', 'g 0 15', 'sh 90']
+
+    # Without a start position, only the moves after the position and heading are known are simplified:
+    assert simplify_shortcuts(['f 10', 'f 10', 'h', 'f 5', 'f 5', 'f 5'], start=None) == ['f 10', 'f 10', 'h', 'g 15 0']
+    assert simplify_shortcuts(['f 5', 'f 5', 'f 5', 'tri 10', 'f 5', 'f 5'])[1:] == ['tri 10', 'f 5', 'f 5']
+
+    # A path of nearly straight lines only keeps the points that are further than the tolerance from the new path:
+    shortcuts = []
+    for i in range(1000):
+        shortcuts.extend(['f 1', 'l 0.5' if i % 2 else 'r 0.5'])
+    for numpy_module in (turtlesc._numpy, None):
+        monkeypatch.setattr(turtlesc, '_numpy', numpy_module)
+        simplified = simplify_shortcuts(shortcuts, tolerance=0.5)
+        assert len(simplified) == 1
+        assert len(simplify_shortcuts(shortcuts, tolerance=0.001)) > 1
+
+        original_sim, simplified_sim = SimTurtle(), SimTurtle()
+        sc(*shortcuts, turtle_obj=original_sim)
+        sc(*simplified, turtle_obj=simplified_sim)
+        assert abs(original_sim.pos() - simplified_sim.pos()) < 0.00001
+        assert abs(original_sim.heading() - simplified_sim.heading()) < 0.00001
+
+    # A spiral, where the farthest point is always next to the end, takes about n log n time instead of n squared:
+    import time
+    shortcuts = []
+    for i in range(30000):
+        shortcuts.extend(['f ' + str(i), 'r 91'])
+    for numpy_module in (turtlesc._numpy, None):
+        monkeypatch.setattr(turtlesc, '_numpy', numpy_module)
+        start_time = time.perf_counter()
+        simplified = simplify_shortcuts(shortcuts)
+        assert time.perf_counter() - start_time < 20
+        assert len(simplified) == 29999  # Only the `f 0` at the start is left out, since every corner is far apart.
+
+    # A path that doubles back on itself keeps its far point:
+    assert simplify_shortcuts(['f 50', 'f 50', 'b 50', 'b 50']) == ['g 100 0', 'g 0 0']
+
+    # The moves that an undo can reach stay the same, so the undo undoes the same thing:
+    for shortcuts in (['sh 90', 'sh 90', 'l 90', 'undo'], ['f 10', 'f 10', 'l 90', 'f 10', 'f 10', 'undo', 'undo'],
+                      ['f 10', 'f 10', 'pc red', 'f 10', 'undo', 'pu', 'undo', 'undo'], ['f 10', 'f 10', 'f 10', 'c', 'undo']):
+        original_sim, simplified_sim = SimTurtle(), SimTurtle()
+        sc(*shortcuts, turtle_obj=original_sim)
+        sc(*simplify_shortcuts(shortcuts), turtle_obj=simplified_sim)
+        assert abs(original_sim.pos() - simplified_sim.pos()) < 0.00001
+        assert abs(original_sim.heading() - simplified_sim.heading()) < 0.00001
+    assert simplify_shortcuts(['sh 90', 'sh 90', 'l 90', 'undo']) == ['sh 90', 'l 90', 'undo']
+    assert simplify_shortcuts(['f 10', 'f 10', 'l 90', 'f 10', 'f 10', 'undo', 'undo']) == ['g 20 0', 'sh 90', 'f 10', 'f 10', 'undo', 'undo']
+    assert simplify_shortcuts(['f 10', 'f 10', 'f 10', 'c', 'undo']) == ['g 30 0', 'c', 'undo']
+
+
+def test_replay():
+    shortcuts = []
+    for i in range(300):
+        shortcuts.extend(['f ' + str(i % 7 + 1), 'l 13', 'pc red' if i % 3 else 'pc blue', 'ps ' + str(i % 4 + 1)])
+    shortcuts[500:500] = ['bf', 'fc green', 'rep 3 [f 20, l 120]', 'ef', 'pu', 'f 5', 'pd', 'stamp', 'undo', 'undo']
+
+    def expected(step):
+        sim = SimTurtle()
+        sc(*shortcuts[:step], turtle_obj=sim)
+        return sim
+
+    reset()
+    playback = Replay(shortcuts, keyframe_interval=50)
+    assert len(playback) == len(shortcuts) and not playback.finished
+
+    # Seek backward and forward, both far from and near the current step:
+    for step in (1000, 20, 505, 506, 511, 1209, 0, 1209, 49, 50, 51):
+        playback.seek(step)
+        assert playback.step == step
+        sim = expected(step)
+        assert abs(pos() - sim.pos()) < 0.00001
+        assert abs(heading() - sim.heading()) < 0.00001
+        assert pencolor() == sim.pencolor() and pensize() == sim.pensize() and isdown() == sim.isdown()
+    assert len(playback._keyframes) == 1209 // 50 + 1
+
+    # Seeking draws the same number of lines as running the shortcuts, though some of them become one canvas item:
+    playback.seek(600)
+    drawn = getscreen().cv.find_all()
+    reset()
+    sc(*shortcuts[:600])
+    assert 0 < len(drawn) <= len(getscreen().cv.find_all())
+
+    # Seeking draws the stamps again with new ids, and the recording's `cs` shortcuts clear the same stamps:
+    reset()
+    stamps = ['st', 'f 10', 'st', 'f 10', 'st', 'f 10']
+    playback = Replay(stamps, keyframe_interval=2)
+    for step in (2, 4, 6):
+        playback.seek(step)
+    stamps.extend(['cs ' + str(playback._stamp_ids[1]), 'f 10'])  # Clear the second stamp.
+    for step in (8, 0, 7, 3, 8):
+        playback.seek(step)
+        assert len(getturtle().stampItems) == min((step + 1) // 2, 3) - (step >= 7)
+    assert abs(pos() - (40, 0)) < 0.00001
+
+    # Undos after a seek undo the same things as when the shortcuts run directly, even ones that reach back before a
+    # keyframe or undo hide, spd, and tele, which only change the pen:
+    for recording in (['f 10', 'l 90', 'f 10', 'hide', 'undo', 'f 5'],
+                      ['f 10', 'spd 5', 'l 90', 'f 10', 'show', 'tele 20 20', 'f 5', 'undo', 'undo', 'undo', 'undo', 'f 3'],
+                      ['bf', 'f 10', 'l 90', 'tele 5 5', 'f 10', 'hide', 'undo', 'undo', 'undo', 'undo', 'f 7', 'ef'],
+                      ['undo', 'pc red', 'f 10', 'ps 3', 'f 10', 'undo', 'undo', 'undo', 'undo', 'f 4'],
+                      ['f 10', 'pu', 'st', 'f 10', 'l 90', 'undo', 'undo', 'undo', 'spd 0', 'undo', 'undo', 'f 1']):
+        reset()
+        sc(*recording)
+        expected_state = (pos(), heading(), isdown(), isvisible(), speed(), filling(), len(getturtle().stampItems))
+        for keyframe_interval in (1, 2, 3, 1000):
+            reset()
+            playback = Replay(recording, keyframe_interval=keyframe_interval)
+            for step in (len(recording), 0, len(recording), 3, 4, 5, len(recording)):
+                playback.seek(step)
+            assert (pos(), heading(), isdown(), isvisible(), speed(), filling(), len(getturtle().stampItems)) == expected_state
+    assert abs(pos() - (11, 0)) < 0.00001 and isdown()
+
+    with pytest.raises(TurtleShortcutException):
+        Replay(shortcuts, speed=0)
+
+    # Playing runs the shortcuts with ontimer() until the recording is finished:
+    reset()
+    playback = replay(shortcuts[:200], speed=1000000)
+    assert playback.playing
+    while not playback.finished:
+        getscreen().update()
+    assert not playback.playing
+    sim = expected(200)
+    assert abs(pos() - sim.pos()) < 0.00001 and abs(heading() - sim.heading()) < 0.00001
+    reset()
+
+
+def test_frame_capture(tmp_path, monkeypatch):
+    import turtlesc
+    reset()
+    with pytest.raises(TurtleShortcutException):
+        begin_capture(every=0)
+    assert end_capture() is None
+
+    tracer(1, 0)  # Frames only show what turtle.py has drawn on the canvas, which waits for updates if the tracer is off.
+    hideturtle()
+    capture = begin_capture(every=2, directory=str(tmp_path / 'spilled'), max_memory_frames=2)
+    sc('f 10, l 90, pc red, f 10')
+    sc('pu, pd, pu, pd')  # Nothing changes, so there are no frames for these.
+    sc_compile_function('bc black, dot 5, f 5')()  # Compiled functions run through the interpreter while capturing.
+    assert end_capture() is capture and turtlesc._FRAME_CAPTURE is None
+    assert capture.steps == [2, 4, 10, 11]
+    assert len(capture) == 4 and capture.shortcut_count == 11
+
+    # Only the last two frames are in memory, and the others were written to files:
+    assert sorted(os.listdir(tmp_path / 'spilled')) == ['frame_000000.svg', 'frame_000001.svg']
+    frames = list(capture)
+    assert all(frame.startswith(b'<svg ') and frame.endswith(b'</svg>\n') for frame in frames)
+    assert frames[1].count(b'<polyline ') == frames[0].count(b'<polyline ') + 1
+    assert frames[1].count(b'stroke="#ff0000"') == frames[0].count(b'stroke="#ff0000"') + 1
+    assert b'fill="#000000"/>' in frames[3].split(b'\n')[1]  # The background is black.
+
+    paths = capture.save(str(tmp_path / 'saved'))
+    assert [os.path.basename(path) for path in paths] == ['frame_00000' + str(i) + '.svg' for i in range(4)]
+    with open(paths[0], 'rb') as frame_file:
+        assert frame_file.read() == frames[0]
+    with pytest.raises(TurtleShortcutException):
+        capture.capture()
+
+    # Each frame only reads the canvas items that changed, and shortcuts on other screens aren't counted:
+    reset()
+    hideturtle()
+    sc('rep 200 [pu, f 1, pd, dot 3]')
+    capture = begin_capture()
+    cv = getscreen().cv
+    read_items = []
+    monkeypatch.setattr(cv, 'type', lambda item, cv_type=cv.type: read_items.append(item) or cv_type(item))
+    sc('f 10')
+    other_turtle = RawTurtle(VirtualScreen())
+    sc('f 10, f 10', turtle_obj=other_turtle)
+    sc('pc red, f 10')
+    assert end_capture() is capture
+    assert capture.shortcut_count == 3
+    assert 0 < len(read_items) < 20
+    assert getscreen()._createline.__func__ is type(getscreen())._createline  # finish() put the screen's methods back.
+    tracer(10000, 0)  # Restore the original tracer settings for other tests.
+    reset()
+
+
 # EXAMPLE PROGRAMS:
 
 def test_colorful_squares():